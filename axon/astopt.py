@@ -0,0 +1,672 @@
+# axon/astopt.py
+"""
+AST optimizer: rewrites the nodes.py tree before `compile_program` at
+optimization level 2 (`python -m axon.run -OO`). Each round analyzes the
+program with axon/sema.py and rewrites it:
+
+* folding: operators on literals become literals; `and` / `or` with a
+  literal left operand become one of their operands;
+* constant propagation: a variable bound exactly once, by a `let` of a
+  literal, is replaced by the literal wherever that `let` has certainly
+  run before the read (`sema.runs_after`);
+* inlining: a call to a `fn` whose body is `return expr;` (small, not
+  part of a recursive cycle, and without annotated params) becomes `expr`
+  with the arguments in place of the params;
+* dead code: `if` / `while` branches whose condition is a literal, and
+  statements after `return`, `break` or `continue`;
+* unused variables: every `let` of a `fn` local that is never read (a call
+  on the right-hand side stays, as a call statement), unless a `let` of it
+  has a type annotation to check;
+* loop-invariant code motion: an expression in a `while` loop that the loop
+  cannot change is computed once, before the loop, into a fresh variable
+  (`_inv0`, ...). It has to be one the loop evaluates at entry before doing
+  anything observable, so that moving it cannot change which error (if
+  any) the program stops with. One from the body is computed under a
+  copy of the loop condition (`if cond { let _inv0 = ...; while cond {...} }`),
+  so the loop condition must have no effects;
+* strength reduction: `i * k` in a `while` loop whose integer counter `i`
+  changes only by `i = i + c` becomes a variable (`_iv0`) that starts at
+  `i * k` and is increased by `c * k` right after `i` is.
+
+Calls to user `fn`s and to host functions may have effects; of the builtins,
+only PURE_BUILTINS (nodes.py) are assumed not to.
+
+Rounds repeat until one changes nothing (at most MAX_ROUNDS). Rewrites
+keep what a program prints and the error it stops with. Globals are never
+removed, because the host can read them after the run, and code that
+declares a local is not dropped, because that would make the name global.
+
+    stmts = optimize_ast(parse_text(source), level=2, stats=stats)
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+from axon.compiler import BINARY_OPS, UNARY_OPS, declared_names
+from axon.nodes import *  # noqa: F403, F401
+from axon.optimizer import FOLD_BINARY, FOLD_UNARY, OptimizeStats, try_fold
+from axon.sema import Analysis, ScopeInfo, Site, Symbol, analyze, runs_after
+
+# the optimization level from which optimize_ast rewrites anything
+AST_LEVEL = 2
+
+# analyze + rewrite rounds at most; a round can expose work for the next
+MAX_ROUNDS = 8
+
+# a `fn` is inlined when its body is `return expr;` with at most this many nodes in expr
+INLINE_MAX_NODES = 16
+
+LITERALS = (NumberNode, StringNode, BooleanNode)
+
+# statements after which the rest of their block never runs
+JUMPS_AWAY = (ReturnNode, BreakNode, ContinueNode)
+
+# statements that bind a name
+BINDINGS = (LetNode, ForNode, ForInNode, FunctionNode)
+
+
+def optimize_ast(prog, level: int = AST_LEVEL, stats: OptimizeStats = None) -> List:
+    """The statements of `prog`, rewritten when `level` is at least AST_LEVEL; `stats` counts the rewrites."""
+    stmts = prog.statements if hasattr(prog, "statements") else prog
+    if level < AST_LEVEL:
+        return stmts
+    if stats is None:
+        stats = OptimizeStats()
+    for _ in range(MAX_ROUNDS):
+        rewriter = _Rewriter(analyze(stmts), stats)
+        stmts = rewriter.block(stmts)
+        if not rewriter.changes:
+            break
+    return stmts
+
+
+# ---------------- EXPRESSION HELPERS ----------------
+def literal(value):
+    if isinstance(value, bool):
+        return BooleanNode(value)
+    if isinstance(value, str):
+        return StringNode(value)
+    return NumberNode(value)
+
+
+def copy_expr(node, params: Dict[str, object] = None):
+    """A fresh copy of an expression; `params` maps names to the expressions that replace them."""
+    if isinstance(node, VariableNode):
+        if params is not None and node.name in params:
+            return copy_expr(params[node.name])
+        return VariableNode(node.name)
+    if isinstance(node, LITERALS):
+        return type(node)(node.value)
+    if isinstance(node, BinOpNode):
+        return BinOpNode(copy_expr(node.left, params), node.op, copy_expr(node.right, params))
+    if isinstance(node, UnaryOpNode):
+        return UnaryOpNode(node.op, copy_expr(node.expr, params))
+    if isinstance(node, ListNode):
+        return ListNode([copy_expr(e, params) for e in node.elements])
+    if isinstance(node, DictNode):
+        return DictNode([(copy_expr(k, params), copy_expr(v, params)) for k, v in node.entries])
+    if isinstance(node, IndexNode):
+        return IndexNode(copy_expr(node.collection, params), copy_expr(node.index, params))
+    if isinstance(node, CallNode):
+        return CallNode(node.name, [copy_expr(a, params) for a in node.args])
+    raise Exception(f"Unhandled expr in AST optimizer: {node}")
+
+
+def children(node) -> List:
+    if isinstance(node, BinOpNode):
+        return [node.left, node.right]
+    if isinstance(node, UnaryOpNode):
+        return [node.expr]
+    if isinstance(node, ListNode):
+        return list(node.elements)
+    if isinstance(node, DictNode):
+        return [e for pair in node.entries for e in pair]
+    if isinstance(node, IndexNode):
+        return [node.collection, node.index]
+    if isinstance(node, CallNode):
+        return list(node.args)
+    return []
+
+
+def walk(node):
+    """`node` and every expression below it."""
+    todo = [node]
+    while todo:
+        n = todo.pop()
+        yield n
+        todo.extend(children(n))
+
+
+def expr_key(node):
+    """Equal for expressions written the same way (1, 1.0 and True differ)."""
+    if isinstance(node, LITERALS):
+        return (type(node.value).__name__, node.value)
+    if isinstance(node, VariableNode):
+        return ("var", node.name)
+    if isinstance(node, BinOpNode):
+        return (node.op, expr_key(node.left), expr_key(node.right))
+    if isinstance(node, UnaryOpNode):
+        return ("unary " + node.op, expr_key(node.expr))
+    if isinstance(node, CallNode):
+        return ("call", node.name, *map(expr_key, node.args))
+    return (type(node).__name__, *map(expr_key, children(node)))
+
+
+def stmt_exprs(stmt) -> List:
+    """The expressions a statement evaluates itself, in order (not those of the blocks in it)."""
+    if isinstance(stmt, (LetNode, PrintNode)):
+        return [stmt.expr]
+    if isinstance(stmt, IfNode):
+        return [cond for cond, _ in stmt.branches]
+    if isinstance(stmt, WhileNode):
+        return [stmt.condition]
+    if isinstance(stmt, ForNode):
+        return [e for e in (stmt.start_expr, stmt.end_expr, stmt.step_expr) if e is not None]
+    if isinstance(stmt, ForInNode):
+        return [stmt.iter_expr]
+    if isinstance(stmt, CallNode):
+        return [stmt]
+    if isinstance(stmt, ReturnNode) and stmt.expr is not None:
+        return [stmt.expr]
+    return []
+
+
+def stmt_blocks(stmt) -> List[List]:
+    if isinstance(stmt, IfNode):
+        return [body for _, body in stmt.branches] + [stmt.else_body]
+    if isinstance(stmt, (WhileNode, ForNode, ForInNode, FunctionNode)):
+        return [stmt.body]
+    return []
+
+
+def all_stmts(stmts, into_functions: bool = True):
+    """Every statement of `stmts` and of the blocks nested in them, outer ones first."""
+    for stmt in stmts:
+        yield stmt
+        if into_functions or not isinstance(stmt, FunctionNode):
+            for body in stmt_blocks(stmt):
+                yield from all_stmts(body, into_functions)
+
+
+def fold_binary(op: str, left, right, stats: OptimizeStats):
+    if op in ("and", "or"):
+        # a literal left operand decides which operand is the value
+        if isinstance(left, LITERALS):
+            stats.count("ast_folded")
+            return right if bool(left.value) == (op == "and") else left
+        return BinOpNode(left, op, right)
+    if isinstance(left, LITERALS) and isinstance(right, LITERALS):
+        ok, value = try_fold(FOLD_BINARY[BINARY_OPS[op]], left.value, right.value)
+        if ok:
+            stats.count("ast_folded")
+            return literal(value)
+    return BinOpNode(left, op, right)
+
+
+def fold_unary(op: str, operand, stats: OptimizeStats):
+    if isinstance(operand, LITERALS):
+        ok, value = try_fold(FOLD_UNARY[UNARY_OPS[op]], operand.value)
+        if ok:
+            stats.count("ast_folded")
+            return literal(value)
+    return UnaryOpNode(op, operand)
+
+
+def fold(node, stats: OptimizeStats):
+    """`node` with its literal subexpressions folded (no analysis needed)."""
+    if isinstance(node, BinOpNode):
+        return fold_binary(node.op, fold(node.left, stats), fold(node.right, stats), stats)
+    if isinstance(node, UnaryOpNode):
+        return fold_unary(node.op, fold(node.expr, stats), stats)
+    if isinstance(node, ListNode):
+        return ListNode([fold(e, stats) for e in node.elements])
+    if isinstance(node, DictNode):
+        return DictNode([(fold(k, stats), fold(v, stats)) for k, v in node.entries])
+    if isinstance(node, IndexNode):
+        return IndexNode(fold(node.collection, stats), fold(node.index, stats))
+    if isinstance(node, CallNode):
+        return CallNode(node.name, [fold(a, stats) for a in node.args])
+    return node
+
+
+# ---------------- PLANNING ----------------
+def is_bound(node: VariableNode, a: Analysis) -> bool:
+    """The variable certainly holds a value when `node` reads it (a param, or bound earlier)."""
+    symbol, site = a.symbols.get(node), a.sites.get(node)
+    return symbol is not None and any(runs_after(site, d) for d in symbol.defs)
+
+
+def is_pure(node, a: Analysis) -> bool:
+    """Evaluating `node` has no effect and cannot fail."""
+    if isinstance(node, LITERALS):
+        return True
+    if isinstance(node, VariableNode):
+        return is_bound(node, a)
+    if isinstance(node, ListNode):
+        return all(is_pure(e, a) for e in node.elements)
+    if isinstance(node, DictNode):
+        return all(isinstance(k, LITERALS) and is_pure(v, a) for k, v in node.entries)
+    if isinstance(node, UnaryOpNode):
+        return node.op == "not" and is_pure(node.expr, a)
+    if isinstance(node, BinOpNode):
+        return node.op in ("==", "!=", "and", "or") and is_pure(node.left, a) and is_pure(node.right, a)
+    return False
+
+
+def recursive_functions(a: Analysis) -> Set[str]:
+    """Names of the `fn`s that can call themselves, directly or through others."""
+    graph: Dict[str, Set[str]] = {}
+    for fn, scope in a.functions.items():
+        graph.setdefault(fn.name, set()).update(a.callees(scope))
+    recursive = set()
+    for name in graph:
+        seen, todo = set(), list(graph[name])
+        while todo:
+            callee = todo.pop()
+            if callee == name:
+                recursive.add(name)
+                break
+            if callee not in seen:
+                seen.add(callee)
+                todo.extend(graph.get(callee, ()))
+    return recursive
+
+
+def is_int(node) -> bool:
+    return isinstance(node, NumberNode) and type(node.value) is int
+
+
+def counter_step(stmt: LetNode, symbol: Symbol, a: Analysis):
+    """c when `stmt` is `i = i + c` / `i = c + i` / `i = i - c` for an int literal c and i bound to `symbol`, else None."""
+    e = stmt.expr
+    if not isinstance(e, BinOpNode) or e.op not in ("+", "-"):
+        return None
+    left, right = e.left, e.right
+    if e.op == "+" and is_int(left):
+        left, right = right, left
+    if not (isinstance(left, VariableNode) and a.symbols[left] is symbol and is_int(right)):
+        return None
+    return right.value if e.op == "+" else -right.value
+
+
+@dataclass
+class LoopPlan:
+    """What is computed in front of one `while` loop, as (variable, expression) pairs."""
+    before: List[Tuple[str, object]] = field(default_factory=list)   # always
+    guarded: List[Tuple[str, object]] = field(default_factory=list)  # only when the condition holds
+
+
+@dataclass
+class LoopFacts:
+    bindings: Set[object]   # statements in the loop that bind a name
+    assigned: Set[Symbol]   # ... and what they bind
+    calls: bool             # calls something other than a pure builtin
+    opaque: bool            # can run host code other than the pure builtins
+
+
+class _Rewriter:
+    """One round: what the analysis allows, then a rewrite of the whole program."""
+
+    def __init__(self, a: Analysis, stats: OptimizeStats):
+        self.a = a
+        self.stats = stats
+        self.changes = 0
+        self.scope: ScopeInfo = a.module
+        # symbol -> its only binding, a `let` of a literal
+        self.constants: Dict[Symbol, Site] = {}
+        # `fn` locals whose `let`s all go
+        self.unused: Set[Symbol] = set()
+        # name -> (`fn` whose calls are inlined, where it is defined)
+        self.inline: Dict[str, Tuple[FunctionNode, Site]] = {}
+        # loops, planned when the rewrite reaches them (outer ones first):
+        # expression -> variable holding its value, and statements to run after a counter update
+        self.replace: Dict[object, str] = {}
+        self.after: Dict[LetNode, List] = {}
+        self.claimed: Set[object] = set()
+        self.names: Set[str] = {name for scope in [a.module, *a.functions.values()] for name in scope.symbols}
+        self.names.update(name for scope in [a.module, *a.functions.values()] for name in a.callees(scope))
+        self.opaque = self.opaque_functions()
+
+        for scope in [a.module, *a.functions.values()]:
+            for symbol in scope.symbols.values():
+                defs = symbol.defs
+                if (len(defs) == 1 and isinstance(defs[0].node, LetNode)
+                        and isinstance(defs[0].node.expr, LITERALS)):
+                    self.constants[symbol] = defs[0]
+                # an annotated `let` stays for the type check it makes
+                if scope.function is not None and not symbol.uses and defs and all(
+                        isinstance(d.node, LetNode) and d.node.type_name is None
+                        and (isinstance(d.node.expr, CallNode) or is_pure(d.node.expr, a)) for d in defs):
+                    self.unused.add(symbol)
+
+        recursive = recursive_functions(a)
+        for fn in a.functions:
+            defs = a.module.symbols[fn.name].defs
+            body = fn.body
+            if (len(defs) == 1 and defs[0].scope is a.module and fn.name not in recursive
+                    and len(set(fn.params)) == len(fn.params) and fn.param_types is None
+                    and len(body) == 1 and isinstance(body[0], ReturnNode) and body[0].expr is not None
+                    and sum(1 for _ in walk(body[0].expr)) <= INLINE_MAX_NODES):
+                self.inline[fn.name] = (fn, defs[0])
+
+    def count(self, name: str):
+        self.changes += 1
+        self.stats.count(name)
+
+    def can_drop(self, stmts) -> bool:
+        # dropping a `let` from a fn would turn the other uses of that name into globals
+        return self.scope.function is None or not declared_names(stmts)
+
+    # ---------------- STATEMENTS ----------------
+    def block(self, stmts) -> List:
+        out = []
+        for k, stmt in enumerate(stmts):
+            out.extend(self.stmt(stmt))
+            rest = stmts[k + 1:]
+            if out and isinstance(out[-1], JUMPS_AWAY) and rest and self.can_drop(rest):
+                self.count("dead_code")
+                break
+        return out
+
+    def stmt(self, stmt) -> List:
+        """The statements replacing `stmt` (none, one, or a spliced-in block)."""
+        if isinstance(stmt, LetNode):
+            if self.a.symbols.get(stmt) in self.unused:
+                self.count("unused_vars")
+                if isinstance(stmt.expr, CallNode):
+                    return [self.call(stmt.expr)]
+                return []
+            return [LetNode(stmt.name, self.expr(stmt.expr), stmt.declare, stmt.type_name),
+                    *self.after.get(stmt, ())]
+
+        if isinstance(stmt, PrintNode):
+            return [PrintNode(self.expr(stmt.expr))]
+
+        if isinstance(stmt, IfNode):
+            return self.if_stmt(stmt)
+
+        if isinstance(stmt, WhileNode):
+            plan = self.plan_loop(stmt)
+            cond = self.expr(stmt.condition)
+            if isinstance(cond, LITERALS) and not cond.value and self.can_drop(stmt.body):
+                self.count("dead_code")
+                return []
+            loop = WhileNode(cond, self.block(stmt.body))
+            out = [LetNode(name, copy_expr(e)) for name, e in plan.before]
+            if plan.guarded:
+                guarded = [LetNode(name, copy_expr(e)) for name, e in plan.guarded]
+                loop = IfNode([(copy_expr(cond), guarded + [loop])], [])
+            return out + [loop]
+
+        if isinstance(stmt, ForNode):
+            step = None if stmt.step_expr is None else self.expr(stmt.step_expr)
+            return [ForNode(stmt.var_name, self.expr(stmt.start_expr), self.expr(stmt.end_expr),
+                            self.block(stmt.body), step)]
+
+        if isinstance(stmt, ForInNode):
+            return [ForInNode(stmt.var_name, self.expr(stmt.iter_expr), self.block(stmt.body))]
+
+        if isinstance(stmt, FunctionNode):
+            outer, self.scope = self.scope, self.a.functions[stmt]
+            try:
+                return [FunctionNode(stmt.name, stmt.params, self.block(stmt.body), stmt.param_types)]
+            finally:
+                self.scope = outer
+
+        if isinstance(stmt, CallNode):
+            return [self.call(stmt)]
+
+        if isinstance(stmt, ReturnNode):
+            return [ReturnNode(None if stmt.expr is None else self.expr(stmt.expr))]
+
+        return [stmt]
+
+    def if_stmt(self, stmt: IfNode) -> List:
+        conds = [self.expr(cond) for cond, _ in stmt.branches]
+        bodies = [body for _, body in stmt.branches]
+        kept, else_body, dropped, decided = [], stmt.else_body, [], False
+        for k, (cond, body) in enumerate(zip(conds, bodies)):
+            if not isinstance(cond, LITERALS):
+                kept.append((cond, body))
+                continue
+            decided = True
+            if cond.value:
+                # later conditions never run: this branch is the else
+                dropped += [s for b in bodies[k + 1:] for s in b] + list(stmt.else_body)
+                else_body = body
+                break
+            dropped += body
+        if decided and self.can_drop(dropped):
+            self.count("dead_code")
+        else:
+            kept, else_body = list(zip(conds, bodies)), stmt.else_body
+        kept = [(cond, self.block(body)) for cond, body in kept]
+        else_body = self.block(else_body)
+        if not kept:
+            return else_body
+        return [IfNode(kept, else_body)]
+
+    # ---------------- EXPRESSIONS ----------------
+    def expr(self, node):
+        name = self.replace.get(node)
+        if name is not None:
+            return VariableNode(name)
+        if isinstance(node, VariableNode):
+            binding = self.constants.get(self.a.symbols.get(node))
+            if binding is not None and runs_after(self.a.sites[node], binding):
+                self.count("propagated")
+                return copy_expr(binding.node.expr)
+            return node
+        if isinstance(node, BinOpNode):
+            return fold_binary(node.op, self.expr(node.left), self.expr(node.right), self.stats)
+        if isinstance(node, UnaryOpNode):
+            return fold_unary(node.op, self.expr(node.expr), self.stats)
+        if isinstance(node, ListNode):
+            return ListNode([self.expr(e) for e in node.elements])
+        if isinstance(node, DictNode):
+            return DictNode([(self.expr(k), self.expr(v)) for k, v in node.entries])
+        if isinstance(node, IndexNode):
+            return IndexNode(self.expr(node.collection), self.expr(node.index))
+        if isinstance(node, CallNode):
+            args = [self.expr(a) for a in node.args]
+            inlined = self.inlined(node, args)
+            if inlined is not None:
+                self.count("inlined")
+                return fold(inlined, self.stats)
+            return CallNode(node.name, args)
+        return node
+
+    def call(self, node: CallNode) -> CallNode:
+        """A call whose value is dropped: only its arguments are rewritten."""
+        return CallNode(node.name, [self.expr(a) for a in node.args])
+
+    def inlined(self, node: CallNode, args):
+        """The body of the called `fn` with `args` substituted, or None when the call has to stay."""
+        entry = self.inline.get(node.name)
+        if entry is None:
+            return None
+        fn, defined = entry
+        site = self.a.sites[node]
+        if len(args) != len(fn.params) or not runs_after(site, defined):
+            return None
+        body = fn.body[0].expr
+        here = site.scope
+        params = set(fn.params)
+        # the body's other names are globals; where it lands they must not be locals
+        if here.function is not None and any(
+                isinstance(n, VariableNode) and n.name not in params and n.name in here.symbols
+                for n in walk(body)):
+            return None
+        calls = any(isinstance(n, CallNode) for n in walk(body))
+        for arg, original in zip(args, node.args):
+            if isinstance(arg, LITERALS):
+                continue
+            # a read that cannot fail may move into the body; past a call only if
+            # it is a local, which the call cannot change
+            if (isinstance(arg, VariableNode) and arg is original and is_bound(arg, self.a)
+                    and (not calls or self.a.symbols[arg].scope is not self.a.module)):
+                continue
+            return None
+        return copy_expr(body, dict(zip(fn.params, args)))
+
+    # ---------------- LOOPS ----------------
+    def pure(self, name: str) -> bool:
+        """Calls to `name` are calls to a pure builtin (the program does not bind the name)."""
+        symbol = self.a.module.symbols.get(name)
+        return name in PURE_BUILTINS and (symbol is None or not symbol.defs)
+
+    def opaque_functions(self) -> Set[str]:
+        """Names of the `fn`s that can (through other calls) run host functions other than the pure builtins."""
+        graph: Dict[str, Set[str]] = {}
+        for fn, scope in self.a.functions.items():
+            graph.setdefault(fn.name, set()).update(self.a.callees(scope))
+        opaque: Set[str] = set()
+        changed = True
+        while changed:
+            changed = False
+            for name, callees in graph.items():
+                if name not in opaque and any(c in opaque or (c not in graph and not self.pure(c)) for c in callees):
+                    opaque.add(name)
+                    changed = True
+        return opaque
+
+    def fresh(self, prefix: str) -> str:
+        n = 0
+        while f"{prefix}{n}" in self.names:
+            n += 1
+        self.names.add(f"{prefix}{n}")
+        return f"{prefix}{n}"
+
+    def claim(self, node, name: str):
+        self.replace[node] = name
+        self.claimed.update(walk(node))
+
+    def loop_exprs(self, loop: WhileNode):
+        """Every expression node the loop evaluates, outside the `fn`s defined in it."""
+        for stmt in all_stmts([loop], into_functions=False):
+            for e in stmt_exprs(stmt):
+                yield from walk(e)
+
+    def loop_facts(self, loop: WhileNode) -> LoopFacts:
+        inside = list(all_stmts([loop]))
+        bindings = {stmt for stmt in inside if isinstance(stmt, BINDINGS)}
+        calls = {n.name for stmt in inside for e in stmt_exprs(stmt) for n in walk(e)
+                 if isinstance(n, CallNode) and not self.pure(n.name)}
+        user = {fn.name for fn in self.a.functions}
+        return LoopFacts(
+            bindings=bindings,
+            assigned={self.a.symbols[stmt] for stmt in bindings},
+            calls=bool(calls),
+            opaque=any(name in self.opaque or name not in user for name in calls),
+        )
+
+    def invariant(self, node, facts: LoopFacts) -> bool:
+        """`node` is worth computing once and has the same value on every pass through the loop."""
+        if isinstance(node, (VariableNode, *LITERALS)):
+            return False
+        for n in walk(node):
+            if n in self.claimed or isinstance(n, (ListNode, DictNode)):
+                return False  # a list or dict literal builds a fresh container every time
+            if isinstance(n, CallNode) and not self.pure(n.name):
+                return False
+            if facts.opaque and isinstance(n, (IndexNode, CallNode)):
+                return False  # host code may change what is in a container
+            if isinstance(n, VariableNode):
+                symbol = self.a.symbols[n]
+                if symbol in facts.assigned:
+                    return False
+                # host code may assign any global; a fn the loop calls may assign one that fns assign
+                if symbol.scope is self.a.module and (facts.opaque or facts.calls and any(
+                        d.scope is not self.a.module for d in symbol.defs)):
+                    return False
+        return True
+
+    def anticipated(self, node, quiet: bool, found: List, facts: LoopFacts) -> bool:
+        """
+        Adds to `found` the invariant parts of `node` that are evaluated while
+        `quiet` holds: nothing evaluated so far can fail or have an effect.
+        Returns whether that still holds after `node`.
+        """
+        if not quiet:
+            return False
+        if self.invariant(node, facts):
+            found.append(node)
+            return is_pure(node, self.a)
+        if isinstance(node, BinOpNode) and node.op in ("and", "or"):
+            # the right operand runs only sometimes
+            return self.anticipated(node.left, quiet, found, facts) and is_pure(node.right, self.a)
+        for child in children(node):
+            quiet = self.anticipated(child, quiet, found, facts)
+        return quiet and is_pure(node, self.a)
+
+    def plan_loop(self, loop: WhileNode) -> LoopPlan:
+        plan = LoopPlan()
+        site = self.a.sites[loop]
+        facts = self.loop_facts(loop)
+
+        # invariants: from the condition, which runs first, and from the body up to
+        # the first statement that can be observed (output, a call, a global store, a branch)
+        from_cond, from_body = [], []
+        self.anticipated(loop.condition, True, from_cond, facts)
+        if all(self.pure(n.name) for n in walk(loop.condition) if isinstance(n, CallNode)):
+            quiet = True
+            for stmt in loop.body:
+                if isinstance(stmt, (LetNode, PrintNode, CallNode, IfNode)):
+                    quiet = self.anticipated(stmt_exprs(stmt)[0], quiet, from_body, facts)
+                if not (quiet and isinstance(stmt, LetNode) and self.a.symbols[stmt].scope is not self.a.module):
+                    break
+        hoisted: Dict[object, str] = {}
+        for found, target in ((from_cond, plan.before), (from_body, plan.guarded)):
+            for e in found:
+                key = expr_key(e)
+                if key not in hoisted:
+                    hoisted[key] = self.fresh("_inv")
+                    target.append((hoisted[key], e))
+                    self.count("hoisted")
+        if hoisted:
+            # the same expression elsewhere in the loop has the same value
+            for n in list(self.loop_exprs(loop)):
+                name = hoisted.get(expr_key(n)) if n not in self.claimed else None
+                if name is not None and self.invariant(n, facts):
+                    self.claim(n, name)
+
+        # strength reduction: `i * k` for a counter updated at the top level of the body
+        for stmt in loop.body:
+            if not isinstance(stmt, LetNode):
+                continue
+            symbol = self.a.symbols[stmt]
+            step = counter_step(stmt, symbol, self.a)
+            if step is None or not self.is_counter(symbol, stmt, site, facts):
+                continue
+            products: Dict[int, List] = {}
+            for n in self.loop_exprs(loop):
+                if isinstance(n, BinOpNode) and n.op == "*" and n not in self.claimed:
+                    for var, k in ((n.left, n.right), (n.right, n.left)):
+                        if isinstance(var, VariableNode) and self.a.symbols[var] is symbol and is_int(k):
+                            products.setdefault(k.value, []).append(n)
+                            break
+            for k, uses in sorted(products.items()):
+                name = self.fresh("_iv")
+                plan.before.append((name, BinOpNode(VariableNode(symbol.name), "*", NumberNode(k))))
+                self.after.setdefault(stmt, []).append(
+                    LetNode(name, BinOpNode(VariableNode(name), "+", NumberNode(step * k)), declare=False))
+                for n in uses:
+                    self.claim(n, name)
+                    self.count("strength_reduced")
+        return plan
+
+    def is_counter(self, symbol: Symbol, update: LetNode, site: Site, facts: LoopFacts) -> bool:
+        """
+        `symbol` always holds an int when the loop starts, and the loop changes
+        it only by `update`: it is set only by int literals and `i = i + c`
+        updates, all in the loop's own scope, and one of them has run.
+        """
+        for d in symbol.defs:
+            if d.scope is not site.scope:
+                return False
+            if d.node is update:
+                continue
+            if d.node in facts.bindings or not isinstance(d.node, LetNode):
+                return False
+            if not (is_int(d.node.expr) or counter_step(d.node, symbol, self.a) is not None):
+                return False
+        return any(runs_after(site, d) for d in symbol.defs)
@@ -0,0 +1,227 @@
+# axon/cache.py
+"""
+On-disk cache of compiled Axon code, the `__pycache__` of Axon.
+
+`foo.ax` compiles to `__axoncache__/foo.axc` next to the source (or
+`foo.opt-N.axc` when optimized at level N). A cache file
+starts with a magic header (bytecode format, codegen revision, opcode
+table, platform word layout) and the SHA-256 of the source; if either differs from the current
+compiler/source, the entry is ignored and rewritten.
+
+Precompile a directory tree:
+
+    python -m axon.cache scripts/ [--force]
+"""
+from array import array
+from typing import Any, Optional, Union
+import argparse
+import hashlib
+import io
+import marshal
+import mmap
+import os
+import sys
+
+from axon import __version__, typecheck
+from axon.astopt import optimize_ast
+from axon.compiler import CODEGEN_REVISION, CodeObject, compile_program
+from axon.opcodes import OPNAMES
+from axon.optimizer import OptimizeStats, optimize as optimize_code
+from axon.parser import parse_stream
+
+CACHE_DIR = "__axoncache__"
+CACHE_SUFFIX = ".axc"
+
+# bump whenever the layout of a serialized CodeObject changes
+FORMAT_VERSION = 3
+
+
+def magic(revision: int = CODEGEN_REVISION) -> bytes:
+    """The header of cache files written by this compiler (at codegen `revision`)."""
+    return b"AXC\0" + hashlib.sha256(
+        f"{__version__}|{FORMAT_VERSION}|{revision}|{','.join(OPNAMES)}|"
+        f"{array('i').itemsize}|{sys.byteorder}".encode()
+    ).digest()[:12]
+
+
+MAGIC = magic()
+
+# const tags in the serialized form
+_VALUE, _CODE, _TUPLE = 0, 1, 2
+
+
+def cache_path(source_path: str, optimize: int = 0) -> str:
+    head, tail = os.path.split(os.path.abspath(source_path))
+    stem = os.path.splitext(tail)[0]
+    if optimize > 0:
+        stem += f".opt-{optimize}"
+    return os.path.join(head, CACHE_DIR, stem + CACHE_SUFFIX)
+
+
+# bytes, or a buffer that hashes and reads like them (an mmap of the source file)
+Source = Union[bytes, mmap.mmap]
+
+
+def source_hash(source: Source) -> bytes:
+    return hashlib.sha256(source).digest()
+
+
+# ---------------- SERIALIZATION ----------------
+def dumps(co: CodeObject) -> bytes:
+    """Serialize a module CodeObject (and every nested one) to bytes."""
+    consts = tuple(_encode_const(c) for c in co.consts)
+    return marshal.dumps((tuple(co.names), consts, _encode_code(co)))
+
+
+def loads(data: bytes) -> CodeObject:
+    names, enc_consts, enc_main = marshal.loads(data)
+    names = list(names)
+    consts = []
+    # nested code objects share the module tables, so fill them in place
+    consts.extend(_decode_const(c, consts, names) for c in enc_consts)
+    return _decode_code(enc_main, consts, names)
+
+
+def _encode_code(co: CodeObject):
+    return (co.code.tobytes(), co.name, tuple(co.params), tuple(co.varnames), tuple(co.bound))
+
+
+def _decode_code(enc, consts, names) -> CodeObject:
+    raw, name, params, varnames, bound = enc
+    code = array("i")
+    code.frombytes(raw)
+    return CodeObject(code, consts, names, name=name, params=tuple(params), varnames=tuple(varnames),
+                      bound=tuple(bound))
+
+
+def _encode_const(v: Any):
+    if isinstance(v, CodeObject):
+        return (_CODE, _encode_code(v))
+    if isinstance(v, tuple):
+        return (_TUPLE, tuple(_encode_const(x) for x in v))
+    return (_VALUE, v)
+
+
+def _decode_const(enc, consts, names):
+    tag, payload = enc
+    if tag == _CODE:
+        return _decode_code(payload, consts, names)
+    if tag == _TUPLE:
+        return tuple(_decode_const(x, consts, names) for x in payload)
+    return payload
+
+
+# ---------------- CACHE FILES ----------------
+def load(path: str, source: Source) -> Optional[CodeObject]:
+    """Return the cached CodeObject for `source`, or None if missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = MAGIC + source_hash(source)
+    if not data.startswith(header):
+        return None
+    try:
+        return loads(data[len(header):])
+    except (ValueError, EOFError, TypeError):
+        return None
+
+
+def store(path: str, source: Source, co: CodeObject):
+    """Write `co` to `path`; failures (read-only trees, races) are ignored."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + source_hash(source) + dumps(co))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def compile_source(source: Source, optimize: int = 0, stats: OptimizeStats = None) -> CodeObject:
+    """`source` is parsed as a stream, so an mmap is never copied into one big string."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    else:
+        source.seek(0)
+    prog = parse_stream(source)
+    # type errors fail the script here, at every level, before any of it runs
+    types = typecheck.check(prog)
+    # -OO rewrites the AST before it is compiled; every level runs the peephole optimizer
+    stmts = optimize_ast(prog, optimize, stats)
+    if stmts is not prog:
+        # the rewritten tree is made of new nodes: type it again (it was checked above)
+        types = typecheck.check(stmts, report=False)
+    co = compile_program(stmts, types=types)
+    optimize_code(co, optimize, stats)
+    return co
+
+
+def load_or_compile(source_path: str, use_cache: bool = True, optimize: int = 0,
+                    stats: OptimizeStats = None) -> CodeObject:
+    """
+    The source file is memory-mapped rather than read: hashing and parsing
+    both work on the mapping. `stats` is only filled in when the source
+    actually had to be compiled.
+    """
+    with open(source_path, "rb") as f:
+        try:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            source = f.read()
+    try:
+        if not use_cache:
+            return compile_source(source, optimize, stats)
+        path = cache_path(source_path, optimize)
+        co = load(path, source)
+        if co is None:
+            co = compile_source(source, optimize, stats)
+            store(path, source, co)
+        return co
+    finally:
+        if isinstance(source, mmap.mmap):
+            source.close()
+
+
+def compile_dir(root: str, force: bool = False, quiet: bool = False, optimize: int = 0) -> int:
+    """Precompile every .ax file under `root`; returns how many were (re)written."""
+    written = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != CACHE_DIR]
+        for fn in sorted(filenames):
+            if not fn.endswith(".ax"):
+                continue
+            src_path = os.path.join(dirpath, fn)
+            with open(src_path, "rb") as f:
+                source = f.read()
+            path = cache_path(src_path, optimize)
+            if not force and load(path, source) is not None:
+                continue
+            if not quiet:
+                print(f"Compiling {src_path}")
+            try:
+                co = compile_source(source, optimize)
+            except Exception as e:
+                print(f"[!!] {src_path}: {e}", file=sys.stderr)
+                continue
+            store(path, source, co)
+            written += 1
+    return written
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m axon.cache", description="Precompile Axon scripts.")
+    ap.add_argument("dirs", nargs="+", help="directories to compile recursively")
+    ap.add_argument("-f", "--force", action="store_true", help="rewrite cache files even if up to date")
+    ap.add_argument("-q", "--quiet", action="store_true", help="only report errors")
+    ap.add_argument("-O", dest="optimize", action="count", default=0, help="optimization level (repeat for more)")
+    args = ap.parse_args(argv)
+    for d in args.dirs:
+        compile_dir(d, force=args.force, quiet=args.quiet, optimize=args.optimize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+# axon/closures.py
+"""
+Closure-compiling engine: turns the nodes.py AST into nested Python closures
+once, then runs them. A second backend to compare against the bytecode VM.
+
+Every operator is resolved when the closure is built (`operator.add`, ...).
+Expressions are `fn(frame) -> value`; statements are `fn(frame) -> code`,
+where the code is NORMAL, BREAK, CONTINUE, RETURN or TAIL, so loops and
+calls unwind by returning instead of raising. Scoping follows the compiler:
+inside a function, params and `let` names live in `frame` slots (slot 0
+holds the return value); every other name is a global.
+
+`return f(...)` of a user function is a tail call: it leaves
+`(name, function, args)` in slot 0 and returns TAIL, and the running call
+loops into `f` instead of nesting, like the VM's TAIL_CALL. Other calls
+count against `max_depth` and fail with the VM's RecursionError.
+
+    engine = ClosureEngine(max_depth=1000)
+    engine.run(parse_text(source))
+"""
+from typing import Any, Callable, Dict, List
+import operator
+import os
+
+from axon.compiler import Scope
+from axon.nodes import *  # noqa: F403, F401
+from axon.vm import UNBOUND
+
+# statement completion codes
+NORMAL, BREAK, CONTINUE, RETURN, TAIL = 0, 1, 2, 3, 4
+
+Frame = List[Any]
+Expr = Callable[[Frame], Any]
+Stmt = Callable[[Frame], int]
+
+BINARY = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '%': operator.mod,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+UNARY = {'-': operator.neg, 'not': operator.not_}
+
+
+class ClosureFunction:
+    """A user function: its body closure plus what a call needs to build a frame."""
+    __slots__ = ("name", "nparams", "padding", "body")
+
+    def __init__(self, name: str, nparams: int, nlocals: int, body: Stmt):
+        self.name = name
+        self.nparams = nparams
+        self.padding = [UNBOUND] * (nlocals - nparams)
+        self.body = body
+
+    def __repr__(self):
+        return f"<fn {self.name}>"
+
+
+class CallDepth:
+    """User function calls live in one engine, and how many may be."""
+    __slots__ = ("live", "limit")
+
+    def __init__(self, limit: int):
+        self.live = 0
+        self.limit = limit
+
+
+class ClosureEngine:
+    def __init__(self, max_depth: int = MAX_CALL_DEPTH):
+        self.globals: Dict[str, Any] = dict(BUILTINS, print=self._host_print)
+        self.max_depth = max_depth
+
+    def run(self, prog):
+        stmts = prog.statements if hasattr(prog, "statements") else prog
+        main = Builder(self.globals, None, CallDepth(self.max_depth)).block(stmts)
+        run_deep(lambda: main([None]), self.max_depth)
+
+    @staticmethod
+    def _host_print(v):
+        print(v)
+
+
+def checked(value: Expr, type_name: str, name: str) -> Expr:
+    """`value`, checked against the annotation of the variable it is bound to."""
+    return lambda frame: check_type(value(frame), type_name, name)
+
+
+def param_checks(node, scope: Scope, body: Stmt) -> Stmt:
+    """`body` of a function, run once its annotated params are checked."""
+    checks = tuple((scope.slots[p] + 1, t, p) for p, t in zip(node.params, node.param_types) if t is not None)
+
+    def run_checked(frame):
+        for slot, type_name, name in checks:
+            check_type(frame[slot], type_name, name)
+        return body(frame)
+    return run_checked
+
+
+class Builder:
+    """Builds the closures of one code body (the module, or one function)."""
+
+    def __init__(self, g: Dict[str, Any], scope: Scope = None, depth: CallDepth = None):
+        self.g = g
+        self.scope = scope
+        self.depth = CallDepth(MAX_CALL_DEPTH) if depth is None else depth
+        self.loop_depth = 0
+
+    def slot(self, name: str):
+        """Frame slot of a local, or None for a global."""
+        if self.scope is not None and name in self.scope.slots:
+            return self.scope.slots[name] + 1
+        return None
+
+    # ---------------- STATEMENTS ----------------
+    def block(self, stmts) -> Stmt:
+        fns = tuple(self.stmt(s) for s in stmts)
+        if len(fns) == 1:
+            return fns[0]
+
+        def run_block(frame):
+            for fn in fns:
+                code = fn(frame)
+                if code:
+                    return code
+            return NORMAL
+        return run_block
+
+    def stmt(self, node) -> Stmt:
+        method = getattr(self, "stmt_" + type(node).__name__, None)
+        if method is None:
+            raise Exception(f"Unhandled stmt in closure compiler: {node}")
+        return method(node)
+
+    def stmt_LetNode(self, node) -> Stmt:
+        value = self.expr(node.expr)
+        if node.type_name is not None:
+            value = checked(value, node.type_name, node.name)
+        slot = self.slot(node.name)
+        if slot is not None:
+            def store_local(frame):
+                frame[slot] = value(frame)
+                return NORMAL
+            return store_local
+        g, name = self.g, node.name
+
+        def store_global(frame):
+            g[name] = value(frame)
+            return NORMAL
+        return store_global
+
+    def stmt_PrintNode(self, node) -> Stmt:
+        value, g = self.expr(node.expr), self.g
+
+        def run_print(frame):
+            g["print"](value(frame))
+            return NORMAL
+        return run_print
+
+    def stmt_ClearNode(self, node) -> Stmt:
+        def run_clear(frame):
+            os.system("cls" if os.name == "nt" else "clear")
+            return NORMAL
+        return run_clear
+
+    def stmt_IfNode(self, node) -> Stmt:
+        branches = tuple((self.expr(cond), self.block(body)) for cond, body in node.branches)
+        orelse = self.block(node.else_body) if node.else_body else None
+
+        def run_if(frame):
+            for cond, body in branches:
+                if cond(frame):
+                    return body(frame)
+            if orelse is not None:
+                return orelse(frame)
+            return NORMAL
+        return run_if
+
+    def stmt_WhileNode(self, node) -> Stmt:
+        cond = self.expr(node.condition)
+        body = self.loop_body(node.body)
+
+        def run_while(frame):
+            while cond(frame):
+                code = body(frame)
+                if code:
+                    if code == BREAK:
+                        break
+                    if code != CONTINUE:
+                        return code
+            return NORMAL
+        return run_while
+
+    def stmt_ForNode(self, node) -> Stmt:
+        start, end = self.expr(node.start_expr), self.expr(node.end_expr)
+        step = (lambda frame: 1) if node.step_expr is None else self.expr(node.step_expr)
+        return self.for_loop(node, lambda frame: loop_range(start(frame), end(frame), step(frame)))
+
+    def stmt_ForInNode(self, node) -> Stmt:
+        iterable = self.expr(node.iter_expr)
+        return self.for_loop(node, lambda frame: loop_iter(iterable(frame)))
+
+    def for_loop(self, node, items: Expr) -> Stmt:
+        """`items(frame)` is the iterator whose values the loop variable takes."""
+        slot, g, name = self.slot(node.var_name), self.g, node.var_name
+        body = self.loop_body(node.body)
+
+        def run_for(frame):
+            for i in items(frame):
+                if slot is not None:
+                    frame[slot] = i
+                else:
+                    g[name] = i
+                code = body(frame)
+                if code:
+                    if code == BREAK:
+                        break
+                    if code != CONTINUE:
+                        return code
+            return NORMAL
+        return run_for
+
+    def loop_body(self, stmts) -> Stmt:
+        self.loop_depth += 1
+        try:
+            return self.block(stmts)
+        finally:
+            self.loop_depth -= 1
+
+    def stmt_BreakNode(self, node) -> Stmt:
+        if not self.loop_depth:
+            raise Exception("'break' outside loop")
+        return lambda frame: BREAK
+
+    def stmt_ContinueNode(self, node) -> Stmt:
+        if not self.loop_depth:
+            raise Exception("'continue' outside loop")
+        return lambda frame: CONTINUE
+
+    def stmt_FunctionNode(self, node) -> Stmt:
+        scope = Scope(node.params, node.body)
+        body = Builder(self.g, scope, self.depth).block(node.body)
+        if node.param_types is not None:
+            body = param_checks(node, scope, body)
+        func = ClosureFunction(node.name, len(node.params), len(scope.slots), body)
+        g, name = self.g, node.name
+
+        def define(frame):
+            g[name] = func
+            return NORMAL
+        return define
+
+    def stmt_CallNode(self, node) -> Stmt:
+        call = self.expr(node)
+
+        def run_call(frame):
+            call(frame)
+            return NORMAL
+        return run_call
+
+    def stmt_ReturnNode(self, node) -> Stmt:
+        if self.scope is not None and type(node.expr) is CallNode:
+            return self.tail_call(node.expr)
+        value = self.expr(node.expr) if node.expr is not None else None
+
+        def run_return(frame):
+            frame[0] = value(frame) if value is not None else None
+            return RETURN
+        return run_return
+
+    def tail_call(self, node) -> Stmt:
+        """`return f(...)` in a function: a user function runs in the caller's call loop."""
+        args = tuple(self.expr(a) for a in node.args)
+        g, name = self.g, node.name
+
+        def run_tail_call(frame):
+            func = g.get(name)
+            values = [a(frame) for a in args]
+            if type(func) is ClosureFunction:
+                frame[0] = (name, func, values)
+                return TAIL
+            if callable(func):
+                frame[0] = func(*values)
+                return RETURN
+            raise RuntimeError(f"NameError: function '{name}' is not defined")
+        return run_tail_call
+
+    # ---------------- EXPRESSIONS ----------------
+    def expr(self, node) -> Expr:
+        method = getattr(self, "expr_" + type(node).__name__, None)
+        if method is None:
+            raise Exception(f"Unhandled expr in closure compiler: {node}")
+        return method(node)
+
+    def expr_NumberNode(self, node) -> Expr:
+        value = node.value
+        return lambda frame: value
+
+    expr_StringNode = expr_BooleanNode = expr_NumberNode
+
+    def expr_VariableNode(self, node) -> Expr:
+        slot, name = self.slot(node.name), node.name
+        if slot is not None:
+            def load_local(frame):
+                v = frame[slot]
+                if v is UNBOUND:
+                    raise RuntimeError(f"NameError: local variable '{name}' referenced before assignment")
+                return v
+            return load_local
+        g = self.g
+
+        def load_global(frame):
+            try:
+                return g[name]
+            except KeyError:
+                raise RuntimeError(f"NameError: name '{name}' is not defined") from None
+        return load_global
+
+    def expr_BinOpNode(self, node) -> Expr:
+        if node.op in ('and', 'or'):
+            # short-circuit: the right operand only runs when it decides
+            left, right = self.expr(node.left), self.expr(node.right)
+            if node.op == 'and':
+                return lambda frame: left(frame) and right(frame)
+            return lambda frame: left(frame) or right(frame)
+        if node.op not in BINARY:
+            raise Exception(f"Unknown binary op: {node.op}")
+        op, left = BINARY[node.op], self.expr(node.left)
+        if isinstance(node.right, (NumberNode, StringNode, BooleanNode)):
+            const = node.right.value
+            return lambda frame: op(left(frame), const)
+        right = self.expr(node.right)
+        return lambda frame: op(left(frame), right(frame))
+
+    def expr_UnaryOpNode(self, node) -> Expr:
+        if node.op not in UNARY:
+            raise Exception(f"Unknown unary op: {node.op}")
+        op, operand = UNARY[node.op], self.expr(node.expr)
+        return lambda frame: op(operand(frame))
+
+    def expr_ListNode(self, node) -> Expr:
+        elements = tuple(self.expr(e) for e in node.elements)
+        return lambda frame: [e(frame) for e in elements]
+
+    def expr_DictNode(self, node) -> Expr:
+        entries = tuple((self.expr(k), self.expr(v)) for k, v in node.entries)
+
+        def build_dict(frame):
+            d = {}
+            for k, v in entries:
+                key = k(frame)
+                d[key] = v(frame)
+            return d
+        return build_dict
+
+    def expr_IndexNode(self, node) -> Expr:
+        coll, index = self.expr(node.collection), self.expr(node.index)
+        return lambda frame: coll(frame)[index(frame)]
+
+    def expr_CallNode(self, node) -> Expr:
+        args = tuple(self.expr(a) for a in node.args)
+        g, name, depth = self.g, node.name, self.depth
+
+        def call(frame):
+            func = g.get(name)
+            values = [a(frame) for a in args]
+            if type(func) is ClosureFunction:
+                if depth.live >= depth.limit:
+                    raise RuntimeError(f"RecursionError: maximum call depth exceeded in {name}()")
+                depth.live += 1
+                callee_name = name
+                try:
+                    while True:
+                        if len(values) != func.nparams:
+                            raise RuntimeError(f"TypeError: {callee_name}() takes {func.nparams} arguments "
+                                               f"but {len(values)} were given")
+                        callee = [None]
+                        callee += values
+                        callee += func.padding
+                        if func.body(callee) != TAIL:
+                            return callee[0]
+                        callee_name, func, values = callee[0]
+                except RecursionError:
+                    raise RuntimeError(f"RecursionError: maximum call depth exceeded in {callee_name}()") from None
+                finally:
+                    depth.live -= 1
+            if callable(func):
+                return func(*values)
+            raise RuntimeError(f"NameError: function '{name}' is not defined")
+        return call
@@ -1,199 +1,584 @@
 # axon/compiler.py
-from typing import List, Tuple, Any
-from dataclasses import dataclass
+"""
+Compiles the nodes.py AST into CodeObjects.
+
+Code generation emits (opcode, arg) instructions in which jumps name a
+`Label` and `(LABEL, label)` marks the spot a label stands for. Once a
+body is compiled, `assemble_code` splits it into basic blocks
+(`build_cfg`), drops the blocks no path reaches (`remove_dead_blocks`)
+and lays the rest out with every label resolved to a relative offset
+(`linearize`).
+"""
+from array import array
+from itertools import chain
+from typing import List, Tuple, Any, Dict, Iterator, Optional, TYPE_CHECKING
+from dataclasses import dataclass, field
 from axon.nodes import *
+from axon.opcodes import (
+    OPNAMES, CONST, LOAD_NAME, STORE_NAME,
+    BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_DIV, BINARY_MOD,
+    COMPARE_EQ, COMPARE_NE, COMPARE_LT, COMPARE_LE, COMPARE_GT, COMPARE_GE,
+    UNARY_NEG, UNARY_NOT,
+    BUILD_LIST, BUILD_DICT, BINARY_SUBSCR, PRINT, CLEAR,
+    JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+    FOR_RANGE, GET_ITER, FOR_ITER,
+    MAKE_FUNCTION, CALL_FUNCTION, TAIL_CALL, RETURN, POP_TOP, LOAD_FAST, STORE_FAST, CHECK_TYPE,
+    COMPARE_EQ_JUMP, COMPARE_NE_JUMP, COMPARE_LT_JUMP, COMPARE_LE_JUMP, COMPARE_GT_JUMP, COMPARE_GE_JUMP,
+    INC_NAME, INC_FAST, LOAD_NAME_PAIR, LOAD_FAST_PAIR, LOAD_NAME_CONST, LOAD_FAST_CONST,
+    PAIR_BITS, PAIR_MASK, HAS_JUMP, TYPE_NAMES, TYPE_BITS,
+)
+
+if TYPE_CHECKING:
+    # typecheck imports astopt, which imports this module
+    from axon.typecheck import TypeInfo
+
+# bump whenever the code compiled from a given source changes: codegen here,
+# the optimizers (astopt.py, optimizer.py) or what typecheck.py rejects.
+# Cache files (axon/cache.py) from another revision are rebuilt.
+CODEGEN_REVISION = 5
+
+# (opcode, arg) pair used while compiling; assemble() flattens them into words.
+# Until `linearize` runs, a jump's arg is a Label.
+Instruction = Tuple[int, Any]
+
+# pseudo-instruction (LABEL, label): `label` is the position of the next instruction
+LABEL = -1
+
+# instructions that end a basic block
+BLOCK_ENDS = HAS_JUMP | {RETURN}
+
+# CALL_FUNCTION packs the callee's name index and the argument count into one word
+CALL_ARGC_BITS = 8
+CALL_ARGC_MASK = (1 << CALL_ARGC_BITS) - 1
+
+BINARY_OPS = {
+    "+": BINARY_ADD,
+    "-": BINARY_SUB,
+    "*": BINARY_MUL,
+    "/": BINARY_DIV,
+    "%": BINARY_MOD,
+    "==": COMPARE_EQ,
+    "!=": COMPARE_NE,
+    "<": COMPARE_LT,
+    "<=": COMPARE_LE,
+    ">": COMPARE_GT,
+    ">=": COMPARE_GE,
+}
+
+# `a and b` / `a or b` keep `a` as the result, skipping `b`, when `a` decides it
+SHORT_CIRCUIT = {"and": JUMP_IF_FALSE_OR_POP, "or": JUMP_IF_TRUE_OR_POP}
+
+UNARY_OPS = {"-": UNARY_NEG, "not": UNARY_NOT}
+
+# a condition ending in one of these compares branches on it directly
+COMPARE_JUMP = {
+    COMPARE_EQ: COMPARE_EQ_JUMP,
+    COMPARE_NE: COMPARE_NE_JUMP,
+    COMPARE_LT: COMPARE_LT_JUMP,
+    COMPARE_LE: COMPARE_LE_JUMP,
+    COMPARE_GT: COMPARE_GT_JUMP,
+    COMPARE_GE: COMPARE_GE_JUMP,
+}
+
+# the two operand loads of a binary op fuse into one instruction
+LOAD_PAIRS = {
+    (LOAD_NAME, LOAD_NAME): LOAD_NAME_PAIR,
+    (LOAD_FAST, LOAD_FAST): LOAD_FAST_PAIR,
+    (LOAD_NAME, CONST): LOAD_NAME_CONST,
+    (LOAD_FAST, CONST): LOAD_FAST_CONST,
+}
 
-Instruction = Tuple
 
 @dataclass
 class CodeObject:
-    code: List[Instruction]
-    consts: List[Any]
+    code: array          # flat 'i' words: opcode, arg, opcode, arg, ...
+    consts: List[Any]    # module-wide constant table (shared with nested code objects)
+    names: List[str]     # module-wide name table (shared with nested code objects)
     name: str
-
-def compile_program(prog) -> CodeObject:
-    consts: List[Any] = []
+    params: Tuple[str, ...] = ()
+    varnames: Tuple[str, ...] = ()   # local slots: params first, then `let` locals
+    # local slots that hold a value wherever the code reads them (axon/typecheck.py)
+    bound: Tuple[int, ...] = ()
+    # per-instruction inline cache, filled by the VM at run time (never serialized)
+    inline_cache: List[Any] = field(default=None, compare=False, repr=False)
+    # copy of `code` that the VM's quickening rewrites in place (never serialized)
+    adaptive: array = field(default=None, compare=False, repr=False)
+    # operand stack slots the code needs, set by axon.verifier.verify (never serialized)
+    stacksize: int = field(default=None, compare=False, repr=False)
+
+    @property
+    def nlocals(self) -> int:
+        return len(self.varnames)
+
+
+class ConstPool:
+    """Deduplicated constant and name tables shared by every CodeObject of a module."""
+
+    def __init__(self):
+        self.consts: List[Any] = []
+        self.names: List[str] = []
+        self._const_index: Dict[Any, int] = {}
+        self._name_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_tables(cls, consts: List[Any], names: List[str]) -> "ConstPool":
+        """Rebuild a pool around existing tables; additions extend those same lists."""
+        pool = cls()
+        pool.consts, pool.names = consts, names
+        for i, v in enumerate(consts):
+            pool._const_index.setdefault(const_key(v), i)
+        for i, n in enumerate(names):
+            pool._name_index.setdefault(n, i)
+        return pool
+
+    def add_const(self, v: Any) -> int:
+        key = const_key(v)
+        idx = self._const_index.get(key)
+        if idx is None:
+            idx = self._const_index[key] = len(self.consts)
+            self.consts.append(v)
+        return idx
+
+    def add_name(self, name: str) -> int:
+        idx = self._name_index.get(name)
+        if idx is None:
+            idx = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return idx
+
+
+def const_key(v: Any):
+    # keep 1, 1.0 and True apart, and -0.0 apart from 0.0
+    if isinstance(v, float):
+        return (float, repr(v))
+    if isinstance(v, tuple):
+        return (tuple, tuple(const_key(x) for x in v))
+    try:
+        hash(v)
+    except TypeError:
+        return (type(v), id(v))
+    return (type(v), v)
+
+
+class Scope:
+    """
+    Local variable slots of one function body. Params and names declared with
+    `let` anywhere in the body are locals; every other name is a global.
+    """
+
+    def __init__(self, params, body):
+        self.slots: Dict[str, int] = {}
+        for p in params:
+            self.slots.setdefault(p, len(self.slots))
+        for name in declared_names(body):
+            self.slots.setdefault(name, len(self.slots))
+
+    def varnames(self) -> Tuple[str, ...]:
+        return tuple(self.slots)
+
+
+def declared_names(stmts) -> List[str]:
+    """Names bound by `let` / `for` in a block, not descending into nested functions."""
+    names = []
+    for stmt in stmts:
+        if isinstance(stmt, LetNode) and stmt.declare:
+            names.append(stmt.name)
+        elif isinstance(stmt, IfNode):
+            for _, body in stmt.branches:
+                names.extend(declared_names(body))
+            names.extend(declared_names(stmt.else_body))
+        elif isinstance(stmt, WhileNode):
+            names.extend(declared_names(stmt.body))
+        elif isinstance(stmt, (ForNode, ForInNode)):
+            names.append(stmt.var_name)
+            names.extend(declared_names(stmt.body))
+    return names
+
+
+class Label:
+    """A jump target, bound to a position by a `(LABEL, label)` instruction."""
+    __slots__ = ()
+
+
+class BasicBlock:
+    """Instructions that only run from the first to the last; only the last may jump."""
+    __slots__ = ("labels", "instrs")
+
+    def __init__(self):
+        self.labels: List[Label] = []
+        self.instrs: List[Instruction] = []
+
+    def jump_target(self) -> Optional[Label]:
+        if self.instrs and self.instrs[-1][0] in HAS_JUMP:
+            return self.instrs[-1][1]
+        return None
+
+
+def build_cfg(code: List[Instruction]) -> List[BasicBlock]:
+    """Split labelled instructions into basic blocks, in source order."""
+    block = BasicBlock()
+    blocks = [block]
+    instrs = block.instrs
+    for ins in code:
+        op = ins[0]
+        if op == LABEL:
+            if instrs:
+                block = BasicBlock()
+                blocks.append(block)
+                instrs = block.instrs
+            block.labels.append(ins[1])
+        else:
+            instrs.append(ins)
+            if op in BLOCK_ENDS:
+                block = BasicBlock()
+                blocks.append(block)
+                instrs = block.instrs
+    return blocks
+
+
+def remove_dead_blocks(blocks: List[BasicBlock]) -> List[BasicBlock]:
+    """The blocks reachable from the first one, still in order."""
+    owner: Dict[Label, int] = {}
+    for i, b in enumerate(blocks):
+        for label in b.labels:
+            owner[label] = i
+    n = len(blocks)
+    live = [False] * n
+    todo = [0]
+    while todo:
+        i = todo.pop()
+        if i >= n or live[i]:
+            continue
+        live[i] = True
+        instrs = blocks[i].instrs
+        if instrs:
+            op, arg = instrs[-1]
+            if op in HAS_JUMP:
+                todo.append(owner[arg])
+            if op == JUMP or op == RETURN:
+                continue
+        todo.append(i + 1)
+    return [b for b, reached in zip(blocks, live) if reached]
+
+
+def linearize(blocks: List[BasicBlock]) -> List[Instruction]:
+    """Lay the blocks out and resolve every label to a relative offset."""
+    for b, nxt in zip(blocks, blocks[1:]):
+        # a JUMP to the block right after it is a no-op
+        if b.instrs and b.instrs[-1][0] == JUMP and b.instrs[-1][1] in nxt.labels:
+            b.instrs.pop()
+    position: Dict[Label, int] = {}
+    n = 0
+    for b in blocks:
+        for label in b.labels:
+            position[label] = n
+        n += len(b.instrs)
     code: List[Instruction] = []
+    for b in blocks:
+        code.extend(b.instrs)
+        # only the last instruction of a block can jump
+        target = b.jump_target()
+        if target is not None:
+            code[-1] = (code[-1][0], position[target] - len(code) + 1)
+    return code
 
+
+def assemble_code(code: List[Instruction]) -> array:
+    """Labelled instructions -> the words of a CodeObject, without unreachable blocks."""
+    return assemble(linearize(remove_dead_blocks(build_cfg(code))))
+
+
+def compile_program(prog, pool: ConstPool = None, types: "TypeInfo" = None) -> CodeObject:
+    """`types` (axon/typecheck.py, for this same tree) drops the checks it proves unnecessary."""
+    if pool is None:
+        pool = ConstPool()
     stmts = prog.statements if hasattr(prog, "statements") else prog
+    code = compile_block(stmts, pool, types=types)
+    return CodeObject(assemble_code(code), pool.consts, pool.names, name="__main__")
+
+
+def compile_function(stmt: FunctionNode, pool: ConstPool, types: "TypeInfo" = None) -> CodeObject:
+    scope = Scope(stmt.params, stmt.body)
+    code = []
+    # annotated params are checked on entry, whoever the caller is
+    for p, type_name in zip(stmt.params, stmt.param_types or ()):
+        if type_name is not None:
+            code.append((LOAD_FAST, scope.slots[p]))
+            code.append((CHECK_TYPE, type_arg(pool.add_name(p), type_name)))
+            code.append((POP_TOP, 0))
+    code.extend(compile_block(stmt.body, pool, scope, types=types))
+    # falling off the end returns None
+    code.append((CONST, pool.add_const(None)))
+    code.append((RETURN, 0))
+    bound = () if types is None else tuple(sorted(scope.slots[n] for n in types.bound.get(stmt, ())))
+    return CodeObject(
+        assemble_code(code), pool.consts, pool.names,
+        name=stmt.name, params=tuple(stmt.params), varnames=scope.varnames(), bound=bound,
+    )
+
+
+def compile_store(name: str, pool: ConstPool, scope: Scope = None) -> Instruction:
+    if scope is not None and name in scope.slots:
+        return (STORE_FAST, scope.slots[name])
+    return (STORE_NAME, pool.add_name(name))
+
+
+def compile_block(stmts, pool: ConstPool, scope: Scope = None,
+                  loops: Tuple[Tuple[Label, Label], ...] = (), types: "TypeInfo" = None) -> List[Instruction]:
+    """`loops`: (exit, continue) labels of the enclosing loops, innermost last."""
+    code: List[Instruction] = []
 
     for stmt in stmts:
 
-        # let x = expr;
+        # let x = expr;  (x = x + 1 is a single INC_NAME / INC_FAST)
         if isinstance(stmt, LetNode):
-            code.extend(compile_expr(stmt.expr, consts))
-            code.append(("STORE_NAME", stmt.name))
+            store = compile_store(stmt.name, pool, scope)
+            if not stmt.declare and is_increment(stmt):
+                code.append((INC_FAST if store[0] == STORE_FAST else INC_NAME, store[1]))
+                continue
+            code.extend(compile_expr(stmt.expr, pool, scope))
+            # let x: T = ...; checks the value unless its type is proven
+            if stmt.type_name is not None and (types is None or stmt not in types.proven):
+                code.append((CHECK_TYPE, type_arg(pool.add_name(stmt.name), stmt.type_name)))
+            code.append(store)
 
         # print(expr);
         elif isinstance(stmt, PrintNode):
-            code.extend(compile_expr(stmt.expr, consts))
-            code.append(("PRINT",))
-            code.append(("CONST", add_const(consts, None)))  # push None after printing
+            code.extend(compile_expr(stmt.expr, pool, scope))
+            code.append((PRINT, 0))
 
         # clear screen
         elif isinstance(stmt, ClearNode):
-            code.append(("CLEAR",))
+            code.append((CLEAR, 0))
 
         elif isinstance(stmt, IfNode):
-            end_jumps = []
+            end = Label()
             for cond, body in stmt.branches:
-                # compile condition
-                code.extend(compile_expr(cond, consts))
-                # jump over body if false
-                jump_if_false_idx = len(code)
-                code.append(("JUMP_IF_FALSE", 0))  # placeholder
-
-                # compile body
-                body_code = compile_program(body).code
-                code.extend(body_code)
-                # jump over remaining branches
-                jump_idx = len(code)
-                code.append(("JUMP", 0))  # placeholder
-                end_jumps.append(jump_idx)
-
-                # backpatch the JUMP_IF_FALSE
-                code[jump_if_false_idx] = ("JUMP_IF_FALSE", len(body_code) + 1)
-
-            # compile else body
+                # a false condition skips to the next branch
+                next_branch = Label()
+                code.extend(compile_branch(cond, next_branch, pool, scope))
+                code.extend(compile_block(body, pool, scope, loops, types))
+                code.append((JUMP, end))
+                code.append((LABEL, next_branch))
             if stmt.else_body:
-                else_code = compile_program(stmt.else_body).code
-                code.extend(else_code)
+                code.extend(compile_block(stmt.else_body, pool, scope, loops, types))
+            code.append((LABEL, end))
 
-            # backpatch jumps after bodies to skip remaining code
-            after_if_idx = len(code)
-            for idx in end_jumps:
-                code[idx] = ("JUMP", after_if_idx - idx)
-
-
-        # while loop
+        # while loop: `continue` re-tests the condition, `break` leaves
         elif isinstance(stmt, WhileNode):
-            start_idx = len(code)
-            code.extend(compile_expr(stmt.condition, consts))
-            body_code = compile_program(stmt.body).code
-            code.append(("JUMP_IF_FALSE", len(body_code) + 1))
-            code.extend(body_code)
-            code.append(("JUMP", -(len(body_code) + 2)))  # jump back to condition
-
-        # for loop
-        elif isinstance(stmt, ForNode):
-            code.extend(compile_expr(stmt.start_expr, consts))
-            code.append(("STORE_NAME", stmt.var_name))
-            end_idx = add_const(consts, stmt.end_expr.eval({}))
-            body_code = compile_program(stmt.body).code
-            code.append(("FOR_LOOP", stmt.var_name, end_idx, body_code))
-
-        # break
-        elif isinstance(stmt, BreakNode):
-            code.append(("BREAK",))
-
-        # continue
-        elif isinstance(stmt, ContinueNode):
-            code.append(("CONTINUE",))
+            start, end = Label(), Label()
+            code.append((LABEL, start))
+            code.extend(compile_branch(stmt.condition, end, pool, scope))
+            code.extend(compile_block(stmt.body, pool, scope, loops + ((end, start),), types))
+            code.append((JUMP, start))
+            code.append((LABEL, end))
+
+        # for loop: the iterator stays on the stack for the whole loop, so
+        # `break` goes through a POP_TOP; FOR_ITER pops it itself when done
+        elif isinstance(stmt, (ForNode, ForInNode)):
+            if isinstance(stmt, ForNode):
+                code.extend(compile_expr(stmt.start_expr, pool, scope))
+                code.extend(compile_expr(stmt.end_expr, pool, scope))
+                if stmt.step_expr is None:
+                    code.append((CONST, pool.add_const(1)))
+                else:
+                    code.extend(compile_expr(stmt.step_expr, pool, scope))
+                code.append((FOR_RANGE, 0))
+            else:
+                code.extend(compile_expr(stmt.iter_expr, pool, scope))
+                code.append((GET_ITER, 0))
+            start, leave, end = Label(), Label(), Label()
+            code.append((LABEL, start))
+            code.append((FOR_ITER, end))
+            code.append(compile_store(stmt.var_name, pool, scope))
+            code.extend(compile_block(stmt.body, pool, scope, loops + ((leave, start),), types))
+            code.append((JUMP, start))
+            code.append((LABEL, leave))
+            code.append((POP_TOP, 0))
+            code.append((LABEL, end))
+
+        # break / continue: jumps to the innermost loop's exit / next iteration
+        elif isinstance(stmt, (BreakNode, ContinueNode)):
+            keyword = "break" if isinstance(stmt, BreakNode) else "continue"
+            if not loops:
+                raise Exception(f"'{keyword}' outside loop")
+            exit_label, continue_label = loops[-1]
+            code.append((JUMP, exit_label if keyword == "break" else continue_label))
 
         # function definition
         elif isinstance(stmt, FunctionNode):
-            func_code = compile_program(stmt.body).code
-            code.append(("MAKE_FUNCTION", stmt.name, stmt.params, func_code))
+            code.append((MAKE_FUNCTION, pool.add_const(compile_function(stmt, pool, types))))
 
-        # function call
+        # function call as a statement: discard the result
         elif isinstance(stmt, CallNode):
-            for arg in stmt.args:
-                code.extend(compile_expr(arg, consts))
-            code.append(("CALL_FUNCTION", stmt.name, len(stmt.args)))
+            code.extend(compile_expr(stmt, pool, scope))
+            code.append((POP_TOP, 0))
 
         # return
         elif isinstance(stmt, ReturnNode):
-            code.extend(compile_expr(stmt.expr, consts))
-            code.append(("RETURN",))
+            if stmt.expr is None:
+                code.append((CONST, pool.add_const(None)))
+            else:
+                code.extend(compile_expr(stmt.expr, pool, scope))
+                # `return f(...)` inside a fn: the callee takes over this frame.
+                # The RETURN stays for host functions, whose value is pushed as usual.
+                if scope is not None and isinstance(stmt.expr, CallNode):
+                    code[-1] = (TAIL_CALL, code[-1][1])
+            code.append((RETURN, 0))
 
         else:
             raise Exception(f"Unhandled stmt in compiler: {stmt}")
 
-    return CodeObject(code, consts, name="__main__")
+    return code
 
 
-def compile_expr(node, consts):
+def compile_expr(node, pool: ConstPool, scope: Scope = None) -> List[Instruction]:
 
-    # number literal
-    if isinstance(node, NumberNode):
-        idx = add_const(consts, node.value)
-        return [("CONST", idx)]
+    # number / string / boolean literal
+    if isinstance(node, (NumberNode, StringNode, BooleanNode)):
+        return [(CONST, pool.add_const(node.value))]
 
-    # string literal
-    if isinstance(node, StringNode):
-        idx = add_const(consts, node.value)
-        return [("CONST", idx)]
+    # variable reference: local slot inside functions, otherwise global
+    if isinstance(node, VariableNode):
+        if scope is not None and node.name in scope.slots:
+            return [(LOAD_FAST, scope.slots[node.name])]
+        return [(LOAD_NAME, pool.add_name(node.name))]
 
-    # boolean literal
-    if isinstance(node, BooleanNode):
-        idx = add_const(consts, node.value)
-        return [("CONST", idx)]
+    # function call
+    if isinstance(node, CallNode):
+        code = []
+        for arg in node.args:
+            code.extend(compile_expr(arg, pool, scope))
+        code.append((CALL_FUNCTION, call_arg(pool.add_name(node.name), len(node.args))))
+        return code
 
-    # variable reference
-    if isinstance(node, VariableNode):
-        return [("LOAD_NAME", node.name)]
+    # and / or: the right operand only runs when the left one does not decide
+    if isinstance(node, BinOpNode) and node.op in SHORT_CIRCUIT:
+        end = Label()
+        code = compile_expr(node.left, pool, scope)
+        code.append((SHORT_CIRCUIT[node.op], end))
+        code.extend(compile_expr(node.right, pool, scope))
+        code.append((LABEL, end))
+        return code
 
     # binary operators
     if isinstance(node, BinOpNode):
-        code = []
-        code.extend(compile_expr(node.left, consts))
-        code.extend(compile_expr(node.right, consts))
-        op_map = {
-            "+": "BINARY_ADD",
-            "-": "BINARY_SUB",
-            "*": "BINARY_MUL",
-            "/": "BINARY_DIV",
-            "%": "BINARY_MOD",
-            "==": "COMPARE_EQ",
-            "!=": "COMPARE_NE",
-            "<": "COMPARE_LT",
-            "<=": "COMPARE_LE",
-            ">": "COMPARE_GT",
-            ">=": "COMPARE_GE",
-            "and": "BINARY_AND",
-            "or": "BINARY_OR",
-        }
-        if node.op not in op_map:
+        if node.op not in BINARY_OPS:
             raise Exception(f"Unknown binary op: {node.op}")
-        code.append((op_map[node.op],))
+        left = compile_expr(node.left, pool, scope)
+        right = compile_expr(node.right, pool, scope)
+        pair = fuse_loads(left, right)
+        code = [pair] if pair else left + right
+        code.append((BINARY_OPS[node.op], 0))
         return code
 
     # unary operators
     if isinstance(node, UnaryOpNode):
-        code = compile_expr(node.expr, consts)
-        op_map = {"-": "UNARY_NEG", "not": "UNARY_NOT"}
-        if node.op not in op_map:
+        code = compile_expr(node.expr, pool, scope)
+        if node.op not in UNARY_OPS:
             raise Exception(f"Unknown unary op: {node.op}")
-        code.append((op_map[node.op],))
+        code.append((UNARY_OPS[node.op], 0))
         return code
 
     # list literal
     if isinstance(node, ListNode):
         code = []
         for elem in node.elements:
-            code.extend(compile_expr(elem, consts))
-        code.append(("BUILD_LIST", len(node.elements)))
+            code.extend(compile_expr(elem, pool, scope))
+        code.append((BUILD_LIST, len(node.elements)))
         return code
 
     # dict literal
     if isinstance(node, DictNode):
         code = []
         for k, v in node.entries:
-            code.extend(compile_expr(k, consts))
-            code.extend(compile_expr(v, consts))
-        code.append(("BUILD_DICT", len(node.entries)))
+            code.extend(compile_expr(k, pool, scope))
+            code.extend(compile_expr(v, pool, scope))
+        code.append((BUILD_DICT, len(node.entries)))
         return code
 
     # index access
     if isinstance(node, IndexNode):
-        code = compile_expr(node.collection, consts)
-        code.extend(compile_expr(node.index, consts))
-        code.append(("BINARY_SUBSCR",))
+        code = compile_expr(node.collection, pool, scope)
+        code.extend(compile_expr(node.index, pool, scope))
+        code.append((BINARY_SUBSCR, 0))
         return code
 
     raise Exception(f"Unhandled expr: {node}")
 
 
-def add_const(consts: List[Any], v: Any) -> int:
-    consts.append(v)
-    return len(consts) - 1
+def compile_branch(cond, target: Label, pool: ConstPool, scope: Scope = None,
+                   when: bool = False) -> List[Instruction]:
+    """
+    Code that jumps to `target` when `cond` is `when` and falls through
+    otherwise. `and`, `or` and `not` become jumps rather than values, and a
+    trailing compare fuses into COMPARE_*_JUMP when jumping on false.
+    """
+    if isinstance(cond, BinOpNode) and cond.op in SHORT_CIRCUIT:
+        if (cond.op == "and") != when:
+            # false `and` / true `or`: either operand alone decides
+            return (compile_branch(cond.left, target, pool, scope, when)
+                    + compile_branch(cond.right, target, pool, scope, when))
+        # otherwise the left operand can only rule the jump out
+        skip = Label()
+        code = compile_branch(cond.left, skip, pool, scope, not when)
+        code.extend(compile_branch(cond.right, target, pool, scope, when))
+        code.append((LABEL, skip))
+        return code
+
+    if isinstance(cond, UnaryOpNode) and cond.op == "not":
+        return compile_branch(cond.expr, target, pool, scope, not when)
+
+    code = compile_expr(cond, pool, scope)
+    op = code[-1][0]
+    if op in COMPARE_JUMP and not when:
+        code[-1] = (COMPARE_JUMP[op], target)
+    else:
+        code.append((JUMP_IF_TRUE if when else JUMP_IF_FALSE, target))
+    return code
+
+
+def is_increment(stmt: LetNode) -> bool:
+    """`x = x + 1` with an int literal 1."""
+    e = stmt.expr
+    return (
+        isinstance(e, BinOpNode) and e.op == "+"
+        and isinstance(e.left, VariableNode) and e.left.name == stmt.name
+        and isinstance(e.right, NumberNode) and type(e.right.value) is int and e.right.value == 1
+    )
+
+
+def fuse_loads(left: List[Instruction], right: List[Instruction]):
+    """Single-instruction operands become one LOAD_*_PAIR / LOAD_*_CONST, else None."""
+    if len(left) != 1 or len(right) != 1:
+        return None
+    (lop, a), (rop, b) = left[0], right[0]
+    fused = LOAD_PAIRS.get((lop, rop))
+    if fused is None or a > PAIR_MASK >> 1 or b > PAIR_MASK:
+        return None
+    return (fused, (a << PAIR_BITS) | b)
+
+
+def call_arg(name_idx: int, argc: int) -> int:
+    if argc > CALL_ARGC_MASK:
+        raise Exception(f"Too many arguments in call: {argc}")
+    return (name_idx << CALL_ARGC_BITS) | argc
+
+
+def type_arg(name_idx: int, type_name: str) -> int:
+    return (name_idx << TYPE_BITS) | TYPE_NAMES.index(type_name)
+
+
+def assemble(instructions: List[Instruction]) -> array:
+    """Flatten (opcode, arg) pairs into a compact array of words."""
+    return array("i", chain.from_iterable(instructions))
+
+
+def iter_instructions(code: array) -> Iterator[Instruction]:
+    for i in range(0, len(code), 2):
+        yield code[i], code[i + 1]
+
+
+def disassemble(co: CodeObject) -> List[Tuple[str, int]]:
+    """Readable (opname, arg) listing of a code object, mostly for tests and debugging."""
+    return [(OPNAMES[op], arg) for op, arg in iter_instructions(co.code)]
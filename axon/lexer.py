@@ -1,83 +1,201 @@
 # axon/lexer.py
+"""
+Single-pass tokenizer.
+
+Each token is one match of TOKEN_RE: whitespace and `//` comments in front of
+it are skipped inside the same match, identifiers are matched once and then
+classified by a dict lookup (keywords, word operators), and punctuation is
+typed by its character. Tokens only record their source offset; line and
+column are worked out when an error has to be reported.
+
+`TokenStream` tokenizes lazily, from a string or chunk by chunk from a file
+or mmap, so a parser never needs the whole token list (or file) in memory.
+"""
+from typing import Iterator, List, Tuple
+import codecs
 import re
-from dataclasses import dataclass
-from typing import List
-
-# ---------------------
-# Token specifications
-# ---------------------
-TOKEN_SPEC = [
-
-    # --- Literals ---
-    ('NUMBER',      r'\d+(\.\d*)?'),
-    ('STRING',      r'"([^"\\]|\\.)*"'),
-
-    # --- Keywords ---
-    ('LET',         r'\blet\b'),
-    ('IF',          r'\bif\b'),
-    ('ELSE',        r'\belse\b'),
-    ('WHILE',       r'\bwhile\b'),
-    ('FOR',         r'\bfor\b'),
-    ('BREAK',       r'\bbreak\b'),
-    ('CONTINUE',    r'\bcontinue\b'),
-    ('FUNCTION',    r'\bfn\b'),
-    ('RETURN',      r'\breturn\b'),
-    ('TRUE',        r'\btrue\b'),
-    ('FALSE',       r'\bfalse\b'),
-    ('CLEAR',       r'\bcls\b'),
-
-    # --- Operators (all as generic OP) ---
-    ('OP',          r'==|!=|<=|>=|<|>|\+|-|\*|/|%|=|and\b|or\b|not\b'),
-
-    # --- Delimiters ---
-    ('LPAREN',      r'\('),
-    ('RPAREN',      r'\)'),
-    ('LBRACE',      r'\{'),
-    ('RBRACE',      r'\}'),
-    ('LBRACKET',    r'\['),
-    ('RBRACKET',    r'\]'),
-    ('COMMA',       r','),
-    ('SEMICOLON',   r';'),
-    ('COLON',     r':'),
-
-    # --- Identifiers ---
-    ('IDENT',       r'[A-Za-z_][A-Za-z0-9_]*'),
-
-    # --- Whitespace / misc ---
-    ('SKIP',        r'[ \t]+'),
-    ('NEWLINE',     r'\n'),
-    ('MISMATCH',    r'.'),
-]
-
-TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPEC))
+
+# identifiers that are not IDENT tokens
+KEYWORDS = {
+    'let': 'LET',
+    'if': 'IF',
+    'else': 'ELSE',
+    'while': 'WHILE',
+    'for': 'FOR',
+    'break': 'BREAK',
+    'continue': 'CONTINUE',
+    'fn': 'FUNCTION',
+    'return': 'RETURN',
+    'true': 'TRUE',
+    'false': 'FALSE',
+    'cls': 'CLEAR',
+    'and': 'OP',
+    'or': 'OP',
+    'not': 'OP',
+}
+
+PUNCTUATION = {
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '{': 'LBRACE',
+    '}': 'RBRACE',
+    '[': 'LBRACKET',
+    ']': 'RBRACKET',
+    ',': 'COMMA',
+    ';': 'SEMICOLON',
+    ':': 'COLON',
+}
+
+# group numbers of TOKEN_RE
+IDENT, NUMBER, STRING, OP, PUNCT, MISMATCH, END = range(1, 8)
+
+TOKEN_RE = re.compile(
+    r'(?:[ \t\r\n]+|//[^\n]*)*'          # skipped: whitespace, comments
+    r'(?:([A-Za-z_][A-Za-z0-9_]*)'       # IDENT (keywords too)
+    r'|(\d+(?:\.\d*)?)'                  # NUMBER
+    r'|("(?:[^"\\]|\\.)*")'              # STRING
+    r'|(==|!=|<=|>=|[<>+\-*/%=])'        # OP
+    r'|([()\[\]{},;:])'                  # PUNCT
+    r'|([^ \t\r\n])'                     # MISMATCH
+    r'|(\Z))'                           # END: trailing whitespace/comments
+)
+
+
+# characters read at a time when tokenizing a stream
+CHUNK_SIZE = 1 << 20
+
 
 class Token:
-    def __init__(self, type_, value, line, col):
+    __slots__ = ('type', 'value', 'pos')
+
+    def __init__(self, type_, value, pos):
         self.type = type_
         self.value = value
-        self.line = line
-        self.col = col
+        self.pos = pos      # offset into the source
+
     def __repr__(self):
         return f'Token({self.type}, {self.value})'
 
-def tokenize(code):
-    line_num = 1
-    line_start = 0
-    tokens = []
-    for mo in TOKEN_RE.finditer(code):
-        kind = mo.lastgroup
-        value = mo.group()
-        col = mo.start() - line_start + 1
-        if kind == 'NUMBER':
-            value = float(value) if '.' in value else int(value)
-        elif kind == 'STRING':
-            value = bytes(value[1:-1], "utf-8").decode("unicode_escape")
-        elif kind in ('NEWLINE', 'SKIP'):
-            if kind == 'NEWLINE':
-                line_num += 1
-                line_start = mo.end()
+
+def decode_string(literal: str) -> str:
+    body = literal[1:-1]
+    if '\\' not in body:
+        return body
+    # escape non-Latin-1 characters first so unicode_escape leaves them intact
+    return body.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def tokenize(code: str) -> List[Token]:
+    return list(TokenStream(code))
+
+
+def read_chunks(f, size: int) -> Iterator[str]:
+    """Text chunks of a text or binary file object / mmap (binary is UTF-8)."""
+    decoder = None
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        if isinstance(data, str):
+            yield data
             continue
-        elif kind == 'MISMATCH':
-            raise SyntaxError(f'Unexpected {value!r} at line {line_num}')
-        tokens.append(Token(kind, value, line_num, col))
-    return tokens
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+        yield decoder.decode(data)
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+
+class TokenStream:
+    """
+    Iterator of Tokens over a str, a text or binary file object, or an mmap.
+
+    Streams are read `chunk_size` characters at a time and each chunk is
+    tokenized up to its last newline; the rest carries over to the next one.
+    No token but a string literal can span a newline, and an unterminated
+    string carries over until more input completes it. Only the current and
+    previous chunk are kept, which is enough for `line_col` to locate the
+    tokens a parser still holds.
+    """
+
+    def __init__(self, source, chunk_size: int = CHUNK_SIZE):
+        self.base = 0           # offset of text[0] in the source
+        self.text = ''          # current chunk
+        self.lines_before = 0   # newlines before `base`
+        self.line_start = 0     # offset of the line `base` is on
+        self.prev = None        # (base, text, lines_before, line_start) of the previous chunk
+        if isinstance(source, str):
+            chunks = iter((source,))
+        else:
+            chunks = read_chunks(source, chunk_size)
+        self._tokens = self._scan(chunks)
+
+    def __iter__(self) -> Iterator[Token]:
+        # the generator itself, so consumers skip a Python-level __next__ per token
+        return self._tokens
+
+    def line_col(self, pos: int) -> Tuple[int, int]:
+        base, text, lines_before, line_start = self.base, self.text, self.lines_before, self.line_start
+        if pos < base and self.prev is not None:
+            base, text, lines_before, line_start = self.prev
+        off = pos - base
+        line = lines_before + text.count('\n', 0, off) + 1
+        last = text.rfind('\n', 0, off)
+        return line, (off - last if last >= 0 else pos - line_start + 1)
+
+    def _advance(self, consumed: int, text: str):
+        """Move past `consumed` characters of the current chunk; `text` becomes current."""
+        old = self.text
+        self.prev = (self.base, old, self.lines_before, self.line_start)
+        nl = old.count('\n', 0, consumed)
+        if nl:
+            self.lines_before += nl
+            self.line_start = self.base + old.rfind('\n', 0, consumed) + 1
+        self.base += consumed
+        self.text = text
+
+    def _scan(self, chunks: Iterator[str]) -> Iterator[Token]:
+        consumed = 0
+        pending = ''
+        chunk = next(chunks, None)
+        while chunk is not None:
+            following = next(chunks, None)
+            final = following is None
+            text = pending + chunk
+            end = len(text) if final else text.rfind('\n') + 1
+            if not end:
+                # no complete line yet
+                pending, chunk = text, following
+                continue
+            self._advance(consumed, text)
+            consumed = yield from self._scan_text(text, end, final)
+            pending, chunk = text[consumed:], following
+
+    def _scan_text(self, text: str, end: int, final: bool) -> Iterator[Token]:
+        """Yield tokens of text[:end]; returns where the next chunk has to resume."""
+        base = self.base
+        keywords = KEYWORDS
+        for mo in TOKEN_RE.finditer(text, 0, end):
+            kind = mo.lastindex
+            value = mo.group(kind)
+            if kind == IDENT:
+                yield Token(keywords.get(value, 'IDENT'), value, base + mo.start(kind))
+            elif kind == PUNCT:
+                yield Token(PUNCTUATION[value], value, base + mo.start(kind))
+            elif kind == OP:
+                yield Token('OP', value, base + mo.start(kind))
+            elif kind == NUMBER:
+                yield Token('NUMBER', float(value) if '.' in value else int(value), base + mo.start(kind))
+            elif kind == STRING:
+                yield Token('STRING', decode_string(value), base + mo.start(kind))
+            elif kind == END:
+                break
+            elif value == '"' and not final:
+                # a string literal that continues past this chunk
+                return mo.start(kind)
+            else:
+                line, col = self.line_col(base + mo.start(kind))
+                raise SyntaxError(f'Unexpected {value!r} at line {line}, col {col}')
+        return end
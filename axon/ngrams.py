@@ -0,0 +1,114 @@
+# axon/ngrams.py
+"""
+Opcode n-gram frequencies over a corpus of Axon scripts: the data behind the
+compiler's superinstructions (INC_NAME, LOAD_NAME_PAIR, COMPARE_*_JUMP, ...).
+
+Static counts look at the compiled code; dynamic counts (the default) run
+each script and count the sequences actually executed, so loop bodies weigh
+as much as they cost.
+
+    python -m axon.ngrams examples/ scripts/ [-n 3] [--static] [--top 20]
+"""
+from collections import Counter
+from typing import Iterable, List, Tuple
+import argparse
+import os
+import sys
+
+from axon.cache import compile_source
+from axon.compiler import CodeObject, iter_instructions
+from axon.opcodes import OPNAMES
+from axon.optimizer import code_objects
+from axon.vm import VM
+
+def static_ngrams(co: CodeObject, n: int = 2) -> Counter:
+    """n-grams of consecutive instructions in `co` and every nested code object."""
+    counts = Counter()
+    for code_obj in code_objects(co):
+        ops = [OPNAMES[op] for op, _ in iter_instructions(code_obj.code)]
+        for i in range(len(ops) - n + 1):
+            counts[tuple(ops[i:i + n])] += 1
+    return counts
+
+
+def dynamic_ngrams(co: CodeObject, n: int = 2) -> Counter:
+    """
+    Run `co` (output discarded) and count executed n-grams. Only instructions
+    that follow each other in the code count as a sequence; a taken jump, a
+    call or a return starts a new one, since no superinstruction can span those.
+    """
+    counts = Counter()
+    window: List[Tuple[object, int, str]] = []   # (frame, ip, opname)
+    # tier-2 code bypasses the handlers, so keep everything in the VM
+    vm = VM(tier=False)
+    vm.globals["print"] = lambda v: None
+
+    def traced(name, handler):
+        def handler_with_trace(f, arg):
+            ip = f.ip - 2
+            if window and (window[-1][0] is not f or window[-1][1] != ip - 2):
+                window.clear()
+            window.append((f, ip, name))
+            if len(window) > n:
+                del window[0]
+            if len(window) == n:
+                counts[tuple(w[2] for w in window)] += 1
+            return handler(f, arg)
+        return handler_with_trace
+
+    vm.handlers = [traced(name, h) for name, h in zip(OPNAMES, vm.handlers)]
+    vm.push_frame(co)
+    vm.run()
+    return counts
+
+
+def corpus_files(paths: Iterable[str]) -> List[str]:
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirnames, filenames in os.walk(p):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("__"))
+                files.extend(os.path.join(dirpath, fn) for fn in sorted(filenames) if fn.endswith(".ax"))
+        else:
+            files.append(p)
+    return files
+
+
+def corpus_ngrams(paths: Iterable[str], n: int = 2, static: bool = False, optimize: int = 0) -> Counter:
+    """Sum of per-script counts; scripts that fail to compile or run are reported and skipped."""
+    total = Counter()
+    for path in corpus_files(paths):
+        with open(path, "rb") as f:
+            source = f.read()
+        try:
+            co = compile_source(source, optimize)
+            total += static_ngrams(co, n) if static else dynamic_ngrams(co, n)
+        except Exception as e:
+            print(f"[!!] {path}: {e}", file=sys.stderr)
+    return total
+
+
+def report(counts: Counter, top: int = 20) -> str:
+    total = sum(counts.values())
+    if not total:
+        return "no instructions counted"
+    lines = [f"{total} n-grams, {len(counts)} distinct"]
+    for gram, c in counts.most_common(top):
+        lines.append(f"{c:>10}  {c / total:6.1%}  {' '.join(gram)}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m axon.ngrams", description="Count opcode n-grams over Axon scripts.")
+    ap.add_argument("paths", nargs="+", help=".ax files or directories searched recursively")
+    ap.add_argument("-n", type=int, default=2, help="sequence length (default 2)")
+    ap.add_argument("--static", action="store_true", help="count compiled code instead of executed instructions")
+    ap.add_argument("--top", type=int, default=20, help="how many n-grams to list")
+    ap.add_argument("-O", dest="optimize", action="count", default=0, help="optimize before counting")
+    args = ap.parse_args(argv)
+    counts = corpus_ngrams(args.paths, n=args.n, static=args.static, optimize=args.optimize)
+    print(report(counts, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,109 +1,290 @@
 # axon/nodes.py
+"""
+AST node classes. Every node has __slots__: a large script is a large tree,
+and per-instance dicts would dominate parse memory.
 
+Each node's `eval(env)` is also a tree-walking interpreter (`interpret`).
+Variables live in parent-linked `Environment`s: one for the globals and one
+per call whose parent is the environment the function was defined in, so a
+call costs the same however many globals the program has.
+
+`return f(...)` inside a function is a tail call: it unwinds to the running
+call, which runs `f` in its place, so tail recursion needs no Python stack.
+Other calls nest Python frames and fail with an Axon RecursionError once
+`MAX_CALL_DEPTH` calls are live. `interpret` runs the program through
+`run_deep`, in a thread whose stack and recursion limit leave room for that
+many calls; a call nesting more than PY_FRAMES_PER_CALL Python frames may
+still hit Python's limit first, which fails with the same error.
+"""
 import os
+import sys
+import threading
+
+# nested calls a program may make before RecursionError
+MAX_CALL_DEPTH = 100_000
+
+# Python frames the AST engines nest per Axon call (a body's own blocks add
+# some), the C stack reserved per Python frame, and the thread stacks
+# run_deep asks for; past the largest, the recursion limit shrinks to fit
+PY_FRAMES_PER_CALL = 8
+STACK_PER_FRAME = 1024
+MIN_THREAD_STACK = 8 << 20
+MAX_THREAD_STACK = 512 << 20
+# Python frames run_deep allows beyond the calls: its own, and the engine's below the first call
+DEEP_HEADROOM = 20
+
+# -----------------------------
+# Environments
+# -----------------------------
+class Environment:
+    __slots__ = ('vars', 'parent', 'budget')
+    def __init__(self, parent=None, vars=None, budget=MAX_CALL_DEPTH):
+        self.vars = {} if vars is None else vars
+        self.parent = parent
+        self.budget = budget    # calls that may still nest below this one
+
+    def lookup(self, name):
+        env = self
+        while env is not None:
+            vars = env.vars
+            if name in vars:
+                return vars[name]
+            env = env.parent
+        raise RuntimeError(f"NameError: name '{name}' is not defined")
+
+    def declare(self, name, value):
+        """`let` / params / loop variables: always bind in this environment."""
+        self.vars[name] = value
+
+    def assign(self, name, value):
+        """Bare `x = ...`: rebind where x is defined, else it becomes a global."""
+        env = self
+        while name not in env.vars and env.parent is not None:
+            env = env.parent
+        env.vars[name] = value
+
+class FunctionValue:
+    """A FunctionNode bound to the environment it was defined in."""
+    __slots__ = ('node', 'env')
+    def __init__(self, node, env):
+        self.node = node
+        self.env = env
+    def __repr__(self):
+        return f"<fn {self.node.name}>"
+
+# host functions every program sees
+BUILTINS = {
+    'print': print,
+    'len': len,
+    'type': lambda v: type(v).__name__,
+}
+
+# builtins whose calls have no effect and depend only on their arguments: the
+# optimizer may move and share them (a host that binds these names must keep that true)
+PURE_BUILTINS = frozenset({'len', 'type'})
+
+# what `for x in ...` can walk; dicts give their keys
+ITERABLE_TYPES = (list, dict, str)
+
+# the types a `let x: T = ...` / `fn f(x: T)` annotation can name
+ANNOTATION_TYPES = {'int': int, 'float': float, 'str': str, 'bool': bool, 'list': list, 'dict': dict}
+
+def loop_range(start, stop, step=1):
+    """The counter of `for i = start to stop step s`, shared by every engine."""
+    try:
+        return iter(range(start, stop, step))
+    except TypeError:
+        names = ", ".join(type(v).__name__ for v in (start, stop, step))
+        raise RuntimeError(f"TypeError: for loop bounds must be integers, got {names}") from None
+    except ValueError:
+        raise RuntimeError("ValueError: for loop step must not be zero") from None
+
+def loop_iter(value):
+    """An iterator over `value` itself (no copy is made) for `for x in value`."""
+    if not isinstance(value, ITERABLE_TYPES):
+        raise RuntimeError(f"TypeError: cannot iterate over {type(value).__name__}")
+    return iter(value)
+
+def check_type(value, type_name, name):
+    """`value`, bound to `name` annotated `type_name`. Types match exactly: an int is no float, a bool no int."""
+    if type(value) is not ANNOTATION_TYPES[type_name]:
+        raise RuntimeError(f"TypeError: {name} must be {type_name}, got {type(value).__name__}")
+    return value
+
+def run_deep(func, max_depth, frames_per_call=PY_FRAMES_PER_CALL):
+    """
+    `func()` in a thread whose stack and recursion limit fit `max_depth`
+    nested Axon calls of `frames_per_call` Python frames each. Returns its
+    result or raises its error.
+    """
+    frames = min(max_depth * frames_per_call, MAX_THREAD_STACK // STACK_PER_FRAME) + DEEP_HEADROOM
+    outcome = []
+
+    def target():
+        # the limit is per interpreter: the caller waits in join() meanwhile,
+        # and gets its own limit back before it runs Python code again
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(frames)
+        try:
+            outcome.append((True, func()))
+        except BaseException as e:
+            outcome.append((False, e))
+        finally:
+            sys.setrecursionlimit(limit)
+
+    old_size = threading.stack_size(max(frames * STACK_PER_FRAME, MIN_THREAD_STACK))
+    try:
+        thread = threading.Thread(target=target, name="axon-deep", daemon=True)
+        thread.start()
+    finally:
+        threading.stack_size(old_size)
+    thread.join()
+    ok, value = outcome[0]
+    if not ok:
+        raise value
+    return value
+
+def interpret(prog, env=None, max_depth=MAX_CALL_DEPTH):
+    """Run a program with the nodes' own `eval`; returns the global environment."""
+    stmts = prog.statements if hasattr(prog, "statements") else prog
+    if env is None:
+        env = Environment(vars=dict(BUILTINS))
+    env.budget = max_depth
+
+    def run():
+        try:
+            for stmt in stmts:
+                stmt.eval(env)
+        except ReturnException:
+            pass  # a top-level `return` ends the program
+    run_deep(run, max_depth)
+    return env
 
 # -----------------------------
 # Expressions
 # -----------------------------
 class NumberNode:
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
-    def eval(self, context):
+    def eval(self, env):
         return self.value
 
 class StringNode:
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
-    def eval(self, context):
+    def eval(self, env):
         return self.value
 
 class BooleanNode:
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
-    def eval(self, context):
+    def eval(self, env):
         return self.value
 
 class VariableNode:
+    __slots__ = ('name',)
     def __init__(self, name):
         self.name = name
-    def eval(self, context):
-        return context.get(self.name, 0)
+    def eval(self, env):
+        return env.lookup(self.name)
 
 class BinOpNode:
+    __slots__ = ('left', 'op', 'right')
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
         self.right = right
-    def eval(self, context):
-        left = self.left.eval(context)
-        right = self.right.eval(context)
+    def eval(self, env):
+        left = self.left.eval(env)
+        # and / or short-circuit: the right operand only runs when it decides
+        if self.op == 'and': return left and self.right.eval(env)
+        if self.op == 'or': return left or self.right.eval(env)
+        right = self.right.eval(env)
         if self.op == '+': return left + right
         if self.op == '-': return left - right
         if self.op == '*': return left * right
         if self.op == '/': return left / right
+        if self.op == '%': return left % right
         if self.op == '==': return left == right
         if self.op == '!=': return left != right
         if self.op == '<': return left < right
         if self.op == '>': return left > right
         if self.op == '<=': return left <= right
         if self.op == '>=': return left >= right
-        if self.op == 'and': return left and right
-        if self.op == 'or': return left or right
         raise ValueError(f"Unknown operator {self.op}")
 
 class UnaryOpNode:
+    __slots__ = ('op', 'expr')
     def __init__(self, op, expr):
         self.op = op
         self.expr = expr
-    def eval(self, context):
-        val = self.expr.eval(context)
+    def eval(self, env):
+        val = self.expr.eval(env)
         if self.op == '-': return -val
         if self.op == 'not': return not val
         raise ValueError(f"Unknown unary operator {self.op}")
 
 class ListNode:
+    __slots__ = ('elements',)
     def __init__(self, elements):
         self.elements = elements
-    def eval(self, context):
-        return [e.eval(context) for e in self.elements]
+    def eval(self, env):
+        return [e.eval(env) for e in self.elements]
 
 class IndexNode:
+    __slots__ = ('collection', 'index')
     def __init__(self, collection, index):
         self.collection = collection
         self.index = index
-    def eval(self, context):
-        coll = self.collection.eval(context)
-        idx = self.index.eval(context)
+    def eval(self, env):
+        coll = self.collection.eval(env)
+        idx = self.index.eval(env)
         return coll[idx]
 
 class DictNode:
+    __slots__ = ('entries',)
     def __init__(self, entries):
         self.entries = entries  # list of (key, value) tuples
-    def eval(self, context):
-        return {k.eval(context): v.eval(context) for k, v in self.entries}
+    def eval(self, env):
+        return {k.eval(env): v.eval(env) for k, v in self.entries}
 
 # -----------------------------
 # Statements
 # -----------------------------
 class PrintNode:
+    __slots__ = ('expr',)
     def __init__(self, expr):
         self.expr = expr
-    def eval(self, context):
-        print(self.expr.eval(context))
+    def eval(self, env):
+        env.lookup('print')(self.expr.eval(env))
 
 class LetNode:
-    def __init__(self, name, expr):
+    __slots__ = ('name', 'expr', 'declare', 'type_name')
+    def __init__(self, name, expr, declare=True, type_name=None):
         self.name = name
         self.expr = expr
-    def eval(self, context):
-        context[self.name] = self.expr.eval(context)
+        self.declare = declare  # False for a bare `x = ...` reassignment
+        self.type_name = type_name  # `let x: int = ...`; None when not annotated
+    def eval(self, env):
+        value = self.expr.eval(env)
+        if self.type_name is not None:
+            check_type(value, self.type_name, self.name)
+        if self.declare:
+            env.declare(self.name, value)
+        else:
+            env.assign(self.name, value)
 
 class ClearNode:
+    __slots__ = ()
     @staticmethod
-    def eval(context):
+    def eval(env):
         os.system('cls' if os.name == 'nt' else 'clear')
 
 class IfNode:
+    __slots__ = ('branches', 'else_body')
     def __init__(self, branches, else_body=None):
         """
         branches: list of tuples [(condition_node, body_nodes)]
@@ -112,97 +293,171 @@ class IfNode:
         self.branches = branches
         self.else_body = else_body or []
 
-    def eval(self, context):
+    def eval(self, env):
         for cond, body in self.branches:
-            if cond.eval(context):
+            if cond.eval(env):
                 for stmt in body:
-                    stmt.eval(context)
+                    stmt.eval(env)
                 return None
         # else
         for stmt in self.else_body:
-            stmt.eval(context)
+            stmt.eval(env)
         return None
 
 class WhileNode:
+    __slots__ = ('condition', 'body')
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
-    def eval(self, context):
-        while self.condition.eval(context):
-            for stmt in self.body:
-                try:
-                    stmt.eval(context)
-                except BreakException:
-                    break
-                except ContinueException:
-                    continue
+    def eval(self, env):
+        while self.condition.eval(env):
+            try:
+                for stmt in self.body:
+                    stmt.eval(env)
+            except BreakException:
+                break
+            except ContinueException:
+                continue
 
 class ForNode:
-    def __init__(self, var_name, start_expr, end_expr, body):
+    """`for i = start to end step s { }`: start included, end excluded; no step counts by 1."""
+    __slots__ = ('var_name', 'start_expr', 'end_expr', 'body', 'step_expr')
+    def __init__(self, var_name, start_expr, end_expr, body, step_expr=None):
         self.var_name = var_name
         self.start_expr = start_expr
         self.end_expr = end_expr
         self.body = body
-    def eval(self, context):
-        start = self.start_expr.eval(context)
-        end = self.end_expr.eval(context)
-        for i in range(start, end):
-            context[self.var_name] = i
-            for stmt in self.body:
-                try:
-                    stmt.eval(context)
-                except BreakException:
-                    break
-                except ContinueException:
-                    continue
+        self.step_expr = step_expr
+    def eval(self, env):
+        start = self.start_expr.eval(env)
+        end = self.end_expr.eval(env)
+        step = 1 if self.step_expr is None else self.step_expr.eval(env)
+        for i in loop_range(start, end, step):
+            env.declare(self.var_name, i)
+            try:
+                for stmt in self.body:
+                    stmt.eval(env)
+            except BreakException:
+                break
+            except ContinueException:
+                continue
+
+class ForInNode:
+    """`for x in expr { }`: the items of a list or string, or the keys of a dict."""
+    __slots__ = ('var_name', 'iter_expr', 'body')
+    def __init__(self, var_name, iter_expr, body):
+        self.var_name = var_name
+        self.iter_expr = iter_expr
+        self.body = body
+    def eval(self, env):
+        for item in loop_iter(self.iter_expr.eval(env)):
+            env.declare(self.var_name, item)
+            try:
+                for stmt in self.body:
+                    stmt.eval(env)
+            except BreakException:
+                break
+            except ContinueException:
+                continue
 
 class BreakNode:
+    __slots__ = ()
     @staticmethod
-    def eval(context):
+    def eval(env):
         raise BreakException()
 
 class ContinueNode:
+    __slots__ = ()
     @staticmethod
-    def eval(context):
+    def eval(env):
         raise ContinueException()
 
 class BreakException(Exception): pass
 class ContinueException(Exception): pass
 
+class ReturnException(Exception):
+    """Unwinds a call from wherever its `return` is, loops and ifs included."""
+    def __init__(self, value):
+        self.value = value
+
+class TailCall(Exception):
+    """`return f(...)` of a user function: the running call replaces its body with `f`'s."""
+    def __init__(self, name, func, args):
+        self.name = name
+        self.func = func
+        self.args = args
+
 # -----------------------------
 # Functions
 # -----------------------------
 class FunctionNode:
-    def __init__(self, name, params, body):
+    __slots__ = ('name', 'params', 'body', 'param_types')
+    def __init__(self, name, params, body, param_types=None):
         self.name = name
         self.params = params
         self.body = body
-    def eval(self, context):
-        context[self.name] = self
+        # one annotation (or None) per param; None when no param is annotated
+        self.param_types = param_types
+    def eval(self, env):
+        # bound like a bare assignment: a global unless a local has the name
+        env.assign(self.name, FunctionValue(self, env))
 
 class CallNode:
+    __slots__ = ('name', 'args')
     def __init__(self, name, args):
         self.name = name
         self.args = args
-    def eval(self, context):
-        func = context.get(self.name)
-        if not isinstance(func, FunctionNode):
-            # built-ins
-            if self.name == 'len':
-                return len(self.args[0].eval(context))
-            if self.name == 'type':
-                return type(self.args[0].eval(context)).__name__
-            raise ValueError(f"{self.name} is not a function")
-        local_ctx = context.copy()
-        for p, a in zip(func.params, self.args):
-            local_ctx[p] = a.eval(context)
-        result = None
-        for stmt in func.body:
-            result = stmt.eval(local_ctx)
-        return result
+    def resolve(self, env):
+        """The callee and the evaluated arguments."""
+        try:
+            func = env.lookup(self.name)
+        except RuntimeError:
+            raise RuntimeError(f"NameError: function '{self.name}' is not defined") from None
+        args = [a.eval(env) for a in self.args]
+        if type(func) is not FunctionValue and not callable(func):
+            raise RuntimeError(f"NameError: function '{self.name}' is not defined")
+        return func, args
+
+    def eval(self, env):
+        func, args = self.resolve(env)
+        if type(func) is not FunctionValue:
+            return func(*args)
+        name = self.name
+        budget = env.budget - 1
+        if budget < 0:
+            raise RuntimeError(f"RecursionError: maximum call depth exceeded in {name}()")
+        while True:
+            node = func.node
+            if len(args) != len(node.params):
+                raise RuntimeError(f"TypeError: {name}() takes {len(node.params)} arguments but {len(args)} were given")
+            # a fresh frame holding only the params; everything else resolves through `parent`
+            local = Environment(func.env, dict(zip(node.params, args)), budget)
+            if node.param_types is not None:
+                for p, t, v in zip(node.params, node.param_types, args):
+                    if t is not None:
+                        check_type(v, t, p)
+            try:
+                for stmt in node.body:
+                    stmt.eval(local)
+            except ReturnException as r:
+                return r.value
+            except TailCall as t:
+                name, func, args = t.name, t.func, t.args
+                continue
+            except RecursionError:
+                raise RuntimeError(f"RecursionError: maximum call depth exceeded in {name}()") from None
+            return None
 
 class ReturnNode:
+    __slots__ = ('expr',)
     def __init__(self, expr):
         self.expr = expr
-    def eval(self, context):
-        return self.expr.eval(context)
+    def eval(self, env):
+        expr = self.expr
+        # inside a call, a user function called in tail position reuses the call
+        if type(expr) is CallNode and env.parent is not None:
+            func, args = expr.resolve(env)
+            if type(func) is FunctionValue:
+                raise TailCall(expr.name, func, args)
+            raise ReturnException(func(*args))
+        raise ReturnException(None if expr is None else expr.eval(env))
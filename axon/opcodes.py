@@ -0,0 +1,143 @@
+# axon/opcodes.py
+"""
+Axon bytecode opcodes.
+
+Every opcode is a small integer so the VM can dispatch through a table
+indexed by opcode instead of comparing opcode names one by one.
+"""
+from typing import Dict, List
+
+OPNAMES: List[str] = []
+OPMAP: Dict[str, int] = {}
+
+
+def def_op(name: str) -> int:
+    op = len(OPNAMES)
+    OPNAMES.append(name)
+    OPMAP[name] = op
+    return op
+
+
+# ----- constants / variables -----
+CONST = def_op("CONST")
+LOAD_NAME = def_op("LOAD_NAME")
+STORE_NAME = def_op("STORE_NAME")
+LOAD_FAST = def_op("LOAD_FAST")      # arg: local slot of the current frame
+STORE_FAST = def_op("STORE_FAST")
+
+# ----- binary ops -----
+BINARY_ADD = def_op("BINARY_ADD")
+BINARY_SUB = def_op("BINARY_SUB")
+BINARY_MUL = def_op("BINARY_MUL")
+BINARY_DIV = def_op("BINARY_DIV")
+BINARY_MOD = def_op("BINARY_MOD")
+
+# ----- compares -----
+COMPARE_EQ = def_op("COMPARE_EQ")
+COMPARE_NE = def_op("COMPARE_NE")
+COMPARE_LT = def_op("COMPARE_LT")
+COMPARE_LE = def_op("COMPARE_LE")
+COMPARE_GT = def_op("COMPARE_GT")
+COMPARE_GE = def_op("COMPARE_GE")
+
+# ----- logical / unary -----
+BINARY_AND = def_op("BINARY_AND")
+BINARY_OR = def_op("BINARY_OR")
+UNARY_NEG = def_op("UNARY_NEG")
+UNARY_NOT = def_op("UNARY_NOT")
+
+# ----- containers -----
+BUILD_LIST = def_op("BUILD_LIST")
+BUILD_DICT = def_op("BUILD_DICT")
+BINARY_SUBSCR = def_op("BINARY_SUBSCR")
+BUILD_LIST_CONST = def_op("BUILD_LIST_CONST")    # fresh list from a constant tuple
+BUILD_DICT_CONST = def_op("BUILD_DICT_CONST")    # fresh dict from a constant tuple of pairs
+
+# ----- statements -----
+PRINT = def_op("PRINT")
+CLEAR = def_op("CLEAR")
+
+# ----- control flow -----
+JUMP = def_op("JUMP")
+JUMP_IF_FALSE = def_op("JUMP_IF_FALSE")
+JUMP_IF_TRUE = def_op("JUMP_IF_TRUE")
+# short-circuit `and` / `or`: jump keeping the deciding operand, otherwise pop it
+JUMP_IF_FALSE_OR_POP = def_op("JUMP_IF_FALSE_OR_POP")
+JUMP_IF_TRUE_OR_POP = def_op("JUMP_IF_TRUE_OR_POP")
+# for loops keep their iterator on the stack: FOR_RANGE (start, stop, step) and
+# GET_ITER (list, dict, string) push it, FOR_ITER pushes the next item or pops
+# the iterator and jumps once it is exhausted
+FOR_RANGE = def_op("FOR_RANGE")
+GET_ITER = def_op("GET_ITER")
+FOR_ITER = def_op("FOR_ITER")
+
+# compare fused with the JUMP_IF_FALSE that consumes it: jump when the compare is false
+COMPARE_EQ_JUMP = def_op("COMPARE_EQ_JUMP")
+COMPARE_NE_JUMP = def_op("COMPARE_NE_JUMP")
+COMPARE_LT_JUMP = def_op("COMPARE_LT_JUMP")
+COMPARE_LE_JUMP = def_op("COMPARE_LE_JUMP")
+COMPARE_GT_JUMP = def_op("COMPARE_GT_JUMP")
+COMPARE_GE_JUMP = def_op("COMPARE_GE_JUMP")
+
+# ----- functions -----
+MAKE_FUNCTION = def_op("MAKE_FUNCTION")
+CALL_FUNCTION = def_op("CALL_FUNCTION")
+TAIL_CALL = def_op("TAIL_CALL")      # CALL_FUNCTION whose value is returned: reuses the frame
+RETURN = def_op("RETURN")
+POP_TOP = def_op("POP_TOP")
+
+# ----- types -----
+# fails unless the value on top of the stack (left there) has the annotated type;
+# arg: name index and type (an index into TYPE_NAMES) packed by TYPE_BITS
+CHECK_TYPE = def_op("CHECK_TYPE")
+
+# ----- superinstructions -----
+# emitted by the compiler for the most frequent opcode sequences
+# (see `python -m axon.ngrams`)
+INC_NAME = def_op("INC_NAME")              # x = x + 1 for a global x
+INC_FAST = def_op("INC_FAST")              # x = x + 1 for a local slot
+LOAD_NAME_PAIR = def_op("LOAD_NAME_PAIR")  # arg: two name indexes packed by PAIR_BITS
+LOAD_FAST_PAIR = def_op("LOAD_FAST_PAIR")  # arg: two local slots packed by PAIR_BITS
+LOAD_NAME_CONST = def_op("LOAD_NAME_CONST")  # arg: name index and const index packed by PAIR_BITS
+LOAD_FAST_CONST = def_op("LOAD_FAST_CONST")  # arg: local slot and const index packed by PAIR_BITS
+
+# ----- specialized forms -----
+# written into running code by the VM's quickening (never by the compiler);
+# each guards its operand types and falls back to the generic opcode
+BINARY_ADD_INT = def_op("BINARY_ADD_INT")
+BINARY_ADD_FLOAT = def_op("BINARY_ADD_FLOAT")
+BINARY_ADD_STR = def_op("BINARY_ADD_STR")
+BINARY_SUB_INT = def_op("BINARY_SUB_INT")
+BINARY_SUB_FLOAT = def_op("BINARY_SUB_FLOAT")
+BINARY_MUL_INT = def_op("BINARY_MUL_INT")
+BINARY_MUL_FLOAT = def_op("BINARY_MUL_FLOAT")
+BINARY_MOD_INT = def_op("BINARY_MOD_INT")
+COMPARE_EQ_INT = def_op("COMPARE_EQ_INT")
+COMPARE_NE_INT = def_op("COMPARE_NE_INT")
+COMPARE_LT_INT = def_op("COMPARE_LT_INT")
+COMPARE_LE_INT = def_op("COMPARE_LE_INT")
+COMPARE_GT_INT = def_op("COMPARE_GT_INT")
+COMPARE_GE_INT = def_op("COMPARE_GE_INT")
+COMPARE_LT_JUMP_INT = def_op("COMPARE_LT_JUMP_INT")
+COMPARE_LE_JUMP_INT = def_op("COMPARE_LE_JUMP_INT")
+COMPARE_GT_JUMP_INT = def_op("COMPARE_GT_JUMP_INT")
+COMPARE_GE_JUMP_INT = def_op("COMPARE_GE_JUMP_INT")
+BINARY_SUBSCR_LIST_INT = def_op("BINARY_SUBSCR_LIST_INT")
+BINARY_SUBSCR_DICT = def_op("BINARY_SUBSCR_DICT")
+
+# CHECK_TYPE types, in the order of nodes.ANNOTATION_TYPES
+TYPE_NAMES = ("int", "float", "str", "bool", "list", "dict")
+TYPE_BITS = 4
+TYPE_MASK = (1 << TYPE_BITS) - 1
+
+# LOAD_*_PAIR / LOAD_*_CONST args hold the first operand in the high bits
+PAIR_BITS = 16
+PAIR_MASK = (1 << PAIR_BITS) - 1
+
+# opcodes whose arg is a jump offset relative to the instruction itself
+HAS_JUMP = frozenset({
+    JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, FOR_ITER,
+    COMPARE_EQ_JUMP, COMPARE_NE_JUMP, COMPARE_LT_JUMP,
+    COMPARE_LE_JUMP, COMPARE_GT_JUMP, COMPARE_GE_JUMP,
+    COMPARE_LT_JUMP_INT, COMPARE_LE_JUMP_INT, COMPARE_GT_JUMP_INT, COMPARE_GE_JUMP_INT,
+})
@@ -0,0 +1,417 @@
+# axon/optimizer.py
+"""
+Peephole optimizer over compiled CodeObjects.
+
+Works on one code object at a time as a list of [opcode, arg] pairs in which
+jump args are absolute instruction indices; deleted instructions are marked
+None and squeezed out by `compact`, which also remaps jump targets. Passes
+run until nothing changes, then relative offsets are re-encoded.
+
+    stats = optimize(co, level=1)
+    print(stats.report())
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+import operator
+
+from axon.compiler import COMPARE_JUMP, CodeObject, ConstPool, assemble, iter_instructions
+from axon.opcodes import *  # noqa: F403, F401
+
+FOLD_BINARY = {
+    BINARY_ADD: operator.add,
+    BINARY_SUB: operator.sub,
+    BINARY_MUL: operator.mul,
+    BINARY_DIV: operator.truediv,
+    BINARY_MOD: operator.mod,
+    COMPARE_EQ: operator.eq,
+    COMPARE_NE: operator.ne,
+    COMPARE_LT: operator.lt,
+    COMPARE_LE: operator.le,
+    COMPARE_GT: operator.gt,
+    COMPARE_GE: operator.ge,
+    BINARY_AND: lambda a, b: a and b,
+    BINARY_OR: lambda a, b: a or b,
+}
+
+FOLD_UNARY = {
+    UNARY_NEG: operator.neg,
+    UNARY_NOT: operator.not_,
+}
+
+# fused compare-jump -> the plain compare it tests
+JUMP_COMPARE = {v: k for k, v in COMPARE_JUMP.items()}
+
+# short-circuit jumps, which keep the tested value on the stack when taken
+OR_POP_JUMPS = (JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP)
+
+# folded values larger than this stay as runtime computations
+MAX_FOLDED_LEN = 4096
+MAX_FOLDED_INT_BITS = 128
+
+Instr = Optional[List[int]]
+
+
+@dataclass
+class OptimizeStats:
+    before: int = 0
+    after: int = 0
+    passes: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def removed(self) -> int:
+        return self.before - self.after
+
+    def count(self, name: str, n: int = 1):
+        self.passes[name] = self.passes.get(name, 0) + n
+
+    def report(self) -> str:
+        detail = ", ".join(f"{k}={v}" for k, v in sorted(self.passes.items()))
+        return f"optimizer: {self.before} -> {self.after} instructions ({self.removed} removed; {detail or 'no rewrites'})"
+
+
+def optimize(co: CodeObject, level: int = 1, stats: OptimizeStats = None) -> OptimizeStats:
+    """
+    Optimize `co` and every code object nested in its constants, in place.
+    Level 0 does nothing. Returns `stats` (or a fresh OptimizeStats) filled in.
+    """
+    if stats is None:
+        stats = OptimizeStats()
+    if level <= 0:
+        return stats
+    pool = ConstPool.from_tables(co.consts, co.names)
+    for code_obj in code_objects(co):
+        optimize_code(code_obj, pool, stats)
+    return stats
+
+
+def code_objects(co: CodeObject) -> List[CodeObject]:
+    found = [co]
+    seen = {id(co)}
+
+    def visit(v):
+        if isinstance(v, CodeObject):
+            if id(v) not in seen:
+                seen.add(id(v))
+                found.append(v)
+        elif isinstance(v, tuple):
+            for x in v:
+                visit(x)
+
+    for c in co.consts:
+        visit(c)
+    return found
+
+
+def optimize_code(co: CodeObject, pool: ConstPool, stats: OptimizeStats):
+    instrs = decode(co.code)
+    stats.before += len(instrs)
+    changed = True
+    while changed:
+        changed = False
+        for p in PASSES:
+            if p(instrs, pool, jump_targets(instrs), stats):
+                instrs = compact(instrs)
+                changed = True
+    co.code = encode(instrs)
+    co.inline_cache = None
+    co.adaptive = None
+    stats.after += len(instrs)
+
+
+# ---------------- ENCODING ----------------
+def decode(code) -> List[List[int]]:
+    out = []
+    for i, (op, arg) in enumerate(iter_instructions(code)):
+        out.append([op, i + arg if op in HAS_JUMP else arg])
+    return out
+
+
+def encode(instrs: List[List[int]]):
+    return assemble(
+        (op, arg - i if op in HAS_JUMP else arg)
+        for i, (op, arg) in enumerate(instrs)
+    )
+
+
+def jump_targets(instrs: List[Instr]) -> Set[int]:
+    return {ins[1] for ins in instrs if ins is not None and ins[0] in HAS_JUMP}
+
+
+def compact(instrs: List[Instr]) -> List[List[int]]:
+    """Drop deleted slots; a jump to a deleted slot lands on the next survivor."""
+    new_index = [0] * (len(instrs) + 1)
+    n = 0
+    for i, ins in enumerate(instrs):
+        new_index[i] = n
+        if ins is not None:
+            n += 1
+    new_index[len(instrs)] = n
+    out = []
+    for ins in instrs:
+        if ins is None:
+            continue
+        if ins[0] in HAS_JUMP:
+            ins = [ins[0], new_index[ins[1]]]
+        out.append(ins)
+    return out
+
+
+# ---------------- PASSES ----------------
+# Each pass rewrites `instrs` in place (None = deleted) and returns True if it
+# changed anything. Rewrites never span an instruction that is a jump target,
+# except at their first instruction.
+
+def fold_constants(instrs, pool, targets, stats) -> bool:
+    changed = False
+    consts = pool.consts
+    for i, ins in enumerate(instrs):
+        if ins is None:
+            continue
+        op = ins[0]
+        if op in FOLD_BINARY and i >= 2:
+            a, b = instrs[i - 2], instrs[i - 1]
+            if not (a and b and a[0] == CONST and b[0] == CONST) or i in targets or i - 1 in targets:
+                continue
+            ok, value = try_fold(FOLD_BINARY[op], consts[a[1]], consts[b[1]])
+            if ok:
+                instrs[i - 2] = instrs[i - 1] = None
+                instrs[i] = [CONST, pool.add_const(value)]
+                stats.count("folded")
+                changed = True
+        elif op in FOLD_UNARY and i >= 1:
+            a = instrs[i - 1]
+            if not (a and a[0] == CONST) or i in targets:
+                continue
+            ok, value = try_fold(FOLD_UNARY[op], consts[a[1]])
+            if ok:
+                instrs[i - 1] = None
+                instrs[i] = [CONST, pool.add_const(value)]
+                stats.count("folded")
+                changed = True
+    return changed
+
+
+def may_grow_too_large(fn, args) -> bool:
+    """
+    Whether `fn(*args)` may exceed the MAX_FOLDED_* limits, judged from the
+    operands alone so a huge value is never built. Only `*` repeats its
+    operands and only string `%` pads to widths it reads from the format;
+    every other fold stays within a bit or so of its operands.
+    """
+    if len(args) != 2:
+        return False
+    a, b = args
+    if fn is operator.mod:
+        return isinstance(a, str)
+    if fn is not operator.mul:
+        return False
+    if isinstance(a, int) and not isinstance(b, int):
+        a, b = b, a
+    if isinstance(a, (str, tuple)) and isinstance(b, int):
+        return len(a) * b > MAX_FOLDED_LEN
+    if isinstance(a, int) and isinstance(b, int):
+        # a product has the operands' bits combined, or one fewer
+        return a.bit_length() + b.bit_length() - 1 > MAX_FOLDED_INT_BITS
+    return False
+
+
+def try_fold(fn, *args):
+    if may_grow_too_large(fn, args):
+        return False, None
+    try:
+        value = fn(*args)
+    except Exception:
+        # leave it for the VM so the error surfaces at runtime as before
+        return False, None
+    if isinstance(value, str) and len(value) > MAX_FOLDED_LEN:
+        return False, None
+    if isinstance(value, int) and value.bit_length() > MAX_FOLDED_INT_BITS:
+        return False, None
+    return True, value
+
+
+def fold_literals(instrs, pool, targets, stats) -> bool:
+    """All-constant list/dict literals become one BUILD_*_CONST (a fresh container each time)."""
+    changed = False
+    consts = pool.consts
+    for i, ins in enumerate(instrs):
+        if ins is None or ins[0] not in (BUILD_LIST, BUILD_DICT) or ins[1] == 0:
+            continue
+        width = ins[1] if ins[0] == BUILD_LIST else 2 * ins[1]
+        start = i - width
+        if start < 0:
+            continue
+        window = instrs[start:i]
+        if any(w is None or w[0] != CONST for w in window):
+            continue
+        if any(j in targets for j in range(start + 1, i + 1)):
+            continue
+        values = tuple(consts[w[1]] for w in window)
+        if ins[0] == BUILD_LIST:
+            instrs[i] = [BUILD_LIST_CONST, pool.add_const(values)]
+        else:
+            pairs = tuple(zip(values[::2], values[1::2]))
+            try:
+                dict(pairs)
+            except TypeError:
+                continue
+            instrs[i] = [BUILD_DICT_CONST, pool.add_const(pairs)]
+        for j in range(start, i):
+            instrs[j] = None
+        stats.count("literals")
+        changed = True
+    return changed
+
+
+def remove_dead_pushes(instrs, pool, targets, stats) -> bool:
+    """Drop `CONST; POP_TOP` pairs."""
+    changed = False
+    for i in range(len(instrs) - 1):
+        a, b = instrs[i], instrs[i + 1]
+        if a is None or b is None:
+            continue
+        if a[0] == CONST and b[0] == POP_TOP and i + 1 not in targets:
+            instrs[i] = instrs[i + 1] = None
+            stats.count("dead_pushes")
+            changed = True
+    return changed
+
+
+def remove_dead_stores(instrs, pool, targets, stats) -> bool:
+    """
+    `STORE_NAME x` / `STORE_FAST x` is dead when x is stored again before
+    anything can observe it: only CONST pushes and other stores may come in
+    between, and no jump may land in the gap. The dead store becomes POP_TOP.
+    """
+    changed = False
+    for i, ins in enumerate(instrs):
+        if ins is None or ins[0] not in (STORE_NAME, STORE_FAST):
+            continue
+        for j in range(i + 1, len(instrs)):
+            nxt = instrs[j]
+            if j in targets:
+                break
+            if nxt is None or nxt[0] == CONST:
+                continue
+            if nxt[0] in (STORE_NAME, STORE_FAST):
+                if nxt == ins:
+                    instrs[i] = [POP_TOP, 0]
+                    stats.count("dead_stores")
+                    changed = True
+                    break
+                continue
+            break
+    return changed
+
+
+def thread_jumps(instrs, pool, targets, stats) -> bool:
+    """
+    Retarget jumps that land on an unconditional JUMP, or on a jump of their
+    own *_OR_POP kind (which will jump again on the same value, as in
+    `a and b and c`); drop jumps to the next instruction.
+    """
+    changed = False
+    for i, ins in enumerate(instrs):
+        if ins is None or ins[0] not in HAS_JUMP:
+            continue
+        target, seen = ins[1], {i}
+        follow = (JUMP, ins[0]) if ins[0] in OR_POP_JUMPS else (JUMP,)
+        while target < len(instrs) and instrs[target] is not None and instrs[target][0] in follow and target not in seen:
+            seen.add(target)
+            target = instrs[target][1]
+        if target != ins[1]:
+            ins[1] = target
+            stats.count("threaded")
+            changed = True
+        if ins[0] == JUMP and ins[1] == i + 1:
+            instrs[i] = None
+            stats.count("threaded")
+            changed = True
+    return changed
+
+
+def fold_constant_branches(instrs, pool, targets, stats) -> bool:
+    """
+    `CONST c; JUMP_IF_FALSE t` (or `JUMP_IF_TRUE`) and `CONST a; CONST b;
+    COMPARE_*_JUMP t` are either an unconditional jump or nothing.
+    `CONST c; JUMP_IF_*_OR_POP t` is either `CONST c; JUMP t` or nothing.
+    """
+    changed = False
+    consts = pool.consts
+    for i in range(len(instrs) - 1):
+        a, b = instrs[i], instrs[i + 1]
+        if a is None or b is None or a[0] != CONST or i + 1 in targets:
+            continue
+        if b[0] in OR_POP_JUMPS:
+            if bool(consts[a[1]]) == (b[0] == JUMP_IF_TRUE_OR_POP):
+                instrs[i + 1] = [JUMP, b[1]]
+            else:
+                instrs[i] = instrs[i + 1] = None
+            stats.count("branches")
+            changed = True
+            continue
+        if b[0] in (JUMP_IF_FALSE, JUMP_IF_TRUE):
+            end, ok, cond = i + 1, True, consts[a[1]]
+        elif b[0] == CONST and i + 2 < len(instrs):
+            c = instrs[i + 2]
+            if c is None or c[0] not in JUMP_COMPARE or i + 2 in targets:
+                continue
+            end = i + 2
+            ok, cond = try_fold(FOLD_BINARY[JUMP_COMPARE[c[0]]], consts[a[1]], consts[b[1]])
+        else:
+            continue
+        if not ok:
+            continue
+        target, jump_if = instrs[end][1], instrs[end][0] == JUMP_IF_TRUE
+        for j in range(i, end + 1):
+            instrs[j] = None
+        if bool(cond) == jump_if:
+            instrs[i] = [JUMP, target]
+        stats.count("branches")
+        changed = True
+    return changed
+
+
+def remove_unreachable(instrs, pool, targets, stats) -> bool:
+    """Code after JUMP/RETURN is dead until the next jump target."""
+    changed = False
+    dead = False
+    for i, ins in enumerate(instrs):
+        if ins is None:
+            continue
+        if i in targets:
+            dead = False
+        if dead:
+            instrs[i] = None
+            stats.count("unreachable")
+            changed = True
+        elif ins[0] in (JUMP, RETURN):
+            dead = True
+    return changed
+
+
+def fuse_compare_jumps(instrs, pool, targets, stats) -> bool:
+    changed = False
+    for i in range(len(instrs) - 1):
+        a, b = instrs[i], instrs[i + 1]
+        if a is None or b is None or a[0] not in COMPARE_JUMP:
+            continue
+        if b[0] != JUMP_IF_FALSE or i + 1 in targets:
+            continue
+        instrs[i] = [COMPARE_JUMP[a[0]], b[1]]
+        instrs[i + 1] = None
+        stats.count("fused")
+        changed = True
+    return changed
+
+
+PASSES = [
+    fold_constants,
+    fold_literals,
+    remove_dead_stores,
+    remove_dead_pushes,
+    fold_constant_branches,
+    thread_jumps,
+    remove_unreachable,
+    fuse_compare_jumps,
+]
@@ -1,24 +1,65 @@
-from axon.lexer import tokenize
+from functools import partial
+from axon.lexer import CHUNK_SIZE, TokenStream
 from axon.nodes import (
-    NumberNode, StringNode, BooleanNode, VariableNode,
+    ANNOTATION_TYPES, NumberNode, StringNode, BooleanNode, VariableNode,
     BinOpNode, UnaryOpNode, ListNode, IndexNode, DictNode,
-    PrintNode, LetNode, ClearNode, IfNode, WhileNode, ForNode,
+    PrintNode, LetNode, ClearNode, IfNode, WhileNode, ForNode, ForInNode,
     BreakNode, ContinueNode, FunctionNode, CallNode, ReturnNode
 )
 
 class ParseError(Exception):
     pass
 
+# binary operators by binding power; higher binds tighter
+BINDING_POWER = {
+    'or': 10,
+    'and': 20,
+    '==': 30, '!=': 30, '<': 30, '>': 30, '<=': 30, '>=': 30,
+    '+': 40, '-': 40,
+    '*': 50, '/': 50, '%': 50,
+}
+
+# prefix operators apply to a single operand (`-a * b` is `(-a) * b`)
+PREFIX_OPS = frozenset(('-', 'not'))
+
+# token types that end an expression, one set per context
+NO_STOP = frozenset()
+STOP_SEMICOLON = frozenset(('SEMICOLON',))
+STOP_LBRACE = frozenset(('LBRACE',))
+STOP_RPAREN = frozenset(('RPAREN',))
+STOP_RBRACKET = frozenset(('RBRACKET',))
+STOP_COLON = frozenset(('COLON',))
+STOP_ARG = frozenset(('COMMA', 'RPAREN'))
+STOP_ELEMENT = frozenset(('COMMA', 'RBRACKET'))
+STOP_ENTRY = frozenset(('COMMA', 'RBRACE'))
+
 class Parser:
-    def __init__(self, code):
-        self.tokens = tokenize(code)
-        self.pos = 0
+    """
+    Recursive-descent parser over a TokenStream. `code` is a source string, or
+    a file object / mmap that is tokenized as it is parsed. Tokens are pulled
+    one at a time; the parser only ever holds the current token and one of
+    lookahead.
+    """
+
+    def __init__(self, code, chunk_size=CHUNK_SIZE):
+        self.tokens = TokenStream(code, chunk_size)
+        self.next_token = partial(next, iter(self.tokens), None)
+        self.lookahead = []
+        self.token = self.next_token()
+
+    def error(self, message):
+        """ParseError located at the current token (or the end of the source)."""
+        token = self.token
+        if token is None:
+            return ParseError(f"{message} (at end of input)")
+        line, col = self.tokens.line_col(token.pos)
+        return ParseError(f"{message} (line {line}, col {col})")
 
     def current_token(self):
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        return self.token
 
     def advance(self):
-        self.pos += 1
+        self.token = self.lookahead.pop() if self.lookahead else self.next_token()
 
     # -----------------------
     # Expression Parsing
@@ -26,82 +67,38 @@ class Parser:
 
     def consume_semicolon(self):
         """Advance past a semicolon, or raise error if missing."""
-        token = self.current_token()
+        token = self.token
         if not token or token.type != 'SEMICOLON':
-            raise ParseError(f"Expected ';' at the end of statement, got {token}")
+            raise self.error(f"Expected ';' at the end of statement, got {token}")
         self.advance()
 
 
-    def parse_expression(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
-        left = self.parse_logic_term(stop_tokens)
-        token = self.current_token()
-        while token and token.type not in stop_tokens:
-            if token.type == 'OP' and token.value in ('or',):
-                op = token.value
-                self.advance()
-                right = self.parse_logic_term(stop_tokens)
-                left = BinOpNode(left, op, right)
-                token = self.current_token()
-            else:
-                break
-        return left
-
-    def parse_logic_term(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
-        left = self.parse_comparison(stop_tokens)
-        token = self.current_token()
-        while token and token.type == 'OP' and token.value == 'and':
-            op = token.value
-            self.advance()
-            right = self.parse_comparison(stop_tokens)
-            left = BinOpNode(left, op, right)
-            token = self.current_token()
-        return left
-
-    def parse_comparison(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
-        left = self.parse_term(stop_tokens)
-        token = self.current_token()
-        while token and token.type == 'OP' and token.value in ('==', '!=', '<', '>', '<=', '>='):
-            op = token.value
-            self.advance()
-            right = self.parse_term(stop_tokens)
-            left = BinOpNode(left, op, right)
-            token = self.current_token()
-        return left
-
-    def parse_term(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
-        left = self.parse_factor_term(stop_tokens)
-        token = self.current_token()
-        while token and token.type not in stop_tokens and token.type == 'OP' and token.value in ('+', '-'):
-            op = token.value
-            self.advance()
-            right = self.parse_factor_term(stop_tokens)
-            left = BinOpNode(left, op, right)
-            token = self.current_token()
-        return left
-
-    def parse_factor_term(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
+    def parse_expression(self, stop_tokens=NO_STOP, min_bp=0):
+        """
+        Precedence climbing: parse an operand, then keep folding in binary
+        operators that bind tighter than `min_bp`. Operators of equal power
+        associate to the left. Returns None if the expression is empty (the
+        first token is in `stop_tokens`).
+        """
         left = self.parse_factor(stop_tokens)
-        token = self.current_token()
-        while token and token.type not in stop_tokens and token.type == 'OP' and token.value in ('*', '/', '%'):
+        token = self.token
+        while token is not None and token.type == 'OP':
             op = token.value
+            bp = BINDING_POWER.get(op, 0)
+            if bp <= min_bp:
+                break
             self.advance()
-            right = self.parse_factor(stop_tokens)
-            left = BinOpNode(left, op, right)
-            token = self.current_token()
+            left = BinOpNode(left, op, self.parse_expression(stop_tokens, bp))
+            token = self.token
         return left
 
-    def parse_factor(self, stop_tokens=None):
-        stop_tokens = stop_tokens or []
-        token = self.current_token()
+    def parse_factor(self, stop_tokens=NO_STOP):
+        """An operand: literal, name, call, index, (...), list, dict, or a unary op applied to one."""
+        token = self.token
         if not token or token.type in stop_tokens:
             return None
 
-        if token.type == 'OP' and token.value in ('-', 'not'):
+        if token.type == 'OP' and token.value in PREFIX_OPS:
             op = token.value
             self.advance()
             expr = self.parse_factor(stop_tokens)
@@ -118,29 +115,29 @@ class Parser:
                 return BooleanNode(token.value == 'True')
 
             self.advance()
-            next_token = self.current_token()
+            next_token = self.token
 
             # function call
             if next_token and next_token.type == 'LPAREN':
                 self.advance()
                 args = []
-                while self.current_token() and self.current_token().type != 'RPAREN':
-                    args.append(self.parse_expression(stop_tokens=['COMMA', 'RPAREN']))
-                    if self.current_token() and self.current_token().type == 'COMMA':
+                while self.token and self.token.type != 'RPAREN':
+                    args.append(self.parse_expression(STOP_ARG))
+                    if self.token and self.token.type == 'COMMA':
                         self.advance()
-                if not self.current_token() or self.current_token().type != 'RPAREN':
-                    raise ParseError("Expected ')' after function call")
+                if not self.token or self.token.type != 'RPAREN':
+                    raise self.error("Expected ')' after function call")
                 self.advance()
                 return CallNode(token.value, args)
 
             # array indexing
             elif next_token and next_token.type == 'LBRACKET':
                 collection = VariableNode(token.value)
-                while self.current_token() and self.current_token().type == 'LBRACKET':
+                while self.token and self.token.type == 'LBRACKET':
                     self.advance()
-                    index_expr = self.parse_expression(stop_tokens=['RBRACKET'])
-                    if not self.current_token() or self.current_token().type != 'RBRACKET':
-                        raise ParseError("Expected ']' for index")
+                    index_expr = self.parse_expression(STOP_RBRACKET)
+                    if not self.token or self.token.type != 'RBRACKET':
+                        raise self.error("Expected ']' for index")
                     self.advance()
                     collection = IndexNode(collection, index_expr)
                 return collection
@@ -149,49 +146,49 @@ class Parser:
 
         elif token.type == 'LPAREN':
             self.advance()
-            expr = self.parse_expression(stop_tokens=stop_tokens + ['RPAREN'])
-            if not self.current_token() or self.current_token().type != 'RPAREN':
-                raise ParseError("Expected ')' after expression")
+            expr = self.parse_expression(STOP_RPAREN)
+            if not self.token or self.token.type != 'RPAREN':
+                raise self.error("Expected ')' after expression")
             self.advance()
             return expr
 
         elif token.type == 'LBRACKET':  # list literal
             self.advance()
             elements = []
-            while self.current_token() and self.current_token().type != 'RBRACKET':
-                elements.append(self.parse_expression(stop_tokens=['COMMA', 'RBRACKET']))
-                if self.current_token() and self.current_token().type == 'COMMA':
+            while self.token and self.token.type != 'RBRACKET':
+                elements.append(self.parse_expression(STOP_ELEMENT))
+                if self.token and self.token.type == 'COMMA':
                     self.advance()
-            if not self.current_token() or self.current_token().type != 'RBRACKET':
-                raise ParseError("Expected ']' after list")
+            if not self.token or self.token.type != 'RBRACKET':
+                raise self.error("Expected ']' after list")
             self.advance()
             return ListNode(elements)
 
         elif token.type == 'LBRACE':  # dict literal
             self.advance()
             entries = []
-            while self.current_token() and self.current_token().type != 'RBRACE':
-                key = self.parse_expression(stop_tokens=['COLON'])
-                if not self.current_token() or self.current_token().type != 'COLON':
-                    raise ParseError("Expected ':' in dict entry")
+            while self.token and self.token.type != 'RBRACE':
+                key = self.parse_expression(STOP_COLON)
+                if not self.token or self.token.type != 'COLON':
+                    raise self.error("Expected ':' in dict entry")
                 self.advance()
-                value = self.parse_expression(stop_tokens=['COMMA', 'RBRACE'])
+                value = self.parse_expression(STOP_ENTRY)
                 entries.append((key, value))
-                if self.current_token() and self.current_token().type == 'COMMA':
+                if self.token and self.token.type == 'COMMA':
                     self.advance()
-            if not self.current_token() or self.current_token().type != 'RBRACE':
-                raise ParseError("Expected '}' after dict")
+            if not self.token or self.token.type != 'RBRACE':
+                raise self.error("Expected '}' after dict")
             self.advance()
             return DictNode(entries)
 
         else:
-            raise ParseError(f"Unexpected token {token}")
+            raise self.error(f"Unexpected token {token}")
 
     # -----------------------
     # Statement Parsing
     # -----------------------
     def parse_statement(self):
-        token = self.current_token()
+        token = self.token
         if not token:
             return None
 
@@ -199,7 +196,7 @@ class Parser:
         if token.value == 'print':
             self.advance()
             self.expect('LPAREN')
-            expr = self.parse_expression(stop_tokens=['RPAREN'])
+            expr = self.parse_expression(STOP_RPAREN)
             self.expect('RPAREN')
             self.consume_semicolon()
             return PrintNode(expr)
@@ -207,10 +204,11 @@ class Parser:
         elif token.value == 'let':
             self.advance()
             var_name = self.expect('IDENT').value
+            type_name = self.parse_annotation()
             self.expect_op('=')
-            expr = self.parse_expression(stop_tokens=['SEMICOLON'])
+            expr = self.parse_expression(STOP_SEMICOLON)
             self.consume_semicolon()
-            return LetNode(var_name, expr)
+            return LetNode(var_name, expr, type_name=type_name)
 
         elif token.value == 'cls':
             self.advance()
@@ -229,10 +227,27 @@ class Parser:
 
         elif token.value == 'return':
             self.advance()
-            expr = self.parse_expression(stop_tokens=['SEMICOLON'])
+            expr = self.parse_expression(STOP_SEMICOLON)
             self.consume_semicolon()
             return ReturnNode(expr)
 
+        # --- function definition ---
+        elif token.value == 'fn':
+            self.advance()
+            name = self.expect('IDENT').value
+            self.expect('LPAREN')
+            params, types = [], []
+            while self.token and self.token.type != 'RPAREN':
+                params.append(self.expect('IDENT').value)
+                types.append(self.parse_annotation())
+                if self.token and self.token.type == 'COMMA':
+                    self.advance()
+            self.expect('RPAREN')
+            self.expect('LBRACE')
+            body = self.parse_block()
+            self.expect('RBRACE')
+            return FunctionNode(name, params, body, types if any(types) else None)
+
         elif token.value in ('true', 'false'):
             self.advance()
             self.consume_semicolon()
@@ -241,28 +256,56 @@ class Parser:
         # --- if / else block ---
         elif token.value == 'if':
             self.advance()
-            condition = self.parse_expression(stop_tokens=['LBRACE'])
+            condition = self.parse_expression(STOP_LBRACE)
             self.expect('LBRACE')
-
-            body = []
-            while self.current_token() and self.current_token().type != 'RBRACE':
-                stmt = self.parse_statement()
-                if stmt:
-                    body.append(stmt)
+            body = self.parse_block()
             self.expect('RBRACE')
 
             else_body = []
-            next_token = self.current_token()
+            next_token = self.token
             if next_token and next_token.value == 'else':
                 self.advance()
+                if self.token and self.token.value == 'if':
+                    else_body = [self.parse_statement()]
+                else:
+                    self.expect('LBRACE')
+                    else_body = self.parse_block()
+                    self.expect('RBRACE')
+
+            return IfNode([(condition, body)], else_body)
+
+        # --- while loop ---
+        elif token.value == 'while':
+            self.advance()
+            condition = self.parse_expression(STOP_LBRACE)
+            self.expect('LBRACE')
+            body = self.parse_block()
+            self.expect('RBRACE')
+            return WhileNode(condition, body)
+
+        # --- for loops: for i = start to end [step s] { }  /  for x in expr { } ---
+        elif token.value == 'for':
+            self.advance()
+            var_name = self.expect('IDENT').value
+            if self.token and self.token.type == 'IDENT' and self.token.value == 'in':
+                self.advance()
+                iterable = self.parse_expression(STOP_LBRACE)
                 self.expect('LBRACE')
-                while self.current_token() and self.current_token().type != 'RBRACE':
-                    stmt = self.parse_statement()
-                    if stmt:
-                        else_body.append(stmt)
+                body = self.parse_block()
                 self.expect('RBRACE')
-
-            return IfNode(condition, body, else_body)
+                return ForInNode(var_name, iterable, body)
+            self.expect_op('=')
+            start = self.parse_expression(STOP_LBRACE)
+            self.expect_word('to')
+            end = self.parse_expression(STOP_LBRACE)
+            step = None
+            if self.token and self.token.type == 'IDENT' and self.token.value == 'step':
+                self.advance()
+                step = self.parse_expression(STOP_LBRACE)
+            self.expect('LBRACE')
+            body = self.parse_block()
+            self.expect('RBRACE')
+            return ForNode(var_name, start, end, body, step)
 
         # --- bare assignment x = 5; ---
         elif token.type == 'IDENT':
@@ -271,41 +314,76 @@ class Parser:
                 var_name = token.value
                 self.advance()
                 self.advance()  # skip '='
-                expr = self.parse_expression(stop_tokens=['SEMICOLON'])
+                expr = self.parse_expression(STOP_SEMICOLON)
                 self.consume_semicolon()
-                return LetNode(var_name, expr)
+                return LetNode(var_name, expr, declare=False)
+
+            # --- call statement: run for its effect, result discarded ---
+            if next_token and next_token.type == 'LPAREN':
+                expr = self.parse_expression(STOP_SEMICOLON)
+                self.consume_semicolon()
+                if isinstance(expr, CallNode):
+                    return expr
+                return PrintNode(expr)
 
         # --- top-level expression (auto-print) ---
-        expr = self.parse_expression(stop_tokens=['SEMICOLON'])
+        expr = self.parse_expression(STOP_SEMICOLON)
         self.consume_semicolon()
         return PrintNode(expr)
     
     def parse(self):
         """Parse all statements in the code and return a list of statement nodes."""
         statements = []
-        while self.current_token():
+        while self.token:
             stmt = self.parse_statement()
             if stmt is not None:
                 statements.append(stmt)
         return statements
 
+    def parse_block(self):
+        """Parse statements up to (not including) the closing '}'."""
+        body = []
+        while self.token and self.token.type != 'RBRACE':
+            stmt = self.parse_statement()
+            if stmt:
+                body.append(stmt)
+        return body
+
+    def parse_annotation(self):
+        """The type of `name: type` (a `let` name or a param), or None when there is no `:`."""
+        if not self.token or self.token.type != 'COLON':
+            return None
+        self.advance()
+        token = self.token
+        if not token or token.type != 'IDENT' or token.value not in ANNOTATION_TYPES:
+            raise self.error(f"Expected a type ({', '.join(ANNOTATION_TYPES)}), got {token}")
+        self.advance()
+        return token.value
+
     def expect(self, token_type):
-        token = self.current_token()
+        token = self.token
         if not token or token.type != token_type:
-            raise ParseError(f"Expected token type {token_type}, got {token}")
+            raise self.error(f"Expected token type {token_type}, got {token}")
         self.advance()
         return token
     
     def peek_next(self):
-        next_pos = self.pos + 1
-        if next_pos < len(self.tokens):
-            return self.tokens[next_pos]
-        return None
+        if not self.lookahead:
+            self.lookahead.append(self.next_token())
+        return self.lookahead[0]
     
+    def expect_word(self, word):
+        """A word that is only special in one spot (`to` in a for loop); it is an IDENT token."""
+        token = self.token
+        if not token or not (token.type == 'IDENT' and token.value == word):
+            raise self.error(f"Expected '{word}', got {token}")
+        self.advance()
+        return token
+
     def expect_op(self, op_value):
-        token = self.current_token()
+        token = self.token
         if not token or not (token.type == 'OP' and token.value == op_value):
-            raise ParseError(f"Expected operator '{op_value}', got {token}")
+            raise self.error(f"Expected operator '{op_value}', got {token}")
         self.advance()
         return token
     
@@ -316,3 +394,8 @@ def parse_text(code):
     """
     parser = Parser(code)
     return parser.parse()
+
+
+def parse_stream(f, chunk_size=CHUNK_SIZE):
+    """Parse a text/binary file object or mmap without reading it all into memory."""
+    return Parser(f, chunk_size).parse()
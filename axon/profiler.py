@@ -0,0 +1,237 @@
+# axon/profiler.py
+"""
+Profiler for Axon programs running on the VM.
+
+Two modes:
+
+* ``trace`` runs the program in its own copy of the VM's run loop that
+  times every instruction. It reports per-opcode counts and time, and per
+  function the calls, inclusive time (the function and its callees; only the
+  outermost of recursive activations counts) and exclusive time (its own
+  instructions).
+* ``sample`` runs the ordinary run loop at full speed while a background
+  thread records the Axon call stack (`vm.frames`) every `interval` seconds.
+
+Either way `report()` is a text summary and `collapsed()` gives the stacks
+in the `main;f;g weight` format that flamegraph.pl and speedscope read.
+Trace weights are nanoseconds of exclusive time, sample weights are
+sample counts. `VM.run` looks at its `profiler` argument once per run, so
+an unprofiled run executes exactly the code it always did.
+
+Tier-2 code is Python, not VM frames, so profile with `VM(tier=False)`
+(`axon.run --profile` does); otherwise promoted functions show up as time
+spent in the instruction that called them.
+
+    python -m axon.run --profile script.ax
+    python -m axon.run --profile --profile-mode sample --profile-out script.folded script.ax
+"""
+from typing import Dict, List, Tuple
+import sys
+import threading
+import time
+
+from axon.opcodes import OPNAMES, TAIL_CALL
+
+PROFILE_MODES = ("trace", "sample")
+
+# seconds between two samples of the call stack
+SAMPLE_INTERVAL = 0.001
+
+
+class _Entry:
+    """One live call in trace mode."""
+    __slots__ = ("name", "node", "start")
+
+    def __init__(self, name: str, node: int, start: int):
+        self.name = name
+        self.node = node    # call-tree node: this call's stack from the module down
+        self.start = start
+
+
+class Profiler:
+    def __init__(self, mode: str = "trace", interval: float = SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}")
+        self.mode = mode
+        self.interval = interval
+        self.elapsed = 0                                # ns of the whole run
+        # trace mode
+        self.op_counts: List[int] = [0] * len(OPNAMES)
+        self.op_time: List[int] = [0] * len(OPNAMES)   # ns, per opcode
+        self.calls: Dict[str, int] = {}
+        self.inclusive: Dict[str, int] = {}             # ns, per function name
+        self.exclusive: Dict[str, int] = {}
+        # collapsed stack -> weight (ns in trace mode, samples in sample mode)
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        self.samples = 0
+        # trace mode call tree: node -> (parent node, name), and its exclusive ns
+        self._tree: List[Tuple[int, str]] = [(-1, "")]
+        self._children: Dict[Tuple[int, str], int] = {}
+        self._node_time: List[int] = [0]
+        self._stack: List[_Entry] = []
+        self._active: Dict[str, int] = {}
+        self._segment = 0
+
+    # ---------------- RUNNING ----------------
+    def run(self, vm):
+        """Run `vm`'s frames to completion under this profiler."""
+        start = time.perf_counter_ns()
+        try:
+            if self.mode == "trace":
+                self._run_traced(vm)
+            else:
+                self._run_sampled(vm)
+        finally:
+            self.elapsed += time.perf_counter_ns() - start
+
+    def _run_traced(self, vm):
+        """`VM.run_table` with a clock read around every instruction."""
+        frames = vm.frames
+        handlers = vm.handlers
+        base = vm.base_depth
+        counts, times = self.op_counts, self.op_time
+        clock = time.perf_counter_ns
+        self._segment = clock()
+        self._sync(frames, base)
+        try:
+            while len(frames) > base:
+                f = frames[-1]
+                code = f.code
+                n = len(code)
+                tail = False
+                while f.ip < n:
+                    ip = f.ip
+                    f.ip = ip + 2
+                    op = code[ip]
+                    t = clock()
+                    changed = handlers[op](f, code[ip + 1])
+                    times[op] += clock() - t
+                    counts[op] += 1
+                    if changed:
+                        tail = op == TAIL_CALL
+                        break
+                else:
+                    if frames and frames[-1] is f:
+                        vm.release_frame(vm.pop_frame())
+                self._sync(frames, base, tail)
+        finally:
+            # an error leaves frames behind; close every call still open
+            self._sync(frames[:base], base)
+            self._collect_stacks()
+
+    def _run_sampled(self, vm):
+        stop = threading.Event()
+        base = vm.base_depth
+
+        def sample():
+            while not stop.wait(self.interval):
+                stack = tuple(f.name for f in vm.frames[base:])
+                if stack:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                    self.samples += 1
+
+        # the sampler only runs when the VM thread hands over the GIL
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch, self.interval))
+        sampler = threading.Thread(target=sample, name="axon-profiler", daemon=True)
+        sampler.start()
+        try:
+            vm.run()
+        finally:
+            stop.set()
+            sampler.join()
+            sys.setswitchinterval(switch)
+
+    # ---------------- TRACE BOOKKEEPING ----------------
+    def _sync(self, frames, base: int, tail: bool = False):
+        """
+        Charge the time since the last call/return to the running call, then
+        match `frames`. `tail`: the top frame was just reused by a TAIL_CALL.
+        """
+        now = time.perf_counter_ns()
+        stack = self._stack
+        if stack:
+            top = stack[-1]
+            spent = now - self._segment
+            self.exclusive[top.name] = self.exclusive.get(top.name, 0) + spent
+            self._node_time[top.node] += spent
+        depth = len(frames) - base
+        while len(stack) > depth:
+            self._leave(now)
+        # a tail call keeps the frame but starts another call in it
+        if tail:
+            self._leave(now)
+        while len(stack) < depth:
+            self._enter(frames[base + len(stack)], now)
+        self._segment = time.perf_counter_ns()
+
+    def _enter(self, f, now: int):
+        name = f.name
+        parent = self._stack[-1].node if self._stack else 0
+        node = self._children.get((parent, name))
+        if node is None:
+            node = self._children[(parent, name)] = len(self._tree)
+            self._tree.append((parent, name))
+            self._node_time.append(0)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self._active[name] = self._active.get(name, 0) + 1
+        self._stack.append(_Entry(name, node, now))
+
+    def _leave(self, now: int):
+        e = self._stack.pop()
+        self._active[e.name] -= 1
+        if not self._active[e.name]:
+            self.inclusive[e.name] = self.inclusive.get(e.name, 0) + now - e.start
+
+    def _collect_stacks(self):
+        for node, spent in enumerate(self._node_time):
+            if not spent:
+                continue
+            names = []
+            n = node
+            while n > 0:
+                n, name = self._tree[n]
+                names.append(name)
+            stack = tuple(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + spent
+        self._node_time = [0] * len(self._tree)
+
+    # ---------------- OUTPUT ----------------
+    def collapsed(self) -> str:
+        """One `a;b;c weight` line per stack, for flamegraph tools."""
+        return "".join(f"{';'.join(stack)} {weight}\n" for stack, weight in sorted(self.stacks.items()))
+
+    def write_collapsed(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+
+    def report(self, limit: int = 20) -> str:
+        if self.mode == "sample":
+            return self._sample_report(limit)
+        total = sum(self.op_time) or 1
+        lines = [f"profile (trace): {sum(self.op_counts)} instructions in {self.elapsed / 1e9:.3f}s", "",
+                 f"{'opcode':<24}{'count':>12}{'total ms':>12}{'ns/op':>8}{'%':>8}"]
+        ops = sorted((op for op, c in enumerate(self.op_counts) if c), key=lambda op: -self.op_time[op])
+        for op in ops[:limit]:
+            count, spent = self.op_counts[op], self.op_time[op]
+            lines.append(f"{OPNAMES[op]:<24}{count:>12}{spent / 1e6:>12.3f}{spent // count:>8}{spent / total:>8.1%}")
+        lines += ["", f"{'function':<24}{'calls':>12}{'inclusive ms':>14}{'exclusive ms':>14}"]
+        for name in sorted(self.calls, key=lambda n: -self.exclusive.get(n, 0))[:limit]:
+            lines.append(f"{name:<24}{self.calls[name]:>12}{self.inclusive.get(name, 0) / 1e6:>14.3f}"
+                         f"{self.exclusive.get(name, 0) / 1e6:>14.3f}")
+        return "\n".join(lines)
+
+    def _sample_report(self, limit: int) -> str:
+        own: Dict[str, int] = {}
+        seen: Dict[str, int] = {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for name in set(stack):
+                seen[name] = seen.get(name, 0) + count
+        total = self.samples or 1
+        lines = [f"profile (sample): {self.samples} samples every {self.interval * 1e3:g}ms "
+                 f"over {self.elapsed / 1e9:.3f}s", "",
+                 f"{'function':<24}{'self':>8}{'total':>8}"]
+        for name in sorted(seen, key=lambda n: (-own.get(n, 0), -seen[n]))[:limit]:
+            lines.append(f"{name:<24}{own.get(name, 0) / total:>8.1%}{seen[name] / total:>8.1%}")
+        return "\n".join(lines)
@@ -15,10 +15,9 @@ def repl():
             if not code.strip():
                 continue
 
-            parser = Parser(code)
             try:
-                statements = parser.parse()
-            except ParseError as e:
+                statements = Parser(code).parse()
+            except (ParseError, SyntaxError) as e:
                 print(f"[!!] Syntax error: {e}")
                 continue
 
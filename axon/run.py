@@ -1,25 +1,111 @@
 # axon/run.py
-from axon.lexer import tokenize
-from axon.parser import parse_text
-from axon import sema
-from axon.compiler import compile_program
-from axon.vm import VM
+from axon import typecheck
+from axon.cache import load_or_compile
+from axon.closures import ClosureEngine
+from axon.nodes import interpret, MAX_CALL_DEPTH
+from axon.optimizer import OptimizeStats
+from axon.parser import parse_stream
+from axon.profiler import Profiler, PROFILE_MODES, SAMPLE_INTERVAL
+from axon.transpiler import TranspiledEngine
+from axon.vm import VM, DISPATCH_ENGINES
+import argparse
 import sys
 
-def run_file(path: str):
-    # Use 'with' so the file is safely closed after reading
-    with open(path, "r", encoding="utf-8") as f:
-        src = f.read()
-    
-    prog = parse_text(src)
-    sema.analyze(prog)
-    co = compile_program(prog)
-    vm = VM()
+ENGINES = ("vm", "closure", "python", "tree")
+
+def run_file(path: str, dispatch: str = "table", use_cache: bool = True, optimize: int = 0,
+             stats: OptimizeStats = None, quicken: bool = False, engine: str = "vm", tier: bool = True,
+             max_depth: int = MAX_CALL_DEPTH, profiler: Profiler = None):
+    if engine != "vm":
+        # these engines run the AST itself; there is nothing to cache
+        with open(path, "rb") as f:
+            prog = parse_stream(f)
+        typecheck.check(prog)
+        if engine == "tree":
+            return interpret(prog, max_depth=max_depth)
+        if engine == "python":
+            runner = TranspiledEngine(max_depth=max_depth)
+            runner.run(prog, path)
+        else:
+            runner = ClosureEngine(max_depth=max_depth)
+            runner.run(prog)
+        return runner
+    # compiled code is reused from __axoncache__/ when the source is unchanged
+    co = load_or_compile(path, use_cache=use_cache, optimize=optimize, stats=stats)
+    # tier-2 code runs outside the VM's frames, where no profiler sees it
+    vm = VM(dispatch=dispatch, quicken=quicken, tier=tier and profiler is None, max_depth=max_depth)
     vm.push_frame(co)
-    vm.run()
-    
+    vm.run(profiler)
+    return vm
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m axon.run", description="Run an Axon script.")
+    ap.add_argument("file", help="path to a .ax file")
+    ap.add_argument("--engine", choices=ENGINES, default="vm",
+                    help="execute bytecode on the VM (default), the AST compiled to Python closures, "
+                         "the AST transpiled to Python source, or the AST's own eval methods")
+    ap.add_argument("--dispatch", choices=DISPATCH_ENGINES, default="table",
+                    help="VM run loop: opcode table (default) or the original if/elif chain")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="neither read nor write __axoncache__/ bytecode files")
+    ap.add_argument("-O", dest="optimize", action="count", default=0,
+                    help="optimize bytecode; -OO also optimizes the AST first (constant propagation, inlining, loop optimization, dead code)")
+    ap.add_argument("--opt-stats", action="store_true",
+                    help="print how many instructions the optimizer removed to stderr")
+    ap.add_argument("--ic-stats", action="store_true",
+                    help="print inline cache hits/misses for global lookups and calls to stderr")
+    ap.add_argument("--quicken", action="store_true",
+                    help="specialize arithmetic/compare/subscript instructions to the operand types seen at run time")
+    ap.add_argument("--no-tier", action="store_true",
+                    help="keep every function in the VM instead of moving hot ones to tier 2")
+    ap.add_argument("--tier-stats", action="store_true",
+                    help="print how many code objects were promoted to tier 2 to stderr")
+    ap.add_argument("--max-depth", type=int, default=MAX_CALL_DEPTH,
+                    help="nested calls allowed before the script fails with RecursionError "
+                         "(all engines; tail calls do not nest, except with --engine python; the AST "
+                         "engines also stop at about 500 000 Python frames)")
+    ap.add_argument("--profile", action="store_true",
+                    help="profile the VM run and print a report to stderr")
+    ap.add_argument("--profile-mode", choices=PROFILE_MODES, default="trace",
+                    help="with --profile: time every instruction (default) or sample the call stack")
+    ap.add_argument("--profile-out", metavar="PATH",
+                    help="with --profile, also write collapsed stacks for flamegraph tools to PATH")
+    ap.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL * 1e3, metavar="MS",
+                    help="milliseconds between samples with --profile-mode sample (default: %(default)g)")
+    ap.add_argument("--quicken-stats", action="store_true",
+                    help="print how many instructions were specialized and deoptimized to stderr")
+    args = ap.parse_args(argv)
+    if args.profile_out and not args.profile:
+        ap.error("--profile-out needs --profile")
+    if args.profile and args.engine != "vm":
+        ap.error(f"--profile needs --engine vm, not --engine {args.engine}")
+    stats = OptimizeStats() if args.opt_stats else None
+    profiler = Profiler(args.profile_mode, args.sample_interval / 1e3) if args.profile else None
+    try:
+        vm = run_file(args.file, dispatch=args.dispatch, use_cache=not args.no_cache,
+                      optimize=args.optimize, stats=stats, quicken=args.quicken, engine=args.engine,
+                      tier=not args.no_tier, max_depth=args.max_depth, profiler=profiler)
+    finally:
+        # a failing script still gets the report for everything up to the error
+        if profiler is not None:
+            print(profiler.report(), file=sys.stderr)
+            if args.profile_out:
+                profiler.write_collapsed(args.profile_out)
+    if args.engine != "vm":
+        return
+    if args.ic_stats:
+        ic = vm.cache_stats()
+        print(f"inline caches: {ic['hits']} hits, {ic['misses']} misses ({ic['hit_rate']:.1%} hit rate)",
+              file=sys.stderr)
+    if args.quicken_stats:
+        qs = vm.quicken_stats()
+        print(f"quickening: {qs['specializations']} specializations, {qs['deopts']} deopts", file=sys.stderr)
+    if args.tier_stats:
+        ts = vm.tier_stats()
+        print(f"tiering: {ts['promotions']} promoted, {ts['osr_entries']} on-stack replacements, "
+              f"{ts['failures']} left in the VM", file=sys.stderr)
+    if stats is not None:
+        print(stats.report() if stats.before else "optimizer: nothing optimized (level 0 or cached code)", file=sys.stderr)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python -m axon.run <file.ax>")
-        raise SystemExit(1)
-    run_file(sys.argv[1])
+    main()
@@ -1,44 +1,212 @@
 # axon/sema.py
-from axon.ast import *  # noqa: F403, F401
-from typing import Set
+"""
+Semantic analysis of the nodes.py AST: scopes and use-def information.
+
+Scoping follows the compiler (`compiler.Scope`): at module level every
+name is a global; inside a `fn`, params and names declared with `let`
+anywhere in the body are locals and every other name is a global. A `fn`
+definition always binds a global, wherever it is written.
+
+`analyze(prog)` resolves every variable read and every binding to the
+`Symbol` it refers to:
+
+* `Symbol.defs` are the bindings: `let`, `x = ...`, a loop variable, a
+  param (the site of its `FunctionNode`) and a `fn` definition;
+* `Symbol.uses` are the `VariableNode`s reading it.
+
+Both are `Site`s: the node, the scope it is in and which statement of that
+scope's body it is part of. That is enough to tell that a binding has run
+before a read (`runs_after`), which the AST optimizer (axon/astopt.py)
+relies on. `break` / `continue` outside a loop raise `SemanticError`.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from axon.compiler import Scope
+from axon.nodes import *  # noqa: F403, F401
+
 
 class SemanticError(Exception):
     pass
 
-def analyze(program: Program):
+
+@dataclass(eq=False)
+class Site:
+    """Where a node is: its scope, the index of the statement of the scope's body it is in, and
+    whether it is inside an `if` / loop body of that statement rather than the statement itself."""
+    node: Any
+    scope: "ScopeInfo"
+    index: int
+    nested: bool
+
+
+@dataclass(eq=False)
+class Symbol:
+    name: str
+    scope: "ScopeInfo"
+    defs: List[Site] = field(default_factory=list)
+    uses: List[Site] = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class ScopeInfo:
+    """The module (`function` is None) or the body of one `fn`."""
+    function: Optional[FunctionNode]
+    site: Optional[Site]        # where the `fn` is defined
+    symbols: Dict[str, Symbol] = field(default_factory=dict)
+    calls: List[Site] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return "<module>" if self.function is None else self.function.name
+
+
+@dataclass(eq=False)
+class Analysis:
+    module: ScopeInfo
+    functions: Dict[FunctionNode, ScopeInfo]
+    symbols: Dict[Any, Symbol]      # VariableNode / binding node -> its symbol
+    sites: Dict[Any, Site]          # VariableNode / CallNode / binding node / WhileNode -> its site
+
+    def globals(self) -> Dict[str, Symbol]:
+        return self.module.symbols
+
+    def callees(self, scope: ScopeInfo) -> List[str]:
+        return [site.node.name for site in scope.calls]
+
+
+def runs_after(site: Site, binding: Site) -> bool:
     """
-    Minimal semantic analysis:
-     - ensure assignments have a name (done by parser)
-     - (optional) warn about uses of undefined names at compile-time is tricky for dynamic languages.
-    For now: collect assigned names and return a simple symbol table.
+    True when `binding` (a statement directly in its scope's body, not nested)
+    has certainly run whenever `site` runs: `site` comes later in the same
+    body, or is inside a `fn` that is itself defined after the binding.
     """
-    assigned: Set[str] = set()
-    used: Set[str] = set()
-
-    stmts = program.statements if hasattr(program, "statements") else program
-    
-    for stmt in stmts:
-        if isinstance(stmt, Assign):
-            assigned.add(stmt.name)
-            # inspect rhs for used names
-            collect_names(stmt.value, used)
-        elif isinstance(stmt, Print):
-            collect_names(stmt.expr, used)
-
-    # note: do not raise on uses of names that are not yet assigned (dynamic)
-    # but we can return symbol info for tooling.
-    return {"assigned": assigned, "used": used}
-
-
-def collect_names(node, used: Set[str]):
-    # recursively collect Var names used
-    if isinstance(node, Var):
-        used.add(node.name)
-    elif isinstance(node, BinOp):
-        collect_names(node.left, used)
-        collect_names(node.right, used)
-    elif isinstance(node, Number):
-        pass
-    else:
-        # extend later for other node types
-        pass
+    if binding.nested:
+        return False
+    while site.scope is not binding.scope:
+        site = site.scope.site
+        if site is None:
+            return False
+    return site.index > binding.index
+
+
+class _Analyzer:
+    def __init__(self):
+        self.module = ScopeInfo(None, None)
+        self.functions: Dict[FunctionNode, ScopeInfo] = {}
+        self.symbols: Dict[Any, Symbol] = {}
+        self.sites: Dict[Any, Site] = {}
+
+    def lookup(self, scope: ScopeInfo, name: str) -> Symbol:
+        """A local of `scope` if it has one called `name`, else the global."""
+        symbol = scope.symbols.get(name)
+        if symbol is None:
+            symbol = self.module.symbols.get(name)
+            if symbol is None:
+                symbol = self.module.symbols[name] = Symbol(name, self.module)
+        return symbol
+
+    def bind(self, node, name: str, site: Site, scope: ScopeInfo = None):
+        symbol = self.lookup(scope or site.scope, name)
+        symbol.defs.append(site)
+        self.symbols[node] = symbol
+        self.sites[node] = site
+
+    def body(self, stmts, scope: ScopeInfo):
+        for index, stmt in enumerate(stmts):
+            self.stmt(stmt, scope, index, False, 0)
+
+    def block(self, stmts, scope: ScopeInfo, index: int, loops: int):
+        for stmt in stmts:
+            self.stmt(stmt, scope, index, True, loops)
+
+    def stmt(self, stmt, scope: ScopeInfo, index: int, nested: bool, loops: int):
+        site = Site(stmt, scope, index, nested)
+
+        if isinstance(stmt, LetNode):
+            self.expr(stmt.expr, site)
+            self.bind(stmt, stmt.name, site)
+
+        elif isinstance(stmt, PrintNode):
+            self.expr(stmt.expr, site)
+
+        elif isinstance(stmt, IfNode):
+            for cond, body in stmt.branches:
+                self.expr(cond, site)
+                self.block(body, scope, index, loops)
+            self.block(stmt.else_body, scope, index, loops)
+
+        elif isinstance(stmt, WhileNode):
+            # the loop optimizer places code in front of the loop
+            self.sites[stmt] = site
+            self.expr(stmt.condition, site)
+            self.block(stmt.body, scope, index, loops + 1)
+
+        elif isinstance(stmt, (ForNode, ForInNode)):
+            if isinstance(stmt, ForNode):
+                for e in (stmt.start_expr, stmt.end_expr, stmt.step_expr):
+                    if e is not None:
+                        self.expr(e, site)
+            else:
+                self.expr(stmt.iter_expr, site)
+            # the loop variable is bound by every iteration, inside the loop
+            self.bind(stmt, stmt.var_name, Site(stmt, scope, index, True))
+            self.block(stmt.body, scope, index, loops + 1)
+
+        elif isinstance(stmt, (BreakNode, ContinueNode)):
+            if not loops:
+                keyword = "break" if isinstance(stmt, BreakNode) else "continue"
+                raise SemanticError(f"'{keyword}' outside loop")
+
+        elif isinstance(stmt, FunctionNode):
+            self.bind(stmt, stmt.name, site, self.module)
+            inner = ScopeInfo(stmt, site)
+            for name in Scope(stmt.params, stmt.body).slots:
+                inner.symbols[name] = Symbol(name, inner)
+            for p in stmt.params:
+                inner.symbols[p].defs.append(Site(stmt, inner, -1, False))
+            self.functions[stmt] = inner
+            self.body(stmt.body, inner)
+
+        elif isinstance(stmt, CallNode):
+            self.expr(stmt, site)
+
+        elif isinstance(stmt, ReturnNode):
+            if stmt.expr is not None:
+                self.expr(stmt.expr, site)
+
+    def expr(self, node, stmt_site: Site):
+        site = Site(node, stmt_site.scope, stmt_site.index, stmt_site.nested)
+        if isinstance(node, VariableNode):
+            symbol = self.lookup(site.scope, node.name)
+            symbol.uses.append(site)
+            self.symbols[node] = symbol
+            self.sites[node] = site
+        elif isinstance(node, BinOpNode):
+            self.expr(node.left, stmt_site)
+            self.expr(node.right, stmt_site)
+        elif isinstance(node, UnaryOpNode):
+            self.expr(node.expr, stmt_site)
+        elif isinstance(node, ListNode):
+            for e in node.elements:
+                self.expr(e, stmt_site)
+        elif isinstance(node, DictNode):
+            for k, v in node.entries:
+                self.expr(k, stmt_site)
+                self.expr(v, stmt_site)
+        elif isinstance(node, IndexNode):
+            self.expr(node.collection, stmt_site)
+            self.expr(node.index, stmt_site)
+        elif isinstance(node, CallNode):
+            site.scope.calls.append(site)
+            self.sites[node] = site
+            for a in node.args:
+                self.expr(a, stmt_site)
+
+
+def analyze(prog) -> Analysis:
+    """Scopes and use-def information of a program (a statement list, or anything with `.statements`)."""
+    stmts = prog.statements if hasattr(prog, "statements") else prog
+    a = _Analyzer()
+    a.body(stmts, a.module)
+    return Analysis(a.module, a.functions, a.symbols, a.sites)
@@ -0,0 +1,452 @@
+# axon/tiers.py
+"""
+Second execution tier: a hot CodeObject's bytecode translated into a single
+Python function, so its instructions run as CPython bytecode instead of
+going through the VM's dispatch loop one by one.
+
+The VM counts calls and loop backedges per code object (`TIER_THRESHOLD`).
+Once a code object is hot it is translated here. Later calls go to the
+Python function, and a frame that is still looping jumps into it at its
+loop header ("on-stack replacement").
+
+Translation works basic block by basic block. Operand stack entries become
+Python expressions, so `LOAD_FAST 0; CONST 1; BINARY_ADD; STORE_FAST 0`
+becomes `l0 = (l0 + 1)`. Blocks are dispatched on a `pc` variable, and a
+`TAIL_CALL` back into the same function rebinds the params and restarts
+at `pc = 0`. The `if`s choosing a block form a binary tree over the block
+starts, so a loop's backedge costs a few tests however much code comes
+before the loop; the tests run in block order, so a block that falls
+through or jumps forward reaches its successor without a new round:
+
+    def tier2_main(pc=0):
+        while True:
+            if pc < 12:
+                if pc == 0:
+                    ...
+                    pc = 3
+                if pc == 3:
+                    pc = 7 if (...) else 5
+                ...
+            if pc >= 12:
+                ...
+
+Locals are `l<slot>` and globals go through the VM's `Globals`, so the
+inline caches of code still running in the VM see every store. Reading a
+local tests it for UNBOUND unless it is a param or one of the locals the
+type checker proved bound (`co.bound`). A value still on the stack when a
+block ends (the left operand of a short-circuit `and` / `or`, a for loop's
+iterator) is handed to the next block in `s<depth>`; those of a loop
+header are parameters after `pc` too, so a frame can enter it by OSR in
+the middle of a for loop. Code the translator has no form for raises
+`Unsupported` and stays in the VM.
+"""
+from typing import Any, Callable, Dict, List, Tuple
+import math
+import re
+
+from axon.compiler import CodeObject, CALL_ARGC_BITS, CALL_ARGC_MASK, iter_instructions
+from axon.opcodes import *  # noqa: F403, F401
+from axon.verifier import VerifyError, stack_depths
+
+# calls + loop backedges before a code object is translated
+TIER_THRESHOLD = 1000
+
+# nested tier-2 calls (Python frames) allowed before calls fall back to VM frames
+NATIVE_DEPTH_LIMIT = 100
+
+BINARY_SYMBOLS = {
+    BINARY_ADD: '+', BINARY_SUB: '-', BINARY_MUL: '*', BINARY_DIV: '/', BINARY_MOD: '%',
+    COMPARE_EQ: '==', COMPARE_NE: '!=', COMPARE_LT: '<',
+    COMPARE_LE: '<=', COMPARE_GT: '>', COMPARE_GE: '>=',
+    BINARY_AND: 'and', BINARY_OR: 'or',
+}
+
+COMPARE_JUMP_SYMBOLS = {
+    COMPARE_EQ_JUMP: '==', COMPARE_NE_JUMP: '!=', COMPARE_LT_JUMP: '<',
+    COMPARE_LE_JUMP: '<=', COMPARE_GT_JUMP: '>', COMPARE_GE_JUMP: '>=',
+}
+
+# instructions that end a basic block
+TERMINATORS = HAS_JUMP | {RETURN}
+
+# blocks tested one after another at a leaf of the dispatch tree
+DISPATCH_LEAF = 4
+
+
+class Unsupported(Exception):
+    """The code object uses an instruction tier 2 cannot express."""
+
+
+class _Block:
+    """Symbolic operand stack of one basic block, and the Python lines it produced."""
+
+    def __init__(self, translator: "Translator"):
+        self.t = translator
+        self.lines: List[str] = []
+        # (expression, stable): stable entries (literals, temporaries) may be
+        # evaluated at any later point; others are pinned by `flush`
+        self.stack: List[Tuple[str, bool]] = []
+
+    def push(self, expr: str, stable: bool = False):
+        self.stack.append((expr, stable))
+
+    def pop(self) -> str:
+        return self.stack.pop()[0] if self.stack else "None"
+
+    def pop_n(self, n: int) -> List[str]:
+        items = [e for e, _ in self.stack[len(self.stack) - n:]]
+        del self.stack[len(self.stack) - n:]
+        return items
+
+    def flush(self):
+        """Evaluate pending expressions now, before a side effect could change what they read."""
+        for i, (expr, stable) in enumerate(self.stack):
+            if not stable:
+                temp = self.t.temp()
+                self.lines.append(f"{temp} = {expr}")
+                self.stack[i] = (temp, True)
+
+    def spill(self):
+        """Store the stack in the `s<depth>` variables the next block starts from."""
+        slots = [(f"s{k}", expr) for k, (expr, _) in enumerate(self.stack) if expr != f"s{k}"]
+        if slots:
+            # one assignment, so every value is read before any slot is overwritten
+            self.lines.append(", ".join(s for s, _ in slots) + " = " + ", ".join(e for _, e in slots))
+        self.stack = [(f"s{k}", True) for k in range(len(self.stack))]
+
+    def drain(self):
+        """Evaluate what is left on the stack for its errors; the values themselves are dropped."""
+        for expr, stable in self.stack:
+            if not stable:
+                self.lines.append(expr)
+        self.stack.clear()
+
+
+class Translator:
+    def __init__(self, co: CodeObject):
+        self.co = co
+        self.instrs = list(iter_instructions(co.code))
+        try:
+            self.depths = stack_depths(co)
+        except VerifyError as e:
+            raise Unsupported(str(e)) from None
+        self.ntemps = 0
+
+    def temp(self) -> str:
+        self.ntemps += 1
+        return f"t{self.ntemps}"
+
+    # ---------------- OPERANDS ----------------
+    def const(self, idx: int) -> str:
+        v = self.co.consts[idx]
+        if v is None or type(v) in (bool, int, str) or (type(v) is float and math.isfinite(v)):
+            return repr(v)
+        return f"K[{idx}]"
+
+    def load_name(self, idx: int) -> str:
+        name = repr(self.co.names[idx])
+        return f"(G[{name}] if {name} in G else _undefined({name}))"
+
+    def load_fast(self, slot: int) -> str:
+        # params always hold a value, and so do the locals the type checker proved bound
+        if slot < len(self.co.params) or slot in self.co.bound:
+            return f"l{slot}"
+        return f"(l{slot} if l{slot} is not UNBOUND else _unbound({self.co.varnames[slot]!r}))"
+
+    # ---------------- BLOCKS ----------------
+    def blocks(self) -> List[Tuple[int, int]]:
+        """(start, end) instruction ranges of the basic blocks reachable from instruction 0."""
+        n = len(self.instrs)
+        starts = {0}
+        for i, (op, arg) in enumerate(self.instrs):
+            if op in HAS_JUMP:
+                starts.add(i + arg)
+            if op in TERMINATORS:
+                starts.add(i + 1)
+        starts = sorted(s for s in starts if s < n)
+        ends = dict(zip(starts, starts[1:] + [n]))
+        reachable, todo = set(), [0] if n else []
+        while todo:
+            start = todo.pop()
+            if start in reachable or start >= n:
+                continue
+            reachable.add(start)
+            last = ends[start] - 1
+            op, arg = self.instrs[last]
+            if op in HAS_JUMP:
+                todo.append(last + arg)
+            if op != JUMP and op != RETURN:
+                todo.append(last + 1)
+        return [(start, ends[start]) for start in sorted(reachable)]
+
+    def source(self, fname: str) -> str:
+        co = self.co
+        nparams = len(co.params)
+        params = [f"l{i}" for i in range(nparams)]
+        params += [f"l{i}=UNBOUND" for i in range(nparams, co.nlocals)]
+        params.append("pc=0")
+        # stack entries live at the loop headers OSR can enter (backedge targets)
+        entry_depth = max((self.depths[i + arg] for i, (op, arg) in enumerate(self.instrs)
+                           if op == JUMP and arg < 0), default=0)
+        params += [f"s{k}=None" for k in range(entry_depth)]
+        blocks = [(start, self.block(start, end)) for start, end in self.blocks()]
+        # running off the end of the code
+        blocks.append((len(self.instrs), ["return None"]))
+        lines = [f"def {fname}({', '.join(params)}):", "    while True:"]
+        lines += self.dispatch(blocks, 2)
+        return "\n".join(lines) + "\n"
+
+    def dispatch(self, blocks: List[Tuple[int, List[str]]], depth: int) -> List[str]:
+        """The `if`s that run the block `pc` names: halves of `blocks` down to DISPATCH_LEAF."""
+        pad = "    " * depth
+        if len(blocks) <= DISPATCH_LEAF:
+            lines = []
+            for start, body in blocks:
+                lines.append(f"{pad}if pc == {start}:")
+                lines.extend(pad + "    " + line for line in body)
+            return lines
+        mid = len(blocks) // 2
+        split = blocks[mid][0]
+        return ([f"{pad}if pc < {split}:"] + self.dispatch(blocks[:mid], depth + 1) +
+                [f"{pad}if pc >= {split}:"] + self.dispatch(blocks[mid:], depth + 1))
+
+    def block(self, start: int, end: int) -> List[str]:
+        b = _Block(self)
+        for k in range(self.depths[start]):
+            b.push(f"s{k}", stable=True)
+        for i in range(start, end):
+            op, arg = self.instrs[i]
+            if self.instruction(b, i, op, arg):
+                return b.lines
+        # fell through into the next block
+        b.spill()
+        b.lines.append(f"pc = {end}")
+        return b.lines
+
+    def jump(self, b: _Block, i: int, target: int, cond: str = None):
+        """Block ending in a jump; `cond` is the condition that has to be true to fall through."""
+        b.spill()
+        if cond is None:
+            b.lines.append(f"pc = {target}")
+            if target <= i:
+                b.lines.append("continue")
+        elif target > i:
+            b.lines.append(f"pc = {i + 1} if {cond} else {target}")
+        else:
+            b.lines.append(f"if not {cond}:")
+            b.lines.append(f"    pc = {target}")
+            b.lines.append("    continue")
+            b.lines.append(f"pc = {i + 1}")
+
+    def instruction(self, b: _Block, i: int, op: int, arg: int) -> bool:
+        """Translate one instruction into `b`; True when it ended the block."""
+        co = self.co
+
+        if op == CONST:
+            b.push(self.const(arg), stable=True)
+
+        elif op == LOAD_NAME:
+            b.push(self.load_name(arg))
+
+        elif op == LOAD_FAST:
+            b.push(self.load_fast(arg))
+
+        elif op == LOAD_NAME_PAIR:
+            b.push(self.load_name(arg >> PAIR_BITS))
+            b.push(self.load_name(arg & PAIR_MASK))
+
+        elif op == LOAD_FAST_PAIR:
+            b.push(self.load_fast(arg >> PAIR_BITS))
+            b.push(self.load_fast(arg & PAIR_MASK))
+
+        elif op == LOAD_NAME_CONST:
+            b.push(self.load_name(arg >> PAIR_BITS))
+            b.push(self.const(arg & PAIR_MASK), stable=True)
+
+        elif op == LOAD_FAST_CONST:
+            b.push(self.load_fast(arg >> PAIR_BITS))
+            b.push(self.const(arg & PAIR_MASK), stable=True)
+
+        elif op == STORE_NAME:
+            value = b.pop()
+            b.flush()
+            b.lines.append(f"G[{co.names[arg]!r}] = {value}")
+
+        elif op == STORE_FAST:
+            value = b.pop()
+            b.flush()
+            b.lines.append(f"l{arg} = {value}")
+
+        elif op == INC_NAME:
+            b.flush()
+            b.lines.append(f"G[{co.names[arg]!r}] = {self.load_name(arg)} + 1")
+
+        elif op == INC_FAST:
+            b.flush()
+            b.lines.append(f"l{arg} = {self.load_fast(arg)} + 1")
+
+        elif op in (BINARY_AND, BINARY_OR):
+            # the VM has both operands before combining them
+            if not b.stack[-1][1]:
+                b.flush()
+            right, left = b.pop(), b.pop()
+            b.push(f"({left} {BINARY_SYMBOLS[op]} {right})")
+
+        elif op in BINARY_SYMBOLS:
+            right, left = b.pop(), b.pop()
+            b.push(f"({left} {BINARY_SYMBOLS[op]} {right})")
+
+        elif op == UNARY_NEG:
+            b.push(f"(-{b.pop()})")
+
+        elif op == UNARY_NOT:
+            b.push(f"(not {b.pop()})")
+
+        elif op == BUILD_LIST:
+            b.push("[" + ", ".join(b.pop_n(arg)) + "]")
+
+        elif op == BUILD_DICT:
+            items = b.pop_n(2 * arg)
+            b.push("{" + ", ".join(f"{k}: {v}" for k, v in zip(items[::2], items[1::2])) + "}")
+
+        elif op == BUILD_LIST_CONST:
+            b.push(f"list(K[{arg}])")
+
+        elif op == BUILD_DICT_CONST:
+            b.push(f"dict(K[{arg}])")
+
+        elif op == BINARY_SUBSCR:
+            index, coll = b.pop(), b.pop()
+            b.push(f"{coll}[{index}]")
+
+        elif op == PRINT:
+            value = b.pop()
+            b.flush()
+            b.lines.append(f"G['print']({value})")
+
+        elif op == CLEAR:
+            b.flush()
+            b.lines.append("_clear()")
+
+        elif op == MAKE_FUNCTION:
+            b.flush()
+            b.lines.append(f"G[{co.consts[arg].name!r}] = _Function(K[{arg}])")
+
+        elif op == CALL_FUNCTION:
+            name = repr(co.names[arg >> CALL_ARGC_BITS])
+            args = b.pop_n(arg & CALL_ARGC_MASK)
+            b.flush()
+            temp = self.temp()
+            b.lines.append(f"{temp} = _call(G.get({name}), {name}{''.join(', ' + a for a in args)})")
+            b.push(temp, stable=True)
+
+        elif op == TAIL_CALL:
+            name = repr(co.names[arg >> CALL_ARGC_BITS])
+            args = b.pop_n(arg & CALL_ARGC_MASK)
+            b.flush()
+            temp = self.temp()
+            b.lines.append(f"{temp} = G.get({name})")
+            if len(args) == len(co.params):
+                # a call to this same function restarts it with the new arguments
+                b.lines.append(f"if type({temp}) is _Function and {temp}.code is CO:")
+                if args:
+                    slots = ", ".join(f"l{i}" for i in range(len(args)))
+                    b.lines.append(f"    {slots} = {', '.join(args)}")
+                if co.nlocals > len(args):
+                    b.lines.append("    " + " = ".join(f"l{i}" for i in range(len(args), co.nlocals)) + " = UNBOUND")
+                b.lines.append("    pc = 0")
+                b.lines.append("    continue")
+            b.lines.append(f"{temp} = _call({temp}, {name}{''.join(', ' + a for a in args)})")
+            b.push(temp, stable=True)
+
+        elif op == CHECK_TYPE:
+            value = b.pop()
+            b.flush()
+            temp = self.temp()
+            type_name, name = TYPE_NAMES[arg & TYPE_MASK], co.names[arg >> TYPE_BITS]
+            b.lines.append(f"{temp} = _check_type({value}, {type_name!r}, {name!r})")
+            b.push(temp, stable=True)
+
+        elif op == POP_TOP:
+            if b.stack:
+                expr, stable = b.stack.pop()
+                if not stable:
+                    b.lines.append(expr)
+
+        elif op == RETURN:
+            value = b.pop()
+            b.drain()
+            b.lines.append(f"return {value}")
+            return True
+
+        elif op == JUMP:
+            self.jump(b, i, i + arg)
+            return True
+
+        elif op == JUMP_IF_FALSE:
+            self.jump(b, i, i + arg, b.pop())
+            return True
+
+        elif op == JUMP_IF_TRUE:
+            self.jump(b, i, i + arg, f"(not {b.pop()})")
+            return True
+
+        elif op in (JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP):
+            # the tested value goes to its slot first: the jump target still has it on the stack
+            b.spill()
+            slot = b.pop()
+            self.jump(b, i, i + arg, slot if op == JUMP_IF_FALSE_OR_POP else f"(not {slot})")
+            return True
+
+        elif op == FOR_RANGE:
+            step, stop, start = b.pop(), b.pop(), b.pop()
+            b.push(f"_range({start}, {stop}, {step})")
+
+        elif op == GET_ITER:
+            b.push(f"_iter({b.pop()})")
+
+        elif op == FOR_ITER:
+            # the iterator is in its slot; the item goes to the slot above it
+            b.spill()
+            item = f"s{len(b.stack)}"
+            b.lines.append(f"{item} = next({b.stack[-1][0]}, _EXHAUSTED)")
+            b.push(item, stable=True)
+            self.jump(b, i, i + arg, f"({item} is not _EXHAUSTED)")
+            return True
+
+        elif op in COMPARE_JUMP_SYMBOLS:
+            right, left = b.pop(), b.pop()
+            self.jump(b, i, i + arg, f"({left} {COMPARE_JUMP_SYMBOLS[op]} {right})")
+            return True
+
+        else:
+            raise Unsupported(f"{OPNAMES[op]} has no tier-2 translation")
+
+        return False
+
+
+def function_name(co: CodeObject) -> str:
+    return "tier2_" + re.sub(r"\W", "_", co.name.strip("_") or "main")
+
+
+def translate(co: CodeObject) -> str:
+    """Python source of a function running `co`: positional locals, then the `pc` to start at."""
+    return Translator(co).source(function_name(co))
+
+
+def compile_tier2(co: CodeObject, namespace: Dict[str, Any]) -> Callable:
+    """
+    Translate and compile `co`; Unsupported when either step fails.
+    `namespace` supplies what the generated code refers to besides its
+    locals: G, K, CO (`co` itself), UNBOUND, _call, _undefined, _unbound,
+    _clear, _Function, _range, _iter, _check_type and _EXHAUSTED.
+    """
+    fname = function_name(co)
+    source = Translator(co).source(fname)
+    try:
+        code = compile(source, f"<tier2 {co.name}>", "exec")
+    except (SyntaxError, RecursionError, MemoryError, ValueError) as e:
+        # valid code Python cannot compile, such as an expression nested too deeply
+        raise Unsupported(f"compile() failed: {e}") from None
+    exec(code, namespace)
+    return namespace[fname]
@@ -0,0 +1,326 @@
+# axon/transpiler.py
+"""
+Transpiling tier: translates the nodes.py AST into Python source, compiles
+that with CPython's `compile()` and runs it, so Axon code executes on
+CPython's own interpreter instead of on an interpreter written in Python.
+
+The generated module has the VM's semantics:
+
+* every top-level name is a global (a key of `engine.globals`);
+* inside a `fn`, params and `let`-declared names are locals (the
+  compiler's `Scope`), every other name is a global; a `fn` nested in
+  another declares the names it reads `global` too, so it never closes
+  over the enclosing function's locals;
+* the builtins are nodes.BUILTINS, looked up in the globals like any name;
+* runtime errors are re-raised as the VM's `RuntimeError` messages;
+* each Axon call is one Python call, and the program runs through
+  `run_deep`, so about `max_depth` calls may nest before RecursionError.
+
+Axon identifiers that are Python keywords (`class`, `None`, ...) are
+prefixed with `__ax_`, as are the helpers the generated code uses.
+
+    python -m axon.transpiler script.ax     # print the generated Python
+"""
+from typing import Dict, List, Set
+import argparse
+import keyword
+import os
+import re
+import sys
+
+from axon.astopt import all_stmts, stmt_exprs, walk
+from axon.compiler import Scope
+from axon.nodes import *
+from axon.parser import parse_stream
+
+PREFIX = "__ax_"
+INDENT = "    "
+
+BINARY_OPS = {'+', '-', '*', '/', '%', '==', '!=', '<', '<=', '>', '>=', 'and', 'or'}
+
+# operators Python groups from the left at one precedence level, as Axon's
+# parser does: a left-nested chain of them needs no inner parentheses
+CHAIN_LEVELS = {'+': 'sum', '-': 'sum', '*': 'product', '/': 'product', '%': 'product',
+                'and': 'and', 'or': 'or'}
+
+
+def ident(name: str) -> str:
+    if keyword.iskeyword(name) or name.startswith(PREFIX):
+        return PREFIX + name
+    return name
+
+
+def axon_name(name: str) -> str:
+    return name[len(PREFIX):] if name.startswith(PREFIX) else name
+
+
+def assigned_names(stmts) -> List[str]:
+    """Names a block stores to (let, reassignment, for, fn), not descending into nested functions."""
+    names = []
+    for stmt in stmts:
+        if isinstance(stmt, LetNode):
+            names.append(stmt.name)
+        elif isinstance(stmt, FunctionNode):
+            names.append(stmt.name)
+        elif isinstance(stmt, IfNode):
+            for _, body in stmt.branches:
+                names.extend(assigned_names(body))
+            names.extend(assigned_names(stmt.else_body))
+        elif isinstance(stmt, WhileNode):
+            names.extend(assigned_names(stmt.body))
+        elif isinstance(stmt, (ForNode, ForInNode)):
+            names.append(stmt.var_name)
+            names.extend(assigned_names(stmt.body))
+    return names
+
+
+def used_names(stmts) -> List[str]:
+    """Names a block reads or calls, not descending into nested functions."""
+    names = []
+    for stmt in all_stmts(stmts, into_functions=False):
+        for expr in stmt_exprs(stmt):
+            for node in walk(expr):
+                if isinstance(node, (VariableNode, CallNode)):
+                    names.append(node.name)
+    return names
+
+
+class Transpiler:
+    def __init__(self):
+        self.lines: List[str] = []
+        self.called: Set[str] = set()   # names used as a callee
+        self.read: Set[str] = set()     # names read as a variable
+        self.arity: Dict[str, int] = {}  # params of each fn, for error messages
+
+    def emit(self, depth: int, line: str):
+        self.lines.append(INDENT * depth + line)
+
+    def module(self, stmts) -> str:
+        # the body runs as a function: global lookups are faster than
+        # module-level name lookups, and a top-level `return` ends the script
+        self.function(PREFIX + "main", [], stmts, None, 0)
+        self.emit(0, f"{PREFIX}main()")
+        return "\n".join(self.lines) + "\n"
+
+    def function(self, name: str, params, body, scope: Scope, depth: int, param_types=None, nested=False):
+        """`nested`: defined inside another fn, whose locals Python would let it read."""
+        self.emit(depth, f"def {name}({', '.join(ident(p) for p in params)}):")
+        local = scope.slots if scope is not None else {}
+        names = assigned_names(body) + used_names(body) if nested else assigned_names(body)
+        stored = [n for n in dict.fromkeys(names) if n not in local]
+        if stored:
+            self.emit(depth + 1, "global " + ", ".join(ident(n) for n in stored))
+        for p, type_name in zip(params, param_types or ()):
+            if type_name is not None:
+                self.emit(depth + 1, f"{PREFIX}check({ident(p)}, {type_name!r}, {p!r})")
+        self.block(body, scope, depth + 1)
+
+    def block(self, stmts, scope: Scope, depth: int):
+        if not stmts:
+            self.emit(depth, "pass")
+        for stmt in stmts:
+            self.stmt(stmt, scope, depth)
+
+    def stmt(self, stmt, scope: Scope, depth: int):
+
+        # let x = expr;  /  x = expr;
+        if isinstance(stmt, LetNode):
+            value = self.expr(stmt.expr)
+            if stmt.type_name is not None:
+                value = f"{PREFIX}check({value}, {stmt.type_name!r}, {stmt.name!r})"
+            self.emit(depth, f"{ident(stmt.name)} = {value}")
+
+        # print(expr); goes through the `print` global, like the VM's PRINT
+        elif isinstance(stmt, PrintNode):
+            self.emit(depth, f"print({self.expr(stmt.expr)})")
+
+        elif isinstance(stmt, ClearNode):
+            self.emit(depth, f"{PREFIX}clear()")
+
+        elif isinstance(stmt, IfNode):
+            keyword_ = "if"
+            for cond, body in stmt.branches:
+                self.emit(depth, f"{keyword_} {self.expr(cond)}:")
+                self.block(body, scope, depth + 1)
+                keyword_ = "elif"
+            if stmt.else_body:
+                self.emit(depth, "else:")
+                self.block(stmt.else_body, scope, depth + 1)
+
+        elif isinstance(stmt, WhileNode):
+            self.emit(depth, f"while {self.expr(stmt.condition)}:")
+            self.block(stmt.body, scope, depth + 1)
+
+        # for i = start to end step s { }
+        elif isinstance(stmt, ForNode):
+            bounds = f"{self.expr(stmt.start_expr)}, {self.expr(stmt.end_expr)}"
+            if stmt.step_expr is not None:
+                bounds += f", {self.expr(stmt.step_expr)}"
+            self.emit(depth, f"for {ident(stmt.var_name)} in {PREFIX}range({bounds}):")
+            self.block(stmt.body, scope, depth + 1)
+
+        # for x in expr { }
+        elif isinstance(stmt, ForInNode):
+            self.emit(depth, f"for {ident(stmt.var_name)} in {PREFIX}iter({self.expr(stmt.iter_expr)}):")
+            self.block(stmt.body, scope, depth + 1)
+
+        elif isinstance(stmt, BreakNode):
+            self.emit(depth, "break")
+
+        elif isinstance(stmt, ContinueNode):
+            self.emit(depth, "continue")
+
+        # fn name(params) { } binds a global, wherever it is defined
+        elif isinstance(stmt, FunctionNode):
+            self.arity[stmt.name] = len(stmt.params)
+            self.function(ident(stmt.name), stmt.params, stmt.body, Scope(stmt.params, stmt.body), depth,
+                          stmt.param_types, nested=scope is not None)
+
+        elif isinstance(stmt, CallNode):
+            self.emit(depth, self.expr(stmt))
+
+        elif isinstance(stmt, ReturnNode):
+            self.emit(depth, "return" if stmt.expr is None else f"return {self.expr(stmt.expr)}")
+
+        else:
+            raise Exception(f"Unhandled stmt in transpiler: {stmt}")
+
+    def expr(self, node) -> str:
+
+        # literals: repr() round-trips ints, floats, strings and booleans
+        if isinstance(node, (NumberNode, StringNode, BooleanNode)):
+            return repr(node.value)
+
+        if isinstance(node, VariableNode):
+            self.read.add(node.name)
+            return ident(node.name)
+
+        # parenthesized, so Python never chains `a < b < c`; a chain like
+        # `a + b - c` gets one pair, so long chains stay within Python's nesting limit
+        if isinstance(node, BinOpNode):
+            if node.op not in BINARY_OPS:
+                raise Exception(f"Unknown binary op: {node.op}")
+            level = CHAIN_LEVELS.get(node.op)
+            chain = []
+            while isinstance(node, BinOpNode) and level is not None and CHAIN_LEVELS.get(node.op) == level:
+                chain.append(node)
+                node = node.left
+            if not chain:
+                return f"({self.expr(node.left)} {node.op} {self.expr(node.right)})"
+            parts = [self.expr(node)]
+            for link in reversed(chain):
+                parts.append(f"{link.op} {self.expr(link.right)}")
+            return f"({' '.join(parts)})"
+
+        if isinstance(node, UnaryOpNode):
+            if node.op == '-':
+                return f"(-{self.expr(node.expr)})"
+            if node.op == 'not':
+                return f"(not {self.expr(node.expr)})"
+            raise Exception(f"Unknown unary op: {node.op}")
+
+        if isinstance(node, ListNode):
+            return "[" + ", ".join(self.expr(e) for e in node.elements) + "]"
+
+        if isinstance(node, DictNode):
+            return "{" + ", ".join(f"{self.expr(k)}: {self.expr(v)}" for k, v in node.entries) + "}"
+
+        if isinstance(node, IndexNode):
+            return f"{self.expr(node.collection)}[{self.expr(node.index)}]"
+
+        if isinstance(node, CallNode):
+            self.called.add(node.name)
+            return f"{ident(node.name)}({', '.join(self.expr(a) for a in node.args)})"
+
+        raise Exception(f"Unhandled expr in transpiler: {node}")
+
+
+def transpile(prog) -> str:
+    """Python source for an Axon program."""
+    stmts = prog.statements if hasattr(prog, "statements") else prog
+    return Transpiler().module(stmts)
+
+
+def _clear():
+    os.system("cls" if os.name == "nt" else "clear")
+
+
+ARITY_RE = re.compile(
+    r"(\w+)\(\) (?:takes (\d+) positional arguments? but (\d+) (?:was|were) given"
+    r"|missing (\d+) required positional arguments?)"
+)
+UNBOUND_RE = re.compile(r"local variable '(\w+)'")
+
+
+class TranspiledEngine:
+    def __init__(self, max_depth: int = MAX_CALL_DEPTH):
+        self.max_depth = max_depth
+        self.globals: Dict[str, object] = {
+            "__builtins__": {},     # Axon code sees no Python builtins
+            **BUILTINS,
+            "print": self._host_print,
+            PREFIX + "range": loop_range,
+            PREFIX + "iter": loop_iter,
+            PREFIX + "check": check_type,
+            PREFIX + "clear": _clear,
+        }
+
+    def run(self, prog, filename: str = "<axon>"):
+        stmts = prog.statements if hasattr(prog, "statements") else prog
+        t = Transpiler()
+        code = compile(t.module(stmts), filename, "exec")
+        try:
+            run_deep(lambda: exec(code, self.globals), self.max_depth, frames_per_call=1)
+        except (NameError, TypeError, RecursionError) as e:
+            raise self._vm_error(e, t) from None
+
+    @staticmethod
+    def _vm_error(e: Exception, t: Transpiler) -> Exception:
+        """The error the VM raises for the same mistake, or `e` itself."""
+        if isinstance(e, UnboundLocalError):
+            mo = UNBOUND_RE.search(str(e))
+            if mo:
+                return RuntimeError(f"NameError: local variable '{axon_name(mo.group(1))}' referenced before assignment")
+        elif isinstance(e, NameError) and e.name is not None:
+            name = axon_name(e.name)
+            if name in t.called and name not in t.read:
+                return RuntimeError(f"NameError: function '{name}' is not defined")
+            return RuntimeError(f"NameError: name '{name}' is not defined")
+        elif isinstance(e, RecursionError):
+            # the innermost Axon function on the traceback made the call too many
+            name = None
+            tb = e.__traceback__
+            while tb is not None:
+                fn = axon_name(tb.tb_frame.f_code.co_name)
+                if fn in t.arity:
+                    name = fn
+                tb = tb.tb_next
+            if name is not None:
+                return RuntimeError(f"RecursionError: maximum call depth exceeded in {name}()")
+        elif isinstance(e, TypeError):
+            mo = ARITY_RE.match(str(e))
+            if mo:
+                name, takes, given, missing = mo.groups()
+                name = axon_name(name)
+                if missing is not None and name in t.arity:
+                    takes = t.arity[name]
+                    given = takes - int(missing)
+                if takes is not None:
+                    return RuntimeError(f"TypeError: {name}() takes {takes} arguments but {given} were given")
+        return e
+
+    @staticmethod
+    def _host_print(v):
+        print(v)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m axon.transpiler", description="Print the Python an Axon script transpiles to.")
+    ap.add_argument("file", help="path to a .ax file")
+    args = ap.parse_args(argv)
+    with open(args.file, "rb") as f:
+        sys.stdout.write(transpile(parse_stream(f)))
+
+
+if __name__ == "__main__":
+    main()
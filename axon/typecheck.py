@@ -0,0 +1,356 @@
+# axon/typecheck.py
+"""
+Static types of Axon programs. Axon is dynamically typed; this pass proves
+what it can before a script runs, using the scopes and use-def information
+of axon/sema.py.
+
+Bindings may be annotated with one of ANNOTATION_TYPES (nodes.py):
+
+    let total: int = 0;
+    fn scale(xs: list, by: float) { ... }
+
+The value bound must have exactly that type (an int is no float, a bool no
+int). Every binding of a variable contributes to its type, and a variable
+has a type only while all of them agree:
+
+* literals, list and dict displays, and the operators on them, which
+  follow Python's rules (`1 + 2.5` is a float, `"ab" * 2` a str, a compare
+  a bool); items of a list or dict have no type;
+* a `for i = ...` counter is an int, a `for c in s` over a string a str;
+* an annotated binding has its annotation;
+* a call of a user `fn` has the type every `return` of it agrees on (when
+  its body ends in a `return`); `len` is an int and `type` a str, as long
+  as the program does not define them itself.
+
+A global only has its type where one of its bindings has certainly run
+(`sema.runs_after`, or in the body of the loop it is the variable of):
+before that, the value is whatever the host put there.
+Host functions are trusted not to rebind the program's globals.
+
+`check(prog)` raises `StaticTypeError` for what would certainly fail at
+run time if it ran: an operator on operands of types it does not accept,
+indexing a value that cannot be indexed, a `for` over a non-iterable or
+with non-int bounds, and an annotated binding or argument of a proven type
+other than the annotation. Code that never runs is checked all the same.
+
+The `TypeInfo` it returns tells the compiler which checks it may leave
+out: annotated `let`s whose value is proven to have the declared type need
+no CHECK_TYPE, and locals that are bound wherever they are read need no
+"referenced before assignment" check in tier 2.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+from axon.astopt import all_stmts, stmt_exprs, walk
+from axon.nodes import *  # noqa: F403, F401
+from axon.sema import Analysis, SemanticError, Site, Symbol, analyze, runs_after
+
+
+class StaticTypeError(SemanticError):
+    pass
+
+
+# the lattice of a type: NEVER (no value reaches it yet) < a type name < None (not known)
+NEVER = "never"
+
+# what a read of a global before the program binds it sees: a value of the host
+HOST = object()
+
+NUMBERS = frozenset({"int", "float", "bool"})
+INTEGERS = frozenset({"int", "bool"})
+SEQUENCES = frozenset({"str", "list"})
+ITERABLES = frozenset({"str", "list", "dict"})
+# the types of what the builtins the checker knows return (nodes.BUILTINS)
+BUILTIN_RESULTS = {"len": "int", "type": "str"}
+
+
+def join(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a == NEVER:
+        return b
+    if b == NEVER:
+        return a
+    return a if a == b else None
+
+
+@dataclass(eq=False)
+class TypeInfo:
+    types: Dict[Any, str] = field(default_factory=dict)     # expression node -> its type, where known
+    proven: Set[LetNode] = field(default_factory=set)        # annotated `let`s that need no run-time check
+    bound: Dict[FunctionNode, Set[str]] = field(default_factory=dict)  # fn -> locals bound at every read
+
+    def type_of(self, node) -> Optional[str]:
+        return self.types.get(node)
+
+
+class _Checker:
+    def __init__(self, stmts, a: Analysis, strict: bool = True):
+        self.a = a
+        self.strict = strict    # raise StaticTypeError in the reporting pass
+        # reads of a global loop variable in the body of its loop, which has bound it
+        self.in_loop: Set[VariableNode] = set()
+        for stmt in all_stmts(stmts):
+            if isinstance(stmt, (ForNode, ForInNode)):
+                for inner in all_stmts(stmt.body, into_functions=False):
+                    for e in stmt_exprs(inner):
+                        self.in_loop.update(n for n in walk(e)
+                                            if isinstance(n, VariableNode) and n.name == stmt.var_name)
+        self.symbols: Dict[Symbol, Optional[str]] = {}
+        self.returns: Dict[FunctionNode, Optional[str]] = {}
+        # name -> the `fn` a call of it runs, when the name is bound only by that `fn`
+        self.functions: Dict[str, FunctionNode] = {}
+        for fn in a.functions:
+            defs = a.module.symbols[fn.name].defs
+            if len(defs) == 1:
+                self.functions[fn.name] = fn
+        self.reads: Dict[VariableNode, Any] = {}   # VariableNode -> its symbol, or HOST (see read_symbol)
+        self.info: Optional[TypeInfo] = None     # filled in by the last, reporting pass
+        self.where = "<module>"                  # the body being reported on, for messages
+
+    # ---------------- INFERENCE ----------------
+    def infer(self):
+        """Symbol and return types, raised from NEVER until nothing changes."""
+        scopes = [self.a.module, *self.a.functions.values()]
+        changed = True
+        while changed:
+            changed = False
+            for scope in scopes:
+                for symbol in scope.symbols.values():
+                    t = NEVER
+                    for d in symbol.defs:
+                        t = join(t, self.binding_type(symbol, d))
+                    if self.symbols.get(symbol, NEVER) != t:
+                        self.symbols[symbol] = t
+                        changed = True
+            for fn in self.a.functions:
+                t = self.return_type(fn)
+                if self.returns.get(fn, NEVER) != t:
+                    self.returns[fn] = t
+                    changed = True
+
+    def binding_type(self, symbol: Symbol, d: Site) -> Optional[str]:
+        node = d.node
+        if isinstance(node, LetNode):
+            return node.type_name or self.expr(node.expr)
+        if isinstance(node, ForNode):
+            return "int"
+        if isinstance(node, ForInNode):
+            return "str" if self.expr(node.iter_expr) == "str" else None
+        if isinstance(node, FunctionNode) and d.scope.function is node:
+            # a param: whatever the caller passes, unless it is annotated
+            if node.param_types is None:
+                return None
+            return node.param_types[node.params.index(symbol.name)]
+        return None  # a `fn` definition
+
+    def return_type(self, fn: FunctionNode) -> Optional[str]:
+        body = fn.body
+        if not body or not isinstance(body[-1], ReturnNode):
+            return None  # may fall off the end, returning None
+        t = NEVER
+        for stmt in returns(body):
+            t = join(t, None if stmt.expr is None else self.expr(stmt.expr))
+        return t
+
+    # ---------------- EXPRESSIONS ----------------
+    def error(self, message: str):
+        """Raise in the reporting pass; while inferring, the type is just not known."""
+        if self.info is None or not self.strict:
+            return None
+        raise StaticTypeError(f"TypeError: {message} (in {self.where})")
+
+    def expr(self, node) -> Optional[str]:
+        t = self.expr_type(node)
+        if self.info is not None:
+            if t == NEVER:
+                t = None
+            if t is not None:
+                self.info.types[node] = t
+        return t
+
+    def expr_type(self, node) -> Optional[str]:
+        # the most frequent nodes first: every round of `infer` types every expression
+        if isinstance(node, VariableNode):
+            return self.read(node)
+        if isinstance(node, BinOpNode):
+            return self.binary(node, self.expr(node.left), self.expr(node.right))
+        if isinstance(node, NumberNode):
+            return type(node.value).__name__
+        if isinstance(node, StringNode):
+            return "str"
+        if isinstance(node, BooleanNode):
+            return "bool"
+        if isinstance(node, ListNode):
+            for e in node.elements:
+                self.expr(e)
+            return "list"
+        if isinstance(node, DictNode):
+            for k, v in node.entries:
+                key = self.expr(k)
+                self.expr(v)
+                if key in ("list", "dict"):
+                    self.error(f"unhashable type: '{key}'")
+            return "dict"
+        if isinstance(node, UnaryOpNode):
+            operand = self.expr(node.expr)
+            if node.op == "not":
+                return "bool"
+            if operand in NUMBERS:
+                return "float" if operand == "float" else "int"
+            if operand in (None, NEVER):
+                return operand
+            return self.error(f"bad operand type for unary {node.op}: '{operand}'")
+        if isinstance(node, IndexNode):
+            return self.index(node, self.expr(node.collection), self.expr(node.index))
+        if isinstance(node, CallNode):
+            return self.call(node, [self.expr(a) for a in node.args])
+        return None
+
+    def read(self, node: VariableNode) -> Optional[str]:
+        symbol = self.reads.get(node)
+        if symbol is None:
+            symbol = self.reads[node] = self.read_symbol(node)
+        return None if symbol is HOST else self.symbols.get(symbol, NEVER)
+
+    def read_symbol(self, node: VariableNode):
+        """The symbol `node` reads, or HOST when it may read a value the host bound."""
+        symbol, site = self.a.symbols[node], self.a.sites[node]
+        if (symbol.scope is self.a.module and node not in self.in_loop
+                and not any(runs_after(site, d) for d in symbol.defs)):
+            return HOST
+        return symbol
+
+    def binary(self, node: BinOpNode, left: Optional[str], right: Optional[str]) -> Optional[str]:
+        op = node.op
+        if op in ("and", "or"):
+            return join(left, right)
+        if op in ("==", "!="):
+            return "bool"
+        known = left not in (None, NEVER) and right not in (None, NEVER)
+        if op in ("<", "<=", ">", ">="):
+            if known and not (left in NUMBERS and right in NUMBERS or left == right and left in SEQUENCES):
+                self.error(f"'{op}' not supported between instances of '{left}' and '{right}'")
+            return "bool"
+        if not known:
+            return NEVER if NEVER in (left, right) else None
+        if left in NUMBERS and right in NUMBERS:
+            if op == "/" or "float" in (left, right):
+                return "float"
+            return "int"
+        if op == "+" and left == right and left in SEQUENCES:
+            return left
+        if op == "*" and left in SEQUENCES and right in INTEGERS:
+            return left
+        if op == "*" and right in SEQUENCES and left in INTEGERS:
+            return right
+        if op == "%" and left == "str":
+            return "str"  # formatting: whether the operand fits is only known at run time
+        return self.error(f"unsupported operand type(s) for {op}: '{left}' and '{right}'")
+
+    def index(self, node: IndexNode, coll: Optional[str], index: Optional[str]) -> Optional[str]:
+        if coll in (None, NEVER):
+            return coll
+        if coll in SEQUENCES:
+            if index not in (None, NEVER) and index not in INTEGERS:
+                self.error(f"{'string' if coll == 'str' else 'list'} indices must be integers, not '{index}'")
+            return "str" if coll == "str" else None
+        if coll == "dict":
+            if index in ("list", "dict"):
+                self.error(f"unhashable type: '{index}'")
+            return None
+        return self.error(f"'{coll}' object is not subscriptable")
+
+    def call(self, node: CallNode, args) -> Optional[str]:
+        name = node.name
+        fn = self.functions.get(name)
+        if fn is not None:
+            if fn.param_types is not None and len(args) == len(fn.params):
+                for param, t, arg in zip(fn.params, fn.param_types, args):
+                    if t is not None and arg not in (None, NEVER) and arg != t:
+                        self.error(f"{name}() argument {param} must be {t}, got {arg}")
+            return self.returns.get(fn, NEVER)
+        symbol = self.a.module.symbols.get(name)
+        if name in BUILTIN_RESULTS and (symbol is None or not symbol.defs):
+            if name == "len" and len(args) == 1 and args[0] in NUMBERS:
+                self.error(f"object of type '{args[0]}' has no len()")
+            return BUILTIN_RESULTS[name]
+        return None
+
+    # ---------------- STATEMENTS ----------------
+    def report(self, stmts):
+        """The last pass: every expression typed once more, and `info` filled in."""
+        self.info = TypeInfo()
+        for stmt in stmts:
+            self.stmt(stmt)
+        for fn, scope in self.a.functions.items():
+            self.info.bound[fn] = {
+                name for name, symbol in scope.symbols.items()
+                if all(any(runs_after(use, d) for d in symbol.defs) for use in symbol.uses)
+            }
+        return self.info
+
+    def block(self, stmts):
+        for stmt in stmts:
+            self.stmt(stmt)
+
+    def stmt(self, stmt):
+        if isinstance(stmt, LetNode):
+            value = self.expr(stmt.expr)
+            if stmt.type_name is not None and value is not None:
+                if value != stmt.type_name:
+                    self.error(f"{stmt.name} must be {stmt.type_name}, got {value}")
+                else:
+                    self.info.proven.add(stmt)
+        elif isinstance(stmt, (PrintNode, ReturnNode)):
+            if stmt.expr is not None:
+                self.expr(stmt.expr)
+        elif isinstance(stmt, IfNode):
+            for cond, body in stmt.branches:
+                self.expr(cond)
+                self.block(body)
+            self.block(stmt.else_body)
+        elif isinstance(stmt, WhileNode):
+            self.expr(stmt.condition)
+            self.block(stmt.body)
+        elif isinstance(stmt, ForNode):
+            bounds = [stmt.start_expr, stmt.end_expr] + ([] if stmt.step_expr is None else [stmt.step_expr])
+            for e in bounds:
+                t = self.expr(e)
+                if t is not None and t not in INTEGERS:
+                    self.error(f"for loop bounds must be integers, got {t}")
+            self.block(stmt.body)
+        elif isinstance(stmt, ForInNode):
+            t = self.expr(stmt.iter_expr)
+            if t is not None and t not in ITERABLES:
+                self.error(f"cannot iterate over {t}")
+            self.block(stmt.body)
+        elif isinstance(stmt, FunctionNode):
+            outer, self.where = self.where, f"fn {stmt.name}"
+            self.block(stmt.body)
+            self.where = outer
+        elif isinstance(stmt, CallNode):
+            self.expr(stmt)
+
+
+def returns(stmts):
+    """The `return` statements of a body, not descending into nested functions."""
+    for stmt in stmts:
+        if isinstance(stmt, ReturnNode):
+            yield stmt
+        elif isinstance(stmt, IfNode):
+            for _, body in stmt.branches:
+                yield from returns(body)
+            yield from returns(stmt.else_body)
+        elif isinstance(stmt, (WhileNode, ForNode, ForInNode)):
+            yield from returns(stmt.body)
+
+
+def check(prog, report: bool = True) -> TypeInfo:
+    """
+    Types of a program (a statement list, or anything with `.statements`).
+    Raises SemanticError from `sema.analyze`, and StaticTypeError for a
+    certain type error unless `report` is False.
+    """
+    stmts = prog.statements if hasattr(prog, "statements") else prog
+    checker = _Checker(stmts, analyze(stmts), report)
+    checker.infer()
+    return checker.report(stmts)
@@ -0,0 +1,174 @@
+# axon/verifier.py
+"""
+Bytecode verifier. `verify(co)` checks a CodeObject before the VM runs it
+and returns the number of operand stack slots the code can ever need, so
+every frame gets a fixed-size stack instead of a list that grows.
+
+A code object is rejected (`VerifyError`) when:
+
+* an opcode is unknown, or an argument indexes past the constant, name or
+  local tables;
+* a jump lands outside the code (the end itself is a valid target);
+* an instruction pops more values than the stack holds;
+* two paths reach the same instruction with different stack depths;
+* the code can run off its end with values still on the stack.
+
+Only instructions reachable from the start are checked for depth, so dead
+code left behind by the optimizer does not have to balance.
+"""
+from typing import Dict, List, Tuple
+
+from axon.compiler import CodeObject, CALL_ARGC_BITS, CALL_ARGC_MASK, iter_instructions
+from axon.opcodes import *  # noqa: F403, F401
+
+
+class VerifyError(Exception):
+    pass
+
+
+# opcode -> (values popped, values pushed) for opcodes whose effect does not depend on the arg
+FIXED_EFFECTS: Dict[int, Tuple[int, int]] = {
+    CONST: (0, 1), LOAD_NAME: (0, 1), LOAD_FAST: (0, 1),
+    STORE_NAME: (1, 0), STORE_FAST: (1, 0),
+    INC_NAME: (0, 0), INC_FAST: (0, 0),
+    LOAD_NAME_PAIR: (0, 2), LOAD_FAST_PAIR: (0, 2), LOAD_NAME_CONST: (0, 2), LOAD_FAST_CONST: (0, 2),
+    UNARY_NEG: (1, 1), UNARY_NOT: (1, 1),
+    BUILD_LIST_CONST: (0, 1), BUILD_DICT_CONST: (0, 1),
+    PRINT: (1, 0), CLEAR: (0, 0), POP_TOP: (1, 0),
+    JUMP: (0, 0), JUMP_IF_FALSE: (1, 0), JUMP_IF_TRUE: (1, 0),
+    JUMP_IF_FALSE_OR_POP: (1, 0), JUMP_IF_TRUE_OR_POP: (1, 0),
+    FOR_RANGE: (3, 1), GET_ITER: (1, 1), FOR_ITER: (1, 2),
+    MAKE_FUNCTION: (0, 0), RETURN: (1, 0),
+    CHECK_TYPE: (1, 1),
+}
+# binary operators, compares and subscripts, generic and specialized: two operands, one result
+for _name, _op in OPMAP.items():
+    if _name.startswith(("BINARY_", "COMPARE_")) and not _name.endswith(("_JUMP", "_JUMP_INT")):
+        FIXED_EFFECTS[_op] = (2, 1)
+    elif _name.startswith("COMPARE_"):
+        FIXED_EFFECTS[_op] = (2, 0)
+del _name, _op
+
+# jumps whose taken branch leaves another stack than falling through (the effect
+# above): the short-circuit jumps keep the value they test, FOR_ITER drops its iterator
+JUMP_EFFECTS: Dict[int, Tuple[int, int]] = {
+    JUMP_IF_FALSE_OR_POP: (0, 0), JUMP_IF_TRUE_OR_POP: (0, 0),
+    FOR_ITER: (1, 0),
+}
+
+
+def stack_effect(op: int, arg: int) -> Tuple[int, int]:
+    """(values popped, values pushed) by one instruction."""
+    effect = FIXED_EFFECTS.get(op)
+    if effect is not None:
+        return effect
+    if op in (CALL_FUNCTION, TAIL_CALL):
+        return arg & CALL_ARGC_MASK, 1
+    if op == BUILD_LIST:
+        return arg, 1
+    if op == BUILD_DICT:
+        return 2 * arg, 1
+    raise VerifyError(f"unknown opcode {op}")
+
+
+def check_args(co: CodeObject, i: int, op: int, arg: int):
+    """The tables an instruction indexes into are long enough."""
+    consts, names, nlocals = len(co.consts), len(co.names), co.nlocals
+    checks: List[Tuple[int, int, str]] = []
+    if op in (CONST, BUILD_LIST_CONST, BUILD_DICT_CONST, MAKE_FUNCTION):
+        checks.append((arg, consts, "constant"))
+    elif op in (LOAD_NAME, STORE_NAME, INC_NAME):
+        checks.append((arg, names, "name"))
+    elif op in (LOAD_FAST, STORE_FAST, INC_FAST):
+        checks.append((arg, nlocals, "local"))
+    elif op == LOAD_NAME_PAIR:
+        checks += [(arg >> PAIR_BITS, names, "name"), (arg & PAIR_MASK, names, "name")]
+    elif op == LOAD_FAST_PAIR:
+        checks += [(arg >> PAIR_BITS, nlocals, "local"), (arg & PAIR_MASK, nlocals, "local")]
+    elif op == LOAD_NAME_CONST:
+        checks += [(arg >> PAIR_BITS, names, "name"), (arg & PAIR_MASK, consts, "constant")]
+    elif op == LOAD_FAST_CONST:
+        checks += [(arg >> PAIR_BITS, nlocals, "local"), (arg & PAIR_MASK, consts, "constant")]
+    elif op in (CALL_FUNCTION, TAIL_CALL):
+        checks.append((arg >> CALL_ARGC_BITS, names, "name"))
+    elif op == CHECK_TYPE:
+        checks += [(arg >> TYPE_BITS, names, "name"), (arg & TYPE_MASK, len(TYPE_NAMES), "type")]
+    elif op in (BUILD_LIST, BUILD_DICT) and arg < 0:
+        raise VerifyError(f"{co.name}: instruction {i} ({OPNAMES[op]}) has a negative count")
+    for index, size, kind in checks:
+        if not 0 <= index < size:
+            raise VerifyError(f"{co.name}: instruction {i} ({OPNAMES[op]}) uses {kind} {index}, "
+                              f"but there are only {size}")
+    if op == MAKE_FUNCTION and not isinstance(co.consts[arg], CodeObject):
+        raise VerifyError(f"{co.name}: instruction {i} (MAKE_FUNCTION) does not name a code object")
+
+
+def verify(co: CodeObject) -> int:
+    """Check `co`, store its maximum stack depth in `co.stacksize` and return it."""
+    # every value pushed is still there when the next instruction starts
+    co.stacksize = max(stack_depths(co))
+    return co.stacksize
+
+
+def stack_depths(co: CodeObject) -> List[int]:
+    """
+    Check `co`. Returns the stack depth before each instruction (-1 where
+    unreachable), plus one entry for running off the end.
+    """
+    instrs = list(iter_instructions(co.code))
+    n = len(instrs)
+    for i, (op, arg) in enumerate(instrs):
+        if not 0 <= op < len(OPNAMES):
+            raise VerifyError(f"{co.name}: instruction {i} has unknown opcode {op}")
+        check_args(co, i, op, arg)
+
+    depths: List[int] = [-1] * (n + 1)  # stack depth on entry; index n is "ran off the end"
+    depths[0] = 0
+    todo = [0]
+    while todo:
+        i = todo.pop()
+        depth = depths[i]
+        if i == n:
+            if depth:
+                raise VerifyError(f"{co.name}: code ends with {depth} values left on the stack")
+            continue
+        op, arg = instrs[i]
+        try:
+            pops, pushes = stack_effect(op, arg)
+        except VerifyError as e:
+            raise VerifyError(f"{co.name}: instruction {i}: {e}") from None
+        if pops > depth:
+            raise VerifyError(f"{co.name}: instruction {i} ({OPNAMES[op]}) pops {pops} values "
+                              f"from a stack of {depth}")
+        after = depth - pops + pushes
+        successors = []
+        if op in HAS_JUMP:
+            target = i + arg
+            if not 0 <= target <= n:
+                raise VerifyError(f"{co.name}: instruction {i} ({OPNAMES[op]}) jumps to {target}, "
+                                  f"outside 0..{n}")
+            taken = JUMP_EFFECTS.get(op)
+            successors.append((target, after if taken is None else depth - taken[0] + taken[1]))
+        if op != JUMP and op != RETURN:
+            successors.append((i + 1, after))
+        for j, after in successors:
+            if depths[j] == -1:
+                depths[j] = after
+                todo.append(j)
+            elif depths[j] != after:
+                raise VerifyError(f"{co.name}: instruction {j} is reached with stack depths "
+                                  f"{depths[j]} and {after}")
+    return depths
+
+
+def verify_all(co: CodeObject) -> int:
+    """Verify a module and every function nested in it; returns how many code objects were checked."""
+    todo, seen = [co], set()
+    while todo:
+        c = todo.pop()
+        if id(c) in seen:
+            continue
+        seen.add(id(c))
+        verify(c)
+        todo.extend(k for k in c.consts if isinstance(k, CodeObject))
+    return len(seen)
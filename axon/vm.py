@@ -1,215 +1,1326 @@
-from dataclasses import dataclass
 from typing import List, Any, Dict, Tuple
-from axon.compiler import CodeObject
-import builtins, os
+from array import array
+from axon.compiler import CodeObject, CALL_ARGC_BITS, CALL_ARGC_MASK
+from axon.nodes import BUILTINS, check_type, loop_iter, loop_range
+from axon.opcodes import *  # noqa: F403, F401
+from axon.tiers import TIER_THRESHOLD, NATIVE_DEPTH_LIMIT, Unsupported, compile_tier2
+from axon.verifier import verify
+import builtins, itertools, os
 
-@dataclass
 class Frame:
-    code: List[Tuple]
-    ip: int
-    stack: List[Any]
-    consts: List[Any]
-    name: str
-    return_value: Any = None
-    loop_stack: List[int] = None
+    """
+    One activation. `code`, `consts` and `names` are the CodeObject's own
+    (never copied); frames are recycled through the VM's frame pool.
+    `stack` is preallocated to the code's verified stack size and `sp` is
+    the index of its first free slot.
+    """
+    __slots__ = ("code", "ip", "stack", "sp", "consts", "names", "name",
+                 "return_value", "locals", "varnames", "cache", "co")
+
+    def __init__(self, code: array, ip: int, stack: List[Any], consts: List[Any], names: List[str],
+                 name: str, return_value: Any = None,
+                 locals: List[Any] = None, varnames: Tuple[str, ...] = (), cache: List[Any] = None,
+                 co: CodeObject = None):
+        self.co = co    # the CodeObject being run, for tiering counters
+        self.code = code
+        self.ip = ip
+        self.stack = stack
+        self.sp = 0
+        self.consts = consts
+        self.names = names
+        self.name = name
+        self.return_value = return_value
+        self.locals = locals
+        self.varnames = varnames
+        self.cache = cache
+
+    def __repr__(self):
+        return f"<Frame {self.name} ip={self.ip}>"
+
+
+class _Unbound:
+    """Placeholder held by a local slot until its first assignment."""
+    def __repr__(self):
+        return "<unbound>"
+
+UNBOUND = _Unbound()
+
+# returned by `next` for an exhausted for-loop iterator
+EXHAUSTED = object()
+
+
+class Function:
+    """A user function, built once by MAKE_FUNCTION and shared by every call."""
+    __slots__ = ("code", "name", "params", "nparams", "padding")
+
+    def __init__(self, code: CodeObject):
+        self.code = code
+        self.name = code.name
+        self.params = code.params
+        self.nparams = len(code.params)
+        # UNBOUND for every local slot after the params
+        self.padding = (UNBOUND,) * (code.nlocals - self.nparams)
+
+    def __repr__(self):
+        return f"<fn {self.name}>"
+
+# frames kept for reuse once popped
+FRAME_POOL_SIZE = 64
+
+# live calls (VM frames plus nested tier-2 calls) before a run fails with
+# RecursionError; tail calls reuse their frame and do not count
+MAX_FRAME_DEPTH = 100_000
+
+# versions are unique across every Globals instance, so a cache entry filled
+# under one VM can never validate against another VM's namespace
+_versions = itertools.count(1)
+
+
+class Globals(dict):
+    """
+    The VM's global namespace. Inline caches hold the `cell` of each name
+    they read, a one-item list that stores to the name keep up to date, so
+    rebinding a global (a loop counter, say) invalidates nothing. Removing
+    names, or any bulk mutation, stamps a fresh `version` and drops the
+    cells; a cache entry is valid only under the version it was filled in.
+    """
+    __slots__ = ("version", "cells")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = next(_versions)
+        self.cells: Dict[str, List[Any]] = {}
+
+    def cell(self, key) -> List[Any]:
+        """The cell of a bound name (KeyError if it is unbound)."""
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = [self[key]]
+        return cell
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        cell = self.cells.get(key)
+        if cell is not None:
+            cell[0] = value
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version = next(_versions)
+        self.cells = {}
+
+    def _mutator(name):
+        method = getattr(dict, name)
+
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self.version = next(_versions)
+            self.cells = {}
+            return result
+        wrapper.__name__ = name
+        return wrapper
+
+    pop = _mutator("pop")
+    popitem = _mutator("popitem")
+    clear = _mutator("clear")
+    update = _mutator("update")
+    setdefault = _mutator("setdefault")
+    __ior__ = _mutator("__ior__")
+    del _mutator
+
+DISPATCH_ENGINES = ("table", "switch")
+
+# quickening: generic opcode -> {(type(a), type(b)): specialized opcode}.
+# `object` in the second position matches any right operand.
+SPECIALIZATIONS = {
+    BINARY_ADD: {(int, int): BINARY_ADD_INT, (float, float): BINARY_ADD_FLOAT, (str, str): BINARY_ADD_STR},
+    BINARY_SUB: {(int, int): BINARY_SUB_INT, (float, float): BINARY_SUB_FLOAT},
+    BINARY_MUL: {(int, int): BINARY_MUL_INT, (float, float): BINARY_MUL_FLOAT},
+    BINARY_MOD: {(int, int): BINARY_MOD_INT},
+    COMPARE_EQ: {(int, int): COMPARE_EQ_INT},
+    COMPARE_NE: {(int, int): COMPARE_NE_INT},
+    COMPARE_LT: {(int, int): COMPARE_LT_INT},
+    COMPARE_LE: {(int, int): COMPARE_LE_INT},
+    COMPARE_GT: {(int, int): COMPARE_GT_INT},
+    COMPARE_GE: {(int, int): COMPARE_GE_INT},
+    COMPARE_LT_JUMP: {(int, int): COMPARE_LT_JUMP_INT},
+    COMPARE_LE_JUMP: {(int, int): COMPARE_LE_JUMP_INT},
+    COMPARE_GT_JUMP: {(int, int): COMPARE_GT_JUMP_INT},
+    COMPARE_GE_JUMP: {(int, int): COMPARE_GE_JUMP_INT},
+    BINARY_SUBSCR: {(list, int): BINARY_SUBSCR_LIST_INT, (dict, object): BINARY_SUBSCR_DICT},
+}
+
+# specialized opcode -> the generic one it deoptimizes to
+DEOPT = {spec: generic for generic, specs in SPECIALIZATIONS.items() for spec in specs.values()}
+
+# executions of a generic instruction before it may specialize again after a
+# failed attempt or a deopt (the count lives in the instruction's cache slot)
+ADAPTIVE_BACKOFF = 64
+
 
 class VM:
-    def __init__(self):
+    def __init__(self, dispatch: str = "table", quicken: bool = False, tier: bool = True,
+                 tier_threshold: int = TIER_THRESHOLD, max_depth: int = MAX_FRAME_DEPTH):
+        if dispatch not in DISPATCH_ENGINES:
+            raise ValueError(f"Unknown dispatch engine {dispatch!r}")
+        self.dispatch = dispatch
+        # only the table engine quickens; the switch engine stays the generic baseline.
+        # Off by default: in this VM the type guards cost more than Python's own
+        # dynamic dispatch of `+`/`<` (see benchmarks/bench_dispatch.py).
+        self.quicken = quicken and dispatch == "table"
+        # hot code objects move to tier 2 (axon/tiers.py); table engine only, like quickening
+        self.tier = tier and dispatch == "table"
+        self.tier_threshold = tier_threshold
+        self.max_depth = max_depth
         self.frames: List[Frame] = []
-        self.globals: Dict[str, Any] = {
-            "print": self._host_print
-        }
+        # frames below this depth belong to an outer run loop (see run_function)
+        self.base_depth = 0
+        self.frame_pool: List[Frame] = []
+        # the tree engine's builtins (nodes.BUILTINS), so -OO may rely on PURE_BUILTINS
+        self.globals: Globals = Globals(BUILTINS, print=self._host_print)
+        # inline cache counters for LOAD_NAME / CALL_FUNCTION
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # quickening counters
+        self.specializations = 0
+        self.deopts = 0
+        # tiering: calls so far per id() of the code object, and backedges per
+        # (id(), loop header), so many short loops never add up to a hot one;
+        # per id(): (code object, tier-2 function or None when it could not be translated)
+        self.hotness: Dict[Any, int] = {}
+        self.tier2: Dict[int, Tuple[CodeObject, Any]] = {}
+        self.native_depth = 0
+        self.native_limit = min(NATIVE_DEPTH_LIMIT, max_depth)
+        self.promotions = 0
+        self.osr_entries = 0
+        self.tier_failures = 0
+        self.handlers = [
+            getattr(self, "op_" + name, None) or self._unknown_op(name)
+            for name in OPNAMES
+        ]
+        if self.quicken:
+            for op in SPECIALIZATIONS:
+                self.handlers[op] = self._adaptive(self.handlers[op])
+        if self.tier:
+            self.handlers[CALL_FUNCTION] = self._tiered_call(self.handlers[CALL_FUNCTION])
+            self.handlers[TAIL_CALL] = self._tiered_call(self.handlers[TAIL_CALL])
+            self.handlers[JUMP] = self.op_JUMP_COUNTING
 
     # ---------------- FRAME MGMT ----------------
-    def push_frame(self, co: CodeObject):
-        f = Frame(
-            code=co.code.copy(),
-            ip=0,
-            stack=[],
-            consts=co.consts.copy(),
-            name=co.name,
-            loop_stack=[]
-        )
+    def push_frame(self, co: CodeObject, args=(), padding=None):
+        if len(self.frames) + self.native_depth >= self.max_depth:
+            raise RuntimeError(f"RecursionError: maximum call depth exceeded in {co.name}()")
+        if padding is None:
+            padding = (UNBOUND,) * (co.nlocals - len(args))
+        cache = co.inline_cache
+        if cache is None:
+            cache = co.inline_cache = [None] * (len(co.code) >> 1)
+        size = co.stacksize
+        if size is None:
+            size = verify(co)
+        code = co.code
+        if self.quicken:
+            # quickened frames run a private copy so `co.code` stays generic
+            code = co.adaptive
+            if code is None:
+                code = co.adaptive = array("i", co.code)
+        if self.frame_pool:
+            f = self.frame_pool.pop()
+            f.code = code
+            f.ip = 0
+            f.stack = [None] * size
+            f.sp = 0
+            f.consts = co.consts
+            f.names = co.names
+            f.name = co.name
+            f.return_value = None
+            f.varnames = co.varnames
+            f.cache = cache
+            f.co = co
+            f.locals.extend(args)
+        else:
+            f = Frame(
+                code=code,
+                ip=0,
+                stack=[None] * size,
+                consts=co.consts,
+                names=co.names,
+                name=co.name,
+                locals=list(args),
+                varnames=co.varnames,
+                cache=cache,
+                co=co,
+            )
+        if padding:
+            f.locals.extend(padding)
         self.frames.append(f)
+        return f
 
     def pop_frame(self):
         return self.frames.pop()
 
+    def release_frame(self, f: Frame):
+        """Return a finished frame to the pool; drops its references to values."""
+        if len(self.frame_pool) < FRAME_POOL_SIZE:
+            f.stack = None
+            f.locals.clear()
+            self.frame_pool.append(f)
+
     def current(self) -> Frame:
         return self.frames[-1]
 
     # ---------------- VM RUN LOOP ----------------
-    def run(self):
+    def run(self, profiler=None):
+        """
+        Run until the frames pushed so far finish; `profiler` (axon/profiler.py)
+        runs them instead. An error unwinds this run's frames, so the next
+        `push_frame` + `run` (a REPL line) starts on a clean frame stack.
+        """
+        try:
+            if profiler is not None:
+                return profiler.run(self)
+            if self.dispatch == "table":
+                return self.run_table()
+            return self.run_switch()
+        except BaseException:
+            del self.frames[self.base_depth:]
+            raise
+
+    def run_table(self):
+        """
+        Table-driven run loop: each opcode indexes straight into `handlers`.
+        A handler returns True when it pushed or popped a frame, which makes
+        the loop reload the current frame.
+        """
+        frames = self.frames
+        handlers = self.handlers
+        while len(frames) > self.base_depth:
+            f = frames[-1]
+            code = f.code
+            n = len(code)
+            while f.ip < n:
+                ip = f.ip
+                f.ip = ip + 2
+                if handlers[code[ip]](f, code[ip + 1]):
+                    break
+            else:
+                if frames and frames[-1] is f:
+                    self.release_frame(self.pop_frame())
+
+    def run_switch(self):
+        """Original run loop as an if/elif chain over opcodes; kept to A/B against `run_table`."""
         while self.frames:
             f = self.current()
 
             if f.ip >= len(f.code):
-                self.pop_frame()
+                self.release_frame(self.pop_frame())
                 continue
 
-            instr = f.code[f.ip]
-            f.ip += 1
-            op = instr[0]
+            op = f.code[f.ip]
+            arg = f.code[f.ip + 1]
+            f.ip += 2
+            stack = f.stack
+            sp = f.sp
 
             # ----- CONSTANTS -----
-            if op == "CONST":
-                f.stack.append(f.consts[instr[1]])
+            if op == CONST:
+                stack[sp] = f.consts[arg]
+                f.sp = sp + 1
 
             # ----- VARIABLES -----
-            elif op == "LOAD_NAME":
-                name = instr[1]
+            elif op == LOAD_NAME:
+                name = f.names[arg]
                 if name in self.globals:
-                    f.stack.append(self.globals[name])
+                    stack[sp] = self.globals[name]
+                    f.sp = sp + 1
                 else:
                     raise RuntimeError(f"NameError: name '{name}' is not defined")
 
-            elif op == "STORE_NAME":
-                name = instr[1]
-                self.globals[name] = f.stack.pop()
+            elif op == STORE_NAME:
+                name = f.names[arg]
+                f.sp = sp - 1
+                self.globals[name] = stack[sp - 1]
+
+            elif op == LOAD_FAST:
+                self.op_LOAD_FAST(f, arg)
+
+            elif op == STORE_FAST:
+                f.sp = sp - 1
+                f.locals[arg] = stack[sp - 1]
 
             # ----- BINARY OPS -----
-            elif op == "BINARY_ADD":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a + b)
+            elif op == BINARY_ADD:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] + stack[sp - 1]
 
-            elif op == "BINARY_SUB":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a - b)
+            elif op == BINARY_SUB:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] - stack[sp - 1]
 
-            elif op == "BINARY_MUL":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a * b)
+            elif op == BINARY_MUL:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] * stack[sp - 1]
 
-            elif op == "BINARY_DIV":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a / b)
+            elif op == BINARY_DIV:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] / stack[sp - 1]
 
-            elif op == "BINARY_MOD":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a % b)
+            elif op == BINARY_MOD:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] % stack[sp - 1]
 
             # ----- COMPARES -----
-            elif op == "COMPARE_EQ":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a == b)
+            elif op == COMPARE_EQ:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] == stack[sp - 1]
 
-            elif op == "COMPARE_NE":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a != b)
+            elif op == COMPARE_NE:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] != stack[sp - 1]
 
-            elif op == "COMPARE_LT":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a < b)
+            elif op == COMPARE_LT:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] < stack[sp - 1]
 
-            elif op == "COMPARE_LE":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a <= b)
+            elif op == COMPARE_LE:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] <= stack[sp - 1]
 
-            elif op == "COMPARE_GT":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a > b)
+            elif op == COMPARE_GT:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] > stack[sp - 1]
 
-            elif op == "COMPARE_GE":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a >= b)
+            elif op == COMPARE_GE:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] >= stack[sp - 1]
 
             # ----- LOGICAL OPS -----
-            elif op == "BINARY_AND":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a and b)
+            elif op == BINARY_AND:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] and stack[sp - 1]
 
-            elif op == "BINARY_OR":
-                b, a = f.stack.pop(), f.stack.pop()
-                f.stack.append(a or b)
+            elif op == BINARY_OR:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2] or stack[sp - 1]
 
             # ----- UNARY -----
-            elif op == "UNARY_NEG":
-                f.stack.append(-f.stack.pop())
+            elif op == UNARY_NEG:
+                stack[sp - 1] = -stack[sp - 1]
 
-            elif op == "UNARY_NOT":
-                f.stack.append(not f.stack.pop())
+            elif op == UNARY_NOT:
+                stack[sp - 1] = not stack[sp - 1]
 
             # ----- LIST / DICT -----
-            elif op == "BUILD_LIST":
-                n = instr[1]
-                items = [f.stack.pop() for _ in range(n)][::-1]
-                f.stack.append(items)
-
-            elif op == "BUILD_DICT":
-                n = instr[1]
-                d = {}
-                for _ in range(n):
-                    v = f.stack.pop()
-                    k = f.stack.pop()
-                    d[k] = v
-                f.stack.append(d)
-
-            elif op == "BINARY_SUBSCR":
-                idx = f.stack.pop()
-                coll = f.stack.pop()
-                f.stack.append(coll[idx])
+            elif op == BUILD_LIST:
+                self.op_BUILD_LIST(f, arg)
+
+            elif op == BUILD_DICT:
+                self.op_BUILD_DICT(f, arg)
+
+            elif op == BINARY_SUBSCR:
+                f.sp = sp - 1
+                stack[sp - 2] = stack[sp - 2][stack[sp - 1]]
 
             # ----- PRINT -----
-            elif op == "PRINT":
-                val = f.stack.pop()
-                self.globals["print"](val)
+            elif op == PRINT:
+                f.sp = sp - 1
+                self.globals["print"](stack[sp - 1])
 
             # ----- CLEAR -----
-            elif op == "CLEAR":
+            elif op == CLEAR:
                 os.system("cls" if os.name == "nt" else "clear")
 
             # ----- JUMPS -----
-            elif op == "JUMP":
-                f.ip += instr[1] - 1
+            elif op == JUMP:
+                f.ip += (arg - 1) * 2
 
-            elif op == "JUMP_IF_FALSE":
-                offset = instr[1]
-                cond = f.stack.pop() if f.stack else False
-                if not cond:
-                    f.ip += offset - 1
-
-            # ----- LOOP FLOW -----
-            elif op == "BREAK":
-                f.ip = f.loop_stack[-1]
-
-            elif op == "CONTINUE":
-                f.ip = f.loop_stack[-1] - 1
+            elif op == JUMP_IF_FALSE:
+                f.sp = sp - 1
+                if not stack[sp - 1]:
+                    f.ip += (arg - 1) * 2
 
             # ----- FUNCTION -----
-            elif op == "MAKE_FUNCTION":
-                name, params, func_code = instr[1:]
-                self.globals[name] = (params, func_code)
+            elif op == MAKE_FUNCTION:
+                self.op_MAKE_FUNCTION(f, arg)
 
-            elif op == "CALL_FUNCTION":
-                name, argc = instr[1:]
-                args = [f.stack.pop() for _ in range(argc)][::-1]
-                func = self.globals.get(name)
+            elif op == CALL_FUNCTION:
+                self.op_CALL_FUNCTION(f, arg)
 
-                # host function
-                if callable(func):
-                    f.stack.append(func(*args))
+            elif op == RETURN:
+                self.op_RETURN(f, arg)
 
-                # user function
-                else:
-                    params, body_code = func
-                    new_co = CodeObject(body_code, f.consts, name=name)
-                    self.push_frame(new_co)
-                    newf = self.current()
-                    for p, a in zip(params, args):
-                        self.globals[p] = a
-
-            elif op == "RETURN":
-                if f.stack:
-                    f.return_value = f.stack.pop()
-                self.pop_frame()
-
-            elif op == "POP_TOP":
-                if f.stack:
-                    f.stack.pop()
+            elif op == POP_TOP:
+                f.sp = sp - 1
 
+            # opcodes added after this loop (optimizer output etc.) share the table handlers
             else:
-                raise RuntimeError(f"Unknown opcode {op}")
+                self.handlers[op](f, arg)
+
+    # ---------------- OPCODE HANDLERS ----------------
+    def op_CONST(self, f, arg):
+        sp = f.sp
+        f.stack[sp] = f.consts[arg]
+        f.sp = sp + 1
+
+    def op_LOAD_NAME(self, f, arg):
+        # inline cache: (globals version, cell) for this instruction
+        g = self.globals
+        i = (f.ip >> 1) - 1
+        entry = f.cache[i]
+        if entry is not None and entry[0] == g.version:
+            self.cache_hits += 1
+            sp = f.sp
+            f.stack[sp] = entry[1][0]
+            f.sp = sp + 1
+            return
+        self.cache_misses += 1
+        try:
+            cell = g.cell(f.names[arg])
+        except KeyError:
+            raise RuntimeError(f"NameError: name '{f.names[arg]}' is not defined") from None
+        f.cache[i] = (g.version, cell)
+        sp = f.sp
+        f.stack[sp] = cell[0]
+        f.sp = sp + 1
+
+    def op_STORE_NAME(self, f, arg):
+        sp = f.sp - 1
+        f.sp = sp
+        self.globals[f.names[arg]] = f.stack[sp]
+
+    def op_LOAD_FAST(self, f, arg):
+        v = f.locals[arg]
+        if v is UNBOUND:
+            raise RuntimeError(f"NameError: local variable '{f.varnames[arg]}' referenced before assignment")
+        sp = f.sp
+        f.stack[sp] = v
+        f.sp = sp + 1
+
+    def op_STORE_FAST(self, f, arg):
+        sp = f.sp - 1
+        f.sp = sp
+        f.locals[arg] = f.stack[sp]
+
+    def op_INC_NAME(self, f, arg):
+        g = self.globals
+        name = f.names[arg]
+        try:
+            value = g[name]
+        except KeyError:
+            raise RuntimeError(f"NameError: name '{name}' is not defined") from None
+        g[name] = value + 1
+
+    def op_INC_FAST(self, f, arg):
+        v = f.locals[arg]
+        if v is UNBOUND:
+            raise RuntimeError(f"NameError: local variable '{f.varnames[arg]}' referenced before assignment")
+        f.locals[arg] = v + 1
+
+    def op_LOAD_NAME_PAIR(self, f, arg):
+        # inline cache: (globals version, first cell, second cell)
+        g = self.globals
+        i = (f.ip >> 1) - 1
+        entry = f.cache[i]
+        if entry is not None and entry[0] == g.version:
+            self.cache_hits += 1
+            sp = f.sp
+            stack = f.stack
+            stack[sp] = entry[1][0]
+            stack[sp + 1] = entry[2][0]
+            f.sp = sp + 2
+            return
+        self.cache_misses += 1
+        names = f.names
+        try:
+            a = g.cell(names[arg >> PAIR_BITS])
+            b = g.cell(names[arg & PAIR_MASK])
+        except KeyError as e:
+            raise RuntimeError(f"NameError: name '{e.args[0]}' is not defined") from None
+        f.cache[i] = (g.version, a, b)
+        sp = f.sp
+        stack = f.stack
+        stack[sp] = a[0]
+        stack[sp + 1] = b[0]
+        f.sp = sp + 2
+
+    def op_LOAD_FAST_PAIR(self, f, arg):
+        locals = f.locals
+        a = locals[arg >> PAIR_BITS]
+        b = locals[arg & PAIR_MASK]
+        if a is UNBOUND or b is UNBOUND:
+            slot = arg >> PAIR_BITS if a is UNBOUND else arg & PAIR_MASK
+            raise RuntimeError(f"NameError: local variable '{f.varnames[slot]}' referenced before assignment")
+        sp = f.sp
+        stack = f.stack
+        stack[sp] = a
+        stack[sp + 1] = b
+        f.sp = sp + 2
+
+    def op_LOAD_NAME_CONST(self, f, arg):
+        # inline cache: (globals version, cell)
+        g = self.globals
+        i = (f.ip >> 1) - 1
+        entry = f.cache[i]
+        if entry is not None and entry[0] == g.version:
+            self.cache_hits += 1
+            value = entry[1][0]
+        else:
+            self.cache_misses += 1
+            name = f.names[arg >> PAIR_BITS]
+            try:
+                cell = g.cell(name)
+            except KeyError:
+                raise RuntimeError(f"NameError: name '{name}' is not defined") from None
+            f.cache[i] = (g.version, cell)
+            value = cell[0]
+        sp = f.sp
+        stack = f.stack
+        stack[sp] = value
+        stack[sp + 1] = f.consts[arg & PAIR_MASK]
+        f.sp = sp + 2
+
+    def op_LOAD_FAST_CONST(self, f, arg):
+        v = f.locals[arg >> PAIR_BITS]
+        if v is UNBOUND:
+            raise RuntimeError(f"NameError: local variable '{f.varnames[arg >> PAIR_BITS]}' referenced before assignment")
+        sp = f.sp
+        stack = f.stack
+        stack[sp] = v
+        stack[sp + 1] = f.consts[arg & PAIR_MASK]
+        f.sp = sp + 2
+
+    def op_BINARY_ADD(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] + stack[sp]
+        f.sp = sp
+
+    def op_BINARY_SUB(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] - stack[sp]
+        f.sp = sp
+
+    def op_BINARY_MUL(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] * stack[sp]
+        f.sp = sp
+
+    def op_BINARY_DIV(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] / stack[sp]
+        f.sp = sp
+
+    def op_BINARY_MOD(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] % stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_EQ(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] == stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_NE(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] != stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_LT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] < stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_LE(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] <= stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_GT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] > stack[sp]
+        f.sp = sp
+
+    def op_COMPARE_GE(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] >= stack[sp]
+        f.sp = sp
+
+    def op_BINARY_AND(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] and stack[sp]
+        f.sp = sp
+
+    def op_BINARY_OR(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1] or stack[sp]
+        f.sp = sp
+
+    def op_UNARY_NEG(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp] = -stack[sp]
+
+    def op_UNARY_NOT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp] = not stack[sp]
+
+    def op_BUILD_LIST(self, f, n):
+        stack = f.stack
+        sp = f.sp - n
+        stack[sp] = stack[sp:sp + n]
+        f.sp = sp + 1
+
+    def op_BUILD_DICT(self, f, n):
+        # entries in source order, so later duplicate keys win (as with BUILD_DICT_CONST)
+        stack = f.stack
+        sp = f.sp - 2 * n
+        items = stack[sp:sp + 2 * n]
+        stack[sp] = dict(zip(items[::2], items[1::2]))
+        f.sp = sp + 1
+
+    def op_BINARY_SUBSCR(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp - 1] = stack[sp - 1][stack[sp]]
+        f.sp = sp
+
+    def op_BUILD_LIST_CONST(self, f, arg):
+        sp = f.sp
+        f.stack[sp] = list(f.consts[arg])
+        f.sp = sp + 1
+
+    def op_BUILD_DICT_CONST(self, f, arg):
+        sp = f.sp
+        f.stack[sp] = dict(f.consts[arg])
+        f.sp = sp + 1
+
+    def op_PRINT(self, f, arg):
+        sp = f.sp - 1
+        f.sp = sp
+        self.globals["print"](f.stack[sp])
+
+    def op_CLEAR(self, f, arg):
+        os.system("cls" if os.name == "nt" else "clear")
+
+    def op_JUMP(self, f, offset):
+        f.ip += (offset - 1) * 2
+
+    def op_JUMP_IF_FALSE(self, f, offset):
+        sp = f.sp - 1
+        f.sp = sp
+        if not f.stack[sp]:
+            f.ip += (offset - 1) * 2
+
+    def op_JUMP_IF_TRUE(self, f, offset):
+        sp = f.sp - 1
+        f.sp = sp
+        if f.stack[sp]:
+            f.ip += (offset - 1) * 2
+
+    def op_JUMP_IF_FALSE_OR_POP(self, f, offset):
+        if f.stack[f.sp - 1]:
+            f.sp -= 1
+        else:
+            f.ip += (offset - 1) * 2
+
+    def op_JUMP_IF_TRUE_OR_POP(self, f, offset):
+        if f.stack[f.sp - 1]:
+            f.ip += (offset - 1) * 2
+        else:
+            f.sp -= 1
+
+    def op_FOR_RANGE(self, f, arg):
+        # a range iterator counts in a C integer; only the items it hands out are boxed
+        stack = f.stack
+        sp = f.sp - 3
+        stack[sp] = loop_range(stack[sp], stack[sp + 1], stack[sp + 2])
+        f.sp = sp + 1
+
+    def op_GET_ITER(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        stack[sp] = loop_iter(stack[sp])
+
+    def op_FOR_ITER(self, f, offset):
+        stack = f.stack
+        sp = f.sp
+        item = next(stack[sp - 1], EXHAUSTED)
+        if item is EXHAUSTED:
+            f.sp = sp - 1
+            f.ip += (offset - 1) * 2
+        else:
+            stack[sp] = item
+            f.sp = sp + 1
+
+    def op_COMPARE_EQ_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] == stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_COMPARE_NE_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] != stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_COMPARE_LT_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] < stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_COMPARE_LE_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] <= stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_COMPARE_GT_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] > stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_COMPARE_GE_JUMP(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        f.sp = sp
+        if not stack[sp] >= stack[sp + 1]:
+            f.ip += (offset - 1) * 2
+
+    def op_MAKE_FUNCTION(self, f, arg):
+        func_co = f.consts[arg]
+        self.globals[func_co.name] = Function(func_co)
+
+    def op_CALL_FUNCTION(self, f, arg):
+        stack = f.stack
+        sp = f.sp
+        split = sp - (arg & CALL_ARGC_MASK)
+
+        # inline cache: (globals version, cell, callee, is_user_function), checked
+        # for arity already; valid while the cell still holds the callee
+        g = self.globals
+        i = (f.ip >> 1) - 1
+        entry = f.cache[i]
+        if entry is not None and entry[0] == g.version and entry[1][0] is entry[2]:
+            self.cache_hits += 1
+            func = entry[2]
+            if entry[3]:
+                self.push_frame(func.code, stack[split:sp], func.padding)
+                f.sp = split
+                return True
+            stack[split] = func(*stack[split:sp])
+            f.sp = split + 1
+            return False
+
+        self.cache_misses += 1
+        name = f.names[arg >> CALL_ARGC_BITS]
+        argc = arg & CALL_ARGC_MASK
+        func = g.get(name)
+
+        # user function: arguments become the first local slots of a new frame
+        if type(func) is Function:
+            if argc != func.nparams:
+                raise RuntimeError(f"TypeError: {name}() takes {func.nparams} arguments but {argc} were given")
+            f.cache[i] = (g.version, g.cell(name), func, True)
+            self.push_frame(func.code, stack[split:sp], func.padding)
+            f.sp = split
+            return True
+
+        # host function
+        if callable(func):
+            f.cache[i] = (g.version, g.cell(name), func, False)
+            stack[split] = func(*stack[split:sp])
+            f.sp = split + 1
+            return False
+
+        raise RuntimeError(f"NameError: function '{name}' is not defined")
+
+    def op_TAIL_CALL(self, f, arg):
+        """`return f(...)`: a user function takes over this frame instead of pushing one."""
+        stack = f.stack
+        func = self.globals.get(f.names[arg >> CALL_ARGC_BITS])
+        if type(func) is not Function or func.nparams != arg & CALL_ARGC_MASK:
+            # host functions and errors: an ordinary call, the next RETURN returns its value
+            return self.op_CALL_FUNCTION(f, arg)
+        locals = f.locals
+        locals[:] = stack[f.sp - func.nparams:f.sp]
+        locals.extend(func.padding)
+        co = func.code
+        if co is not f.co:
+            size = co.stacksize
+            if size is None:
+                size = verify(co)
+            f.stack = [None] * size
+        f.sp = 0
+        if co.inline_cache is None:
+            co.inline_cache = [None] * (len(co.code) >> 1)
+        if self.quicken:
+            if co.adaptive is None:
+                co.adaptive = array("i", co.code)
+            f.code = co.adaptive
+        else:
+            f.code = co.code
+        f.ip = 0
+        f.consts = co.consts
+        f.names = co.names
+        f.name = co.name
+        f.varnames = co.varnames
+        f.cache = co.inline_cache
+        f.co = co
+        return True
+
+    def op_RETURN(self, f, arg):
+        f.sp -= 1
+        return self._return(f, f.stack[f.sp])
+
+    def _return(self, f, value):
+        """Finish frame `f` (the top one) with `value`."""
+        f.return_value = value
+        self.pop_frame()
+        # hand the value to the caller, if this frame had one in this run loop
+        if len(self.frames) > self.base_depth:
+            caller = self.frames[-1]
+            sp = caller.sp
+            caller.stack[sp] = value
+            caller.sp = sp + 1
+        self.release_frame(f)
+        return True
+
+    def op_CHECK_TYPE(self, f, arg):
+        check_type(f.stack[f.sp - 1], TYPE_NAMES[arg & TYPE_MASK], f.names[arg >> TYPE_BITS])
+
+    def op_POP_TOP(self, f, arg):
+        f.sp -= 1
+
+    # ---------------- TIERING ----------------
+    def _tiered_call(self, generic):
+        """CALL_FUNCTION / TAIL_CALL that counts calls per callee and calls tier-2 code once it exists."""
+        def handler(f, arg):
+            func = self.globals.get(f.names[arg >> CALL_ARGC_BITS])
+            if type(func) is Function and self.native_depth < self.native_limit:
+                entry = self._hot(func.code)
+                if entry is not None and (arg & CALL_ARGC_MASK) == func.nparams:
+                    stack = f.stack
+                    split = f.sp - func.nparams
+                    stack[split] = self._enter_tier2(entry, stack[split:f.sp])
+                    f.sp = split + 1
+                    return False
+            return generic(f, arg)
+        handler.__name__ = generic.__name__
+        return handler
+
+    def op_JUMP_COUNTING(self, f, offset):
+        """JUMP that counts loop backedges and moves a hot looping frame to tier 2."""
+        if offset < 0 and self.native_depth < self.native_limit:
+            # the loop header: the jump's target instruction
+            pc = (f.ip >> 1) - 1 + offset
+            entry = self._hot(f.co, (id(f.co), pc))
+            if entry is not None:
+                # resume at the header, with what a for loop keeps on the stack there (its iterators)
+                self.osr_entries += 1
+                return self._return(f, self._enter_tier2(entry, f.locals, pc, f.stack[:f.sp]))
+        f.ip += (offset - 1) * 2
+
+    def _hot(self, co: CodeObject, counter=None):
+        """
+        Count one call of `co`, or one backedge to the loop header `counter`
+        names; its tier-2 function once it has one, else None.
+        """
+        promoted = self.tier2.get(id(co))
+        # the identity check skips entries of a dead code object whose id was reused
+        if promoted is not None and promoted[0] is co:
+            return promoted[1]
+        key = id(co) if counter is None else counter
+        n = self.hotness.get(key, 0) + 1
+        self.hotness[key] = n
+        if n < self.tier_threshold:
+            return None
+        return self.promote(co)
+
+    def promote(self, co: CodeObject):
+        """Translate `co` to tier 2; code that cannot be translated stays in the VM for good."""
+        namespace = {
+            "G": self.globals,
+            "K": co.consts,
+            "CO": co,
+            "UNBOUND": UNBOUND,
+            "_call": self.call_function,
+            "_undefined": _undefined,
+            "_unbound": _unbound,
+            "_clear": _clear,
+            "_Function": Function,
+            "_range": loop_range,
+            "_iter": loop_iter,
+            "_check_type": check_type,
+            "_EXHAUSTED": EXHAUSTED,
+        }
+        try:
+            entry = compile_tier2(co, namespace)
+        except Unsupported:
+            entry = None
+            self.tier_failures += 1
+        else:
+            self.promotions += 1
+        self.tier2[id(co)] = (co, entry)
+        self.hotness.pop(id(co), None)
+        return entry
+
+    def _enter_tier2(self, entry, args, pc: int = 0, stack=()):
+        """`stack` needs `args` to hold every local: the values follow `pc` positionally."""
+        self.native_depth += 1
+        try:
+            if stack:
+                return entry(*args, pc, *stack)
+            return entry(*args, pc=pc)
+        finally:
+            self.native_depth -= 1
+
+    def call_function(self, func, name: str, *args):
+        """A call made by tier-2 code: tier 2 again when possible, otherwise a VM frame."""
+        if type(func) is Function:
+            if len(args) != func.nparams:
+                raise RuntimeError(f"TypeError: {name}() takes {func.nparams} arguments but {len(args)} were given")
+            if self.native_depth < self.native_limit:
+                entry = self._hot(func.code)
+                if entry is not None:
+                    return self._enter_tier2(entry, args)
+            # too deep for more Python frames, or not hot yet
+            return self.run_function(func, args)
+        if callable(func):
+            return func(*args)
+        raise RuntimeError(f"NameError: function '{name}' is not defined")
+
+    def run_function(self, func: Function, args) -> Any:
+        """Run one call to completion in a nested run loop and return its value."""
+        outer = self.base_depth
+        self.base_depth = len(self.frames)
+        f = self.push_frame(func.code, args, func.padding)
+        try:
+            self.run_table()
+        finally:
+            self.base_depth = outer
+        return f.return_value
+
+    def tier_stats(self) -> Dict[str, int]:
+        return {"promotions": self.promotions, "osr_entries": self.osr_entries, "failures": self.tier_failures}
+
+    # ---------------- QUICKENING ----------------
+    def _adaptive(self, generic):
+        """
+        Wrap a generic handler so that, after running, it tries to rewrite its
+        instruction into the specialized form for the operand types it saw.
+        """
+        specialize = self._specialize
+
+        def handler(f, arg):
+            ip = f.ip - 2
+            a, b = f.stack[f.sp - 2], f.stack[f.sp - 1]
+            result = generic(f, arg)
+            specialize(f, ip, a, b)
+            return result
+        handler.__name__ = generic.__name__
+        return handler
+
+    def _specialize(self, f, ip, a, b):
+        i = ip >> 1
+        backoff = f.cache[i]
+        if backoff:
+            f.cache[i] = backoff - 1
+            return
+        specs = SPECIALIZATIONS[f.code[ip]]
+        spec = specs.get((type(a), type(b))) or specs.get((type(a), object))
+        if spec is None:
+            f.cache[i] = ADAPTIVE_BACKOFF
+            return
+        f.code[ip] = spec
+        self.specializations += 1
+
+    def _deopt(self, f, arg):
+        """A specialized instruction's guard failed: go back to the generic form and run it."""
+        ip = f.ip - 2
+        generic = DEOPT[f.code[ip]]
+        f.code[ip] = generic
+        f.cache[ip >> 1] = ADAPTIVE_BACKOFF
+        self.deopts += 1
+        return self.handlers[generic](f, arg)
+
+    # Specialized handlers: guard the operand types, else deoptimize.
+    def op_BINARY_ADD_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a + b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_ADD_FLOAT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is float is type(b):
+            stack[sp - 1] = a + b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_ADD_STR(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is str is type(b):
+            stack[sp - 1] = a + b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_SUB_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a - b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_SUB_FLOAT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is float is type(b):
+            stack[sp - 1] = a - b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_MUL_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a * b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_MUL_FLOAT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is float is type(b):
+            stack[sp - 1] = a * b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_BINARY_MOD_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b) and b:
+            stack[sp - 1] = a % b
+            f.sp = sp
+        else:
+            # b == 0 also takes the generic path so the ZeroDivisionError comes from there
+            return self._deopt(f, arg)
+
+    def op_COMPARE_EQ_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a == b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_NE_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a != b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_LT_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a < b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_LE_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a <= b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_GT_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a > b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_GE_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        a = stack[sp - 1]
+        b = stack[sp]
+        if type(a) is int is type(b):
+            stack[sp - 1] = a >= b
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def op_COMPARE_LT_JUMP_INT(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        a = stack[sp]
+        b = stack[sp + 1]
+        if type(a) is int is type(b):
+            f.sp = sp
+            if not a < b:
+                f.ip += (offset - 1) * 2
+        else:
+            return self._deopt(f, offset)
+
+    def op_COMPARE_LE_JUMP_INT(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        a = stack[sp]
+        b = stack[sp + 1]
+        if type(a) is int is type(b):
+            f.sp = sp
+            if not a <= b:
+                f.ip += (offset - 1) * 2
+        else:
+            return self._deopt(f, offset)
+
+    def op_COMPARE_GT_JUMP_INT(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        a = stack[sp]
+        b = stack[sp + 1]
+        if type(a) is int is type(b):
+            f.sp = sp
+            if not a > b:
+                f.ip += (offset - 1) * 2
+        else:
+            return self._deopt(f, offset)
+
+    def op_COMPARE_GE_JUMP_INT(self, f, offset):
+        stack = f.stack
+        sp = f.sp - 2
+        a = stack[sp]
+        b = stack[sp + 1]
+        if type(a) is int is type(b):
+            f.sp = sp
+            if not a >= b:
+                f.ip += (offset - 1) * 2
+        else:
+            return self._deopt(f, offset)
+
+    def op_BINARY_SUBSCR_LIST_INT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        idx = stack[sp]
+        coll = stack[sp - 1]
+        if type(coll) is list and type(idx) is int and -len(coll) <= idx < len(coll):
+            stack[sp - 1] = coll[idx]
+            f.sp = sp
+        else:
+            # out-of-range indexes also take the generic path so the IndexError comes from there
+            return self._deopt(f, arg)
+
+    def op_BINARY_SUBSCR_DICT(self, f, arg):
+        stack = f.stack
+        sp = f.sp - 1
+        coll = stack[sp - 1]
+        if type(coll) is dict:
+            stack[sp - 1] = coll[stack[sp]]
+            f.sp = sp
+        else:
+            return self._deopt(f, arg)
+
+    def quicken_stats(self) -> Dict[str, int]:
+        return {"specializations": self.specializations, "deopts": self.deopts}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        total = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / total if total else 0.0,
+        }
+
+    @staticmethod
+    def _unknown_op(name):
+        def handler(f, arg):
+            raise RuntimeError(f"Unknown opcode {name}")
+        return handler
 
     @staticmethod
     def _host_print(v):
         print(v)
+
+
+# ---------------- TIER-2 RUNTIME ----------------
+# referred to by the Python code axon/tiers.py generates
+def _undefined(name: str):
+    raise RuntimeError(f"NameError: name '{name}' is not defined")
+
+
+def _unbound(name: str):
+    raise RuntimeError(f"NameError: local variable '{name}' referenced before assignment")
+
+
+def _clear():
+    os.system("cls" if os.name == "nt" else "clear")
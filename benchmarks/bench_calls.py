@@ -0,0 +1,84 @@
+"""
+Call-heavy workloads: recursive fib and a loop of small calls.
+Reports wall time, Frame objects created and peak traced memory.
+
+    python -m benchmarks.bench_calls [fib_n] [calls]
+"""
+import sys
+import time
+import tracemalloc
+
+from axon import vm as vm_module
+from axon.compiler import compile_program
+from axon.parser import parse_text
+
+FIB = """
+fn fib(n) {{
+    if n < 2 {{ return n; }}
+    return fib(n - 1) + fib(n - 2);
+}}
+let result = fib({n});
+"""
+
+SMALL_CALLS = """
+fn add(a, b) {{ return a + b; }}
+let i = 0;
+let result = 0;
+while i < {n} {{
+    result = add(result, i);
+    i = add(i, 1);
+}}
+"""
+
+
+def count_frames():
+    """Swap in a Frame subclass that counts instantiations; returns the counter."""
+    created = [0]
+    base = vm_module.Frame
+
+    class CountingFrame(base):
+        __slots__ = ()
+
+        def __init__(self, *args, **kwargs):
+            created[0] += 1
+            super().__init__(*args, **kwargs)
+
+    vm_module.Frame = CountingFrame
+    return created, base
+
+
+def run_once(co):
+    # tier 2 would take the calls off the VM path this measures
+    vm = vm_module.VM(tier=False)
+    vm.push_frame(co)
+    start = time.perf_counter()
+    vm.run()
+    return vm, time.perf_counter() - start
+
+
+def bench(label, src):
+    co = compile_program(parse_text(src))
+    vm, elapsed = run_once(co)
+
+    # second run, instrumented: tracemalloc would distort the timing above
+    created, base = count_frames()
+    tracemalloc.start()
+    try:
+        run_once(co)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        vm_module.Frame = base
+    print(f"{label:>12}: {elapsed:.3f}s  frames created={created[0]:>8}  peak={peak / 1024:.1f} KiB"
+          f"  result={vm.globals['result']}")
+
+
+def main():
+    fib_n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    bench(f"fib({fib_n})", FIB.format(n=fib_n))
+    bench(f"{2 * calls} calls", SMALL_CALLS.format(n=calls))
+
+
+if __name__ == "__main__":
+    main()
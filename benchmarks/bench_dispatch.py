@@ -0,0 +1,48 @@
+"""
+Compare the VM run loops on a tight `while` loop, with the table engine
+measured both with and without quickening.
+
+    python -m benchmarks.bench_dispatch [iterations]
+"""
+import sys
+import time
+
+from axon.compiler import compile_program
+from axon.parser import parse_text
+from axon.vm import VM, DISPATCH_ENGINES
+
+SOURCE = """
+let i = 0;
+let total = 0;
+while i < {n} {{
+    total = total + i % 7;
+    i = i + 1;
+}}
+"""
+
+
+def bench(dispatch, co, quicken=False):
+    vm = VM(dispatch=dispatch, quicken=quicken, tier=False)
+    vm.push_frame(co)
+    start = time.perf_counter()
+    vm.run()
+    return time.perf_counter() - start, vm.globals["total"]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    co = compile_program(parse_text(SOURCE.format(n=n)))
+    results = {}
+    for dispatch in DISPATCH_ENGINES:
+        elapsed, total = bench(dispatch, co)
+        results[dispatch] = elapsed
+        print(f"{dispatch:>8}: {elapsed:.3f}s  ({n / elapsed / 1e6:.2f} M iterations/s, total={total})")
+    elapsed, total = bench("table", co, quicken=True)
+    results["quicken"] = elapsed
+    print(f" quicken: {elapsed:.3f}s  ({n / elapsed / 1e6:.2f} M iterations/s, table with quickening)")
+    print(f" speedup: {results['switch'] / results['table']:.2f}x over switch, "
+          f"{results['table'] / results['quicken']:.2f}x from quickening")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the bytecode VM (with and without tiering) with the closure-compiling
+engine and the Python transpiler on a tight `while` loop and on recursive calls.
+
+    python -m benchmarks.bench_engines [iterations]
+"""
+import sys
+import time
+
+from axon.closures import ClosureEngine
+from axon.compiler import compile_program
+from axon.parser import parse_text
+from axon.transpiler import TranspiledEngine
+from axon.vm import VM
+
+SOURCE = """
+fn fib(n) {{
+    if n < 2 {{ return n; }}
+    return fib(n - 1) + fib(n - 2);
+}}
+let i = 0;
+let total = 0;
+while i < {n} {{
+    total = total + i % 7;
+    i = i + 1;
+}}
+let f = fib(20);
+"""
+
+
+def run_vm(prog, tier=True):
+    vm = VM(tier=tier)
+    start = time.perf_counter()
+    vm.push_frame(compile_program(prog))
+    vm.run()
+    return time.perf_counter() - start, vm.globals["total"], vm.globals["f"]
+
+
+def run_engine(engine, prog):
+    start = time.perf_counter()
+    engine.run(prog)
+    return time.perf_counter() - start, engine.globals["total"], engine.globals["f"]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    prog = parse_text(SOURCE.format(n=n))
+    results = {}
+    runs = (
+        ("vm", lambda p: run_vm(p, tier=False)),
+        ("tiered", run_vm),
+        ("closure", lambda p: run_engine(ClosureEngine(), p)),
+        ("python", lambda p: run_engine(TranspiledEngine(), p)),
+    )
+    for name, run in runs:
+        elapsed, total, f = run(prog)
+        results[name] = elapsed
+        print(f"{name:>8}: {elapsed:.3f}s  (total={total}, fib(20)={f}; includes compile)")
+    print(f" speedup: {results['vm'] / results['tiered']:.2f}x tiered, {results['vm'] / results['closure']:.2f}x closures, "
+          f"{results['vm'] / results['python']:.2f}x transpiled over the VM")
+
+
+if __name__ == "__main__":
+    main()
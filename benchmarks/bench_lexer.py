@@ -0,0 +1,54 @@
+"""
+Tokenizer throughput on a generated multi-megabyte source.
+
+    python -m benchmarks.bench_lexer [megabytes]
+"""
+import sys
+import time
+
+from axon.lexer import tokenize
+
+CHUNK = """
+// block {i}
+let count_{i} = {i};
+let name_{i} = "item \\"{i}\\"\\n";
+fn scale_{i}(value, factor) {{
+    if value >= 10 and not (factor == 0) {{
+        return value * factor / 2.5;
+    }} else {{
+        return value - factor % 3;
+    }}
+}}
+while count_{i} < 100 {{
+    count_{i} = count_{i} + scale_{i}(count_{i}, 2);
+}}
+let table_{i} = {{"key": [1, 2, 3], "other": name_{i}}};
+print(table_{i}["key"][0]);
+"""
+
+
+def generate(megabytes: float) -> str:
+    parts, size, i = [], 0, 0
+    while size < megabytes * 1e6:
+        chunk = CHUNK.format(i=i)
+        parts.append(chunk)
+        size += len(chunk)
+        i += 1
+    return "".join(parts)
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    source = generate(megabytes)
+    size = len(source.encode("utf-8"))
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        tokens = tokenize(source)
+        best = min(best, time.perf_counter() - start)
+    print(f"{size / 1e6:.1f} MB, {len(tokens)} tokens: best {best:.3f}s  "
+          f"({size / best / 1e6:.2f} MB/s, {len(tokens) / best / 1e6:.2f} M tokens/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Peak memory of parsing a generated source held in a string versus streamed
+from a memory-mapped file.
+
+    python -m benchmarks.bench_parse_memory [megabytes]
+"""
+import mmap
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from axon.parser import parse_stream, parse_text
+from benchmarks.bench_lexer import generate
+
+
+def measure(fn):
+    """(peak bytes while running fn, bytes still held by its result, result)"""
+    tracemalloc.start()
+    try:
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        return peak, current, result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    source = generate(megabytes)
+    fd, path = tempfile.mkstemp(suffix=".ax")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(source)
+        size = os.path.getsize(path)
+
+        def from_string():
+            with open(path, encoding="utf-8") as f:
+                return parse_text(f.read())
+
+        def from_mmap():
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return parse_stream(mm)
+
+        del source
+        for label, fn in (("string", from_string), ("mmap stream", from_mmap)):
+            peak, ast, stmts = measure(fn)
+            print(f"{label:>12}: peak {peak / 1e6:6.1f} MB ({peak / size:.1f}x the {size / 1e6:.1f} MB file), "
+                  f"of which the AST {ast / 1e6:.1f} MB ({len(stmts)} statements)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
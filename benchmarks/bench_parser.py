@@ -0,0 +1,46 @@
+"""
+Parser throughput on generated expression-heavy code: long flat operator
+chains and deeply parenthesized expressions.
+
+    python -m benchmarks.bench_parser [statements]
+"""
+import sys
+import time
+
+from axon.parser import parse_text
+
+OPS = ["+", "-", "*", "/", "%", "<", "==", "and", "or"]
+
+
+def flat(n: int, width: int = 40) -> str:
+    lines = []
+    for i in range(n):
+        terms = [f"x{(i + k) % 7}" if k % 2 else str(k) for k in range(width)]
+        expr = terms[0]
+        for k, t in enumerate(terms[1:]):
+            expr += f" {OPS[(i + k) % len(OPS)]} {t}"
+        lines.append(f"let v{i} = {expr};")
+    return "\n".join(lines)
+
+
+def nested(n: int, depth: int = 30) -> str:
+    return "\n".join(f"let v{i} = " + "(1 + " * depth + "x" + ")" * depth + ";" for i in range(n))
+
+
+def bench(label: str, source: str):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        parse_text(source)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:>7}: {len(source) / 1e6:.2f} MB in {best:.3f}s ({len(source) / best / 1e6:.2f} MB/s)")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bench("flat", flat(n))
+    bench("nested", nested(n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Benchmark suite: every pipeline stage on a set of Axon workloads, as JSON
+that can be compared across commits.
+
+For each workload the suite times `tokenize`, `Parser.parse` (which pulls
+its own tokens, so it includes tokenizing), `sema.analyze`,
+`typecheck.check` and `compile_program` separately, and compiles with the
+types it found, as `axon.cache.compile_source` does. It then runs the program on the VM without
+tiering, on the VM with tiering, and on the `nodes.py` tree interpreter.
+Every number is the best of `--repeat` runs.
+
+    python -m benchmarks.suite                            # print a table
+    python -m benchmarks.suite -o baseline.json           # save results
+    python -m benchmarks.suite --compare baseline.json    # exit 1 on regressions
+
+With `--compare`, a timing counts as a regression when it is more than
+`--threshold` (default 25%) slower than in the baseline file. It must also
+be slower by at least `NOISE_FLOOR`, so that stages taking microseconds
+do not fail the run on jitter. Timings the baseline has but this run does
+not produce are regressions too.
+"""
+from typing import Callable, Dict, List
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from axon import sema, typecheck
+from axon.compiler import compile_program
+from axon.lexer import tokenize
+from axon.nodes import BUILTINS, Environment, interpret
+from axon.parser import Parser
+from axon.vm import VM
+
+FORMAT_VERSION = 1
+
+# slower than the baseline by more than this fraction is a regression
+DEFAULT_THRESHOLD = 0.25
+
+# slowdowns smaller than this (seconds) are noise, whatever their percentage
+NOISE_FLOOR = 0.0005
+
+
+def numeric_loop(scale: int) -> str:
+    return f"""
+let i = 0;
+let total = 0;
+while i < {20_000 * scale} {{
+    total = total + i * 3 % 7 - i / 4;
+    i = i + 1;
+}}
+print(total);
+"""
+
+
+def counted_loop(scale: int) -> str:
+    return f"""
+let total = 0;
+for i = 0 to {20_000 * scale} {{
+    total = total + i * 3 % 7 - i / 4;
+}}
+let xs = [1, 2, 3, 4, 5, 6, 7, 8];
+for round = 0 to {1_000 * scale} {{
+    for x in xs {{ total = total + x; }}
+}}
+print(total);
+"""
+
+
+def fib(scale: int) -> str:
+    return f"""
+fn fib(n) {{
+    if n < 2 {{ return n; }}
+    return fib(n - 1) + fib(n - 2);
+}}
+let rounds = 0;
+while rounds < {scale} {{
+    print(fib(16));
+    rounds = rounds + 1;
+}}
+"""
+
+
+def string_building(scale: int) -> str:
+    return f"""
+let s = "";
+let i = 0;
+while i < {5_000 * scale} {{
+    if i % 3 == 0 {{ s = s + "fizz"; }} else {{ s = s + "."; }}
+    i = i + 1;
+}}
+print(s == "");
+"""
+
+
+def list_dict_churn(scale: int) -> str:
+    return f"""
+let i = 0;
+let total = 0;
+while i < {5_000 * scale} {{
+    let xs = [i, i + 1, i + 2, "x"];
+    let d = {{"a": xs[0], "b": xs[2], "c": [xs[1]]}};
+    total = total + d["a"] + d["b"] - d["c"][0];
+    i = i + 1;
+}}
+print(total);
+"""
+
+
+def loop_after_prefix(scale: int) -> str:
+    """A hot loop behind a long run of code that runs once: tier 2 must not rescan it per iteration."""
+    prefix = "".join(f"if {k} > 5000 {{ print({k}); }}\n" for k in range(500))
+    return prefix + f"""
+let i = 0;
+let total = 0;
+while i < {20_000 * scale} {{
+    total = total + i;
+    i = i + 1;
+}}
+print(total);
+"""
+
+
+GENERATED_CHUNK = """
+// block {i}
+let count_{i} = {i} % 50;
+let name_{i} = "item {i}";
+fn scale_{i}(value, factor) {{
+    if value >= 10 and not (factor == 0) {{
+        return value * factor / 2.5;
+    }} else {{
+        return value + factor % 3;
+    }}
+}}
+while count_{i} < 100 {{
+    count_{i} = count_{i} + scale_{i}(count_{i}, 2) + 1;
+}}
+let table_{i} = {{"key": [1, 2, 3], "other": name_{i}}};
+let picked_{i} = table_{i}["key"][0];
+"""
+
+
+def generated(scale: int) -> str:
+    """A large source: many small functions, loops and literals."""
+    return "".join(GENERATED_CHUNK.format(i=i) for i in range(400 * scale))
+
+
+WORKLOADS: Dict[str, Callable[[int], str]] = {
+    "numeric_loop": numeric_loop,
+    "counted_loop": counted_loop,
+    "fib": fib,
+    "string_building": string_building,
+    "list_dict_churn": list_dict_churn,
+    "loop_after_prefix": loop_after_prefix,
+    "generated": generated,
+}
+
+
+def best_of(repeat: int, fn: Callable[[], object]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def sink(value):
+    pass
+
+
+def run_vm(co, tier: bool):
+    vm = VM(tier=tier)
+    vm.globals["print"] = sink
+    vm.push_frame(co)
+    vm.run()
+
+
+def run_tree(prog):
+    interpret(prog, Environment(vars=dict(BUILTINS, print=sink)))
+
+
+def bench_workload(source: str, repeat: int) -> Dict[str, float]:
+    prog = Parser(source).parse()
+    types = typecheck.check(prog)
+    co = compile_program(prog, types=types)
+    return {
+        "tokenize": best_of(repeat, lambda: tokenize(source)),
+        "parse": best_of(repeat, lambda: Parser(source).parse()),
+        "sema": best_of(repeat, lambda: sema.analyze(prog)),
+        "typecheck": best_of(repeat, lambda: typecheck.check(prog)),
+        "compile": best_of(repeat, lambda: compile_program(prog, types=types)),
+        "vm.run": best_of(repeat, lambda: run_vm(co, tier=False)),
+        "vm.run.tiered": best_of(repeat, lambda: run_vm(co, tier=True)),
+        "tree.run": best_of(repeat, lambda: run_tree(prog)),
+    }
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_suite(names: List[str], scale: int, repeat: int) -> dict:
+    results = {}
+    for name in names:
+        for stage, seconds in bench_workload(WORKLOADS[name](scale), repeat).items():
+            results[f"{name}/{stage}"] = seconds
+    return {
+        "format": FORMAT_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Regressions of `current` against `baseline`, as report lines."""
+    if (current["scale"], current["format"]) != (baseline.get("scale"), baseline.get("format")):
+        return [f"baseline was recorded with scale {baseline.get('scale')} / format {baseline.get('format')}, "
+                f"not {current['scale']} / {current['format']}"]
+    regressions = []
+    for key, before in sorted(baseline["results"].items()):
+        after = current["results"].get(key)
+        if after is None:
+            regressions.append(f"{key}: missing from this run")
+        elif after > before * (1 + threshold) and after - before > NOISE_FLOOR:
+            regressions.append(f"{key}: {before * 1e3:.2f}ms -> {after * 1e3:.2f}ms ({after / before - 1:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.suite", description=__doc__.split("\n\n")[0])
+    ap.add_argument("workloads", nargs="*", metavar="workload",
+                    help=f"workloads to run (default: all of {', '.join(WORKLOADS)})")
+    ap.add_argument("--scale", type=int, default=1, help="multiply every workload's size (default: 1)")
+    ap.add_argument("--repeat", type=int, default=5, help="runs per timing, the best one counts (default: 5)")
+    ap.add_argument("-o", "--output", metavar="PATH", help="write the results as JSON to PATH")
+    ap.add_argument("--compare", metavar="PATH", help="baseline JSON to check this run against")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                    help="allowed slowdown against the baseline, as a fraction (default: %(default)g)")
+    args = ap.parse_args(argv)
+    unknown = [w for w in args.workloads if w not in WORKLOADS]
+    if unknown:
+        ap.error(f"unknown workload {unknown[0]!r} (choose from {', '.join(WORKLOADS)})")
+
+    current = run_suite(args.workloads or list(WORKLOADS), args.scale, args.repeat)
+    for key, seconds in current["results"].items():
+        print(f"{key:<36}{seconds * 1e3:>10.2f}ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if args.workloads:
+            baseline["results"] = {k: v for k, v in baseline["results"].items() if k.split("/")[0] in args.workloads}
+        regressions = compare(current, baseline, args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions over {args.threshold:.0%} against {args.compare}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import pytest
+from axon.astopt import optimize_ast
+from axon.cache import compile_source
+from axon.nodes import *
+from axon.optimizer import OptimizeStats
+from axon.parser import parse_text
+from axon.transpiler import transpile
+from axon.vm import VM
+
+def optimized(src, level=2):
+    stats = OptimizeStats()
+    stmts = optimize_ast(parse_text(src), level, stats)
+    return transpile(stmts), stats
+
+def run_vm(src, optimize):
+    out = []
+    vm = VM()
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_source(src.encode(), optimize))
+    vm.run()
+    return out, vm
+
+def test_level_below_two_does_nothing():
+    prog = parse_text("let x = 1 + 2;")
+    assert optimize_ast(prog, 1) is prog
+
+def test_constant_propagation():
+    code, stats = optimized("""
+let size = 4;
+fn area(w) { let h = 2; return w * h * size; }
+print(size + 1);
+""")
+    assert "return (w * 2 * 4)" in code and "print(5)" in code
+    # the global stays for the host; the unused local goes
+    assert "size = 4" in code and "h = " not in code
+    assert stats.passes["propagated"] == 3 and stats.passes["unused_vars"] == 1
+
+def test_no_propagation_of_reassigned_or_later_bindings():
+    code, _ = optimized("""
+fn early() { return n; }
+let n = 1;
+let m = 2;
+while m < 5 { m = m + 1; }
+print(n + m);
+""")
+    assert "return n" in code and "print((1 + m))" in code
+
+def test_inlining():
+    code, stats = optimized("""
+fn sq(x) { return x * x; }
+fn fact(n) { if n < 2 { return 1; } return n * fact(n - 1); }
+fn loop(n) { return loop2(n); }
+fn loop2(n) { return loop(n); }
+fn f(a) { return sq(a) + sq(3) + fact(a) + loop(a); }
+""")
+    assert "return ((a * a) + 9 + fact(a) + loop(a))" in code
+    assert stats.passes["inlined"] == 2
+
+def test_inlining_keeps_name_resolution():
+    # scaled's body reads the global k; inside g, k is a local
+    code, _ = optimized("""
+let k = [1];
+fn scaled(x) { return x * k[0]; }
+fn g(y) { let k = y; print(k); return scaled(y); }
+""")
+    assert "return scaled(y)" in code
+
+def test_dead_code():
+    code, stats = optimized("""
+fn f(x) {
+    if 1 == 2 { print("never"); } else if x { print("x"); } else { print("no"); }
+    while False { print("loop"); }
+    return x;
+    print("after");
+}
+if "yes" { print(1); } else { print(2); }
+""")
+    assert "never" not in code and "loop" not in code and "after" not in code
+    assert "if x:" in code and "print(1)" in code and "print(2)" not in code
+    assert stats.passes["dead_code"] == 4
+
+def test_dead_code_that_declares_a_local_stays():
+    src = """
+let x = 1;
+fn f() { x = 2; return x; let x = 3; }
+print(f());
+print(x);
+"""
+    code, _ = optimized(src)
+    assert "x = 3" in code
+    assert run_vm(src, 2)[0] == run_vm(src, 0)[0] == [2, 1]
+
+def test_unused_call_result_keeps_the_call():
+    code, _ = optimized("fn f() { let r = print(1); let unused = [1, {\"a\": 2}]; return 0; }")
+    assert "print(1)" in code and "unused" not in code and "r = " not in code
+
+@pytest.mark.parametrize("src", [
+    "fn f(a, b) { return a / b; } print(f(1, 0));",
+    "fn f(a) { return a; } print(f(1, 2));",
+    "fn f() { let x = missing; return 1; } print(f());",
+    "fn f(a) { return a + 1; } print(f(y));",
+])
+def test_errors_are_kept(src):
+    messages = []
+    for level in (0, 2):
+        with pytest.raises(Exception) as e:
+            run_vm(src, level)
+        messages.append((type(e.value), str(e.value)))
+    assert messages[0] == messages[1]
+
+def test_same_output_and_globals_as_unoptimized():
+    src = """
+let limit = 10;
+let step = 3;
+fn bump(v) { return v + step; }
+fn clamp(v, hi) { if v > hi { return hi; } return v; }
+let total = 0;
+let i = 0;
+while i < limit {
+    total = total + clamp(bump(i), 8);
+    i = bump(i);
+}
+print(total);
+"""
+    out0, vm0 = run_vm(src, 0)
+    out2, vm2 = run_vm(src, 2)
+    assert out0 == out2 == [25]
+    assert {k: vm0.globals[k] for k in ("limit", "step", "total", "i")} == \
+           {k: vm2.globals[k] for k in ("limit", "step", "total", "i")}
+
+def run_capturing(src, optimize):
+    out = []
+    vm = VM()
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_source(src.encode(), optimize))
+    try:
+        vm.run()
+    except Exception as e:
+        out.append((type(e).__name__, str(e)))
+    return out
+
+def test_loop_invariants_are_hoisted():
+    src = """
+let data = [1, 2, 3];
+let cfg = {"limit": 5};
+let i = 0;
+let total = 0;
+while i < len(data) * 2 {
+    total = total + cfg["limit"];
+    if i > 2 { total = total + len(data) * 2; }
+    i = i + 1;
+}
+print(total);
+"""
+    code, stats = optimized(src)
+    assert "_inv0 = (len(data) * 2)" in code and "while (i < _inv0)" in code
+    assert "total = (total + _inv0)" in code
+    # from the body: computed only once the loop is known to run
+    assert "if (i < _inv0):\n        _inv1 = cfg['limit']" in code
+    assert stats.passes["hoisted"] == 2
+    assert run_capturing(src, 2) == run_capturing(src, 0) == [48]
+
+@pytest.mark.parametrize("body", [
+    "let n = len(xs); xs = [n]; i = i + 1;",     # the loop assigns xs
+    "grow(xs); let n = len(xs); i = i + 1;",     # host code may change xs
+    "let n = len([i, 1]); i = i + 1;",           # depends on i, and builds a list
+    "print(i); let n = len(xs); i = i + 1;",     # runs after output
+])
+def test_loop_variants_stay(body):
+    code, stats = optimized(f"let xs = [1]; let i = 0; while i < 3 {{ {body} }}")
+    assert "hoisted" not in stats.passes and "_inv" not in code
+
+def test_loop_hoisting_keeps_errors():
+    src = """
+let cfg = {};
+let i = 0;
+while i < 0 { print(cfg["x"]); i = i + 1; }
+while i < 2 { print(cfg["y"] + 1); i = i + 1; }
+"""
+    assert optimized(src)[1].passes["hoisted"] == 2
+    assert run_capturing(src, 2) == run_capturing(src, 0) == [("KeyError", "'y'")]
+
+def test_strength_reduction():
+    src = """
+fn f(n) {
+    let i = 0;
+    let s = 0;
+    while i < n * 3 {
+        s = s + i * 4 + 4 * i;
+        i = i + 2;
+    }
+    return s;
+}
+print(f(5));
+"""
+    code, stats = optimized(src)
+    assert "_iv0 = (i * 4)" in code and "s = (s + _iv0 + _iv0)" in code
+    assert "i = (i + 2)\n            _iv0 = (_iv0 + 8)" in code
+    assert stats.passes["strength_reduced"] == 2
+    assert run_capturing(src, 2) == run_capturing(src, 0) == [448]
+
+@pytest.mark.parametrize("src", [
+    "let i = 0.5; while i < 3 { print(i * 2); i = i + 1; }",       # not an int
+    "fn f(i) { while i < 3 { print(i * 2); i = i + 1; } }",         # a param: any type
+    "let i = 0; while i < 3 { print(i * 2); i = i + 1; i = i * 1; }",
+    "let i = 0; fn g() { i = 7; } while i < 3 { print(i * 2); i = i + 1; }",
+])
+def test_no_strength_reduction_without_an_int_counter(src):
+    assert "strength_reduced" not in optimized(src)[1].passes
@@ -0,0 +1,73 @@
+import os
+from axon import cache
+from axon.compiler import CODEGEN_REVISION, compile_program, disassemble
+from axon.parser import parse_text
+from axon.vm import VM
+
+SRC = """
+let x = 2;
+while x < 5 { x = x + 1; }
+print([x, "done", 1.5, True]);
+"""
+
+def run_co(co):
+    out = []
+    vm = VM()
+    vm.globals["print"] = out.append
+    vm.push_frame(co)
+    vm.run()
+    return out
+
+def test_roundtrip_preserves_code_and_shared_tables():
+    co = compile_program(parse_text(SRC))
+    back = cache.loads(cache.dumps(co))
+    assert disassemble(back) == disassemble(co)
+    assert back.consts == co.consts and back.names == co.names
+    assert run_co(back) == run_co(co) == [[5, "done", 1.5, True]]
+
+def test_run_file_reuses_cache(tmp_path, monkeypatch):
+    p = tmp_path / "s.ax"
+    p.write_text(SRC)
+    co = cache.load_or_compile(str(p))
+    assert os.path.exists(cache.cache_path(str(p)))
+
+    def fail(_):
+        raise AssertionError("source was recompiled")
+    monkeypatch.setattr(cache, "compile_source", fail)
+    assert run_co(cache.load_or_compile(str(p))) == run_co(co)
+
+def test_stale_or_corrupt_cache_is_ignored(tmp_path):
+    p = tmp_path / "s.ax"
+    p.write_text("print(1);")
+    cache.load_or_compile(str(p))
+    p.write_text("print(2);")
+    assert run_co(cache.load_or_compile(str(p))) == [2]
+
+    with open(cache.cache_path(str(p)), "r+b") as f:
+        f.seek(len(cache.MAGIC) + 32)
+        f.write(b"\xff\xff")
+    assert run_co(cache.load_or_compile(str(p))) == [2]
+
+def test_cache_from_another_codegen_revision_is_ignored(tmp_path, monkeypatch):
+    p = tmp_path / "s.ax"
+    p.write_text("print(1);")
+    with monkeypatch.context() as m:
+        m.setattr(cache, "MAGIC", cache.magic(CODEGEN_REVISION - 1))
+        cache.load_or_compile(str(p))
+    assert cache.load(cache.cache_path(str(p)), b"print(1);") is None
+    cache.load_or_compile(str(p))
+    assert cache.load(cache.cache_path(str(p)), b"print(1);") is not None
+
+def test_no_cache_writes_nothing(tmp_path):
+    p = tmp_path / "s.ax"
+    p.write_text("print(1);")
+    cache.load_or_compile(str(p), use_cache=False)
+    assert not (tmp_path / cache.CACHE_DIR).exists()
+
+def test_compile_dir(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.ax").write_text("print(1);")
+    (tmp_path / "sub" / "b.ax").write_text("print(2);")
+    assert cache.compile_dir(str(tmp_path), quiet=True) == 2
+    assert cache.compile_dir(str(tmp_path), quiet=True) == 0
+    assert cache.compile_dir(str(tmp_path), force=True, quiet=True) == 2
@@ -0,0 +1,135 @@
+import pytest
+from axon.closures import ClosureEngine
+from axon.nodes import *
+from axon.parser import parse_text
+from tests.test_vm import run_source
+
+def run_closures(prog, **options):
+    out = []
+    engine = ClosureEngine(**options)
+    engine.globals["print"] = out.append
+    engine.run(parse_text(prog) if isinstance(prog, str) else prog)
+    return engine, out
+
+PROGRAMS = [
+    """
+let i = 0;
+let total = 0;
+while i < 10 {
+    total = total + i * 2;
+    i = i + 1;
+}
+print(total);
+""",
+    """
+let xs = [1, 2, 3];
+let d = {"a": 4, "b": 5};
+print(xs[1] + d["b"]);
+print(-xs[0] < 0 and not (1 == 2));
+print(7 % 4 - 10 / 4);
+print("ab" + "c");
+""",
+    """
+fn fib(n) {
+    if n < 2 { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+print(fib(15));
+""",
+    """
+let counter = 0;
+fn bump(by) {
+    let step = by * 2;
+    counter = counter + step;
+}
+bump(3);
+bump(4);
+print(counter);
+""",
+    """
+fn sign(x) {
+    if x < 0 { return -1; } else if x == 0 { return 0; } else { return 1; }
+}
+print(sign(-5));
+print(sign(0));
+print(sign(9));
+""",
+]
+
+@pytest.mark.parametrize("src", PROGRAMS)
+def test_matches_vm(src):
+    assert run_closures(src)[1] == run_source(src)[1]
+
+def test_locals_stay_out_of_globals():
+    engine, out = run_closures("""
+fn square(n) { let r = n * n; return r; }
+print(square(7));
+""")
+    assert out == [49]
+    assert "n" not in engine.globals and "r" not in engine.globals
+
+def test_break_and_continue_use_return_codes():
+    # while i < 10 { i = i + 1; if i % 2 == 0 { continue; } if i > 6 { break; } print(i); }
+    i = VariableNode("i")
+    prog = [
+        LetNode("i", NumberNode(0)),
+        WhileNode(BinOpNode(i, "<", NumberNode(10)), [
+            LetNode("i", BinOpNode(i, "+", NumberNode(1)), declare=False),
+            IfNode([(BinOpNode(BinOpNode(i, "%", NumberNode(2)), "==", NumberNode(0)), [ContinueNode()])]),
+            IfNode([(BinOpNode(i, ">", NumberNode(6)), [BreakNode()])]),
+            PrintNode(i),
+        ]),
+    ]
+    engine, out = run_closures(prog)
+    assert out == [1, 3, 5]
+    assert engine.globals["i"] == 7
+
+def test_return_from_inside_loop():
+    # fn first_over(limit) { let i = 0; while true { if i * i > limit { return i; } i = i + 1; } }
+    i = VariableNode("i")
+    prog = [
+        FunctionNode("first_over", ["limit"], [
+            LetNode("i", NumberNode(0)),
+            WhileNode(BooleanNode(True), [
+                IfNode([(BinOpNode(BinOpNode(i, "*", i), ">", VariableNode("limit")), [ReturnNode(i)])]),
+                LetNode("i", BinOpNode(i, "+", NumberNode(1)), declare=False),
+            ]),
+        ]),
+        PrintNode(CallNode("first_over", [NumberNode(50)])),
+    ]
+    assert run_closures(prog)[1] == [8]
+
+def test_break_outside_loop_is_rejected():
+    with pytest.raises(Exception, match="outside loop"):
+        run_closures([BreakNode()])
+
+@pytest.mark.parametrize("src, message", [
+    ("print(missing);", "name 'missing' is not defined"),
+    ("fn f(a) { return a; } f(1, 2);", r"f\(\) takes 1 arguments but 2 were given"),
+    ("nope(1);", "function 'nope' is not defined"),
+])
+def test_runtime_errors_match_vm(src, message):
+    with pytest.raises(RuntimeError, match=message):
+        run_closures(src)
+    with pytest.raises(RuntimeError, match=message):
+        run_source(src)
+
+def test_deep_recursion():
+    src = """
+fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); }
+fn count(n, acc) { if n == 0 { return acc; } return count(n - 1, acc + n); }
+fn even(n) { if n == 0 { return 1; } return odd(n - 1); }
+fn odd(n) { if n == 0 { return 0; } return even(n - 1); }
+print(down(5000));
+print(count(50000, 0));
+print(even(50001));
+"""
+    assert run_closures(src)[1] == [5000, 1250025000, 0]
+    # tail calls do not count against the limit
+    assert run_closures(src.replace("5000)", "50)"), max_depth=100)[1] == [50, 1250025000, 0]
+
+def test_recursion_limit_is_an_axon_error():
+    src = "fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); } print(down(100));"
+    with pytest.raises(RuntimeError, match=r"RecursionError: maximum call depth exceeded in down\(\)"):
+        run_closures(src, max_depth=50)
+    assert run_closures(src, max_depth=101)[1] == [100]
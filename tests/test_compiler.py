@@ -0,0 +1,113 @@
+import pytest
+from array import array
+from axon.compiler import LABEL, Label, build_cfg, compile_program, disassemble, linearize, remove_dead_blocks, ConstPool
+from axon.opcodes import CONST, JUMP, JUMP_IF_FALSE, POP_TOP, RETURN
+from axon.parser import parse_text
+
+def test_code_is_flat_word_array():
+    co = compile_program(parse_text("let x = 1 + 2;"))
+    assert isinstance(co.code, array)
+    assert disassemble(co) == [
+        ("CONST", 0), ("CONST", 1), ("BINARY_ADD", 0), ("STORE_NAME", 0),
+    ]
+
+def test_constants_and_names_are_interned():
+    co = compile_program(parse_text("""
+let x = 1;
+fn f() { return; }
+fn g() { return; }
+while x < 3 { x = x + 1; print(1); }
+"""))
+    # None from both returns and 1 from every literal share one slot each
+    assert co.consts.count(None) == 1
+    assert co.consts.count(1) == 1
+    assert co.names == ["x"]
+
+def test_pool_keeps_equal_but_distinct_types_apart():
+    pool = ConstPool()
+    idx = {pool.add_const(v) for v in (1, 1.0, True, 0.0, -0.0)}
+    assert len(idx) == 5
+    assert pool.add_const(1.0) == pool.add_const(1.0)
+
+def test_superinstructions_for_common_sequences():
+    co = compile_program(parse_text("""
+let i = 0;
+let n = 10;
+while i < n { i = i + 1; }
+fn f(a, b) { let c = a + b; c = c + 1; return c * 2; }
+"""))
+    assert [op for op, _ in disassemble(co)] == [
+        "CONST", "STORE_NAME", "CONST", "STORE_NAME",
+        "LOAD_NAME_PAIR", "COMPARE_LT_JUMP", "INC_NAME", "JUMP",
+        "MAKE_FUNCTION",
+    ]
+    fn = co.consts[disassemble(co)[-1][1]]
+    assert [op for op, _ in disassemble(fn)] == [
+        "LOAD_FAST_PAIR", "BINARY_ADD", "STORE_FAST", "INC_FAST",
+        "LOAD_FAST_CONST", "BINARY_MUL", "RETURN",
+    ]
+
+def test_labels_resolve_and_dead_blocks_go():
+    skip, end = Label(), Label()
+    code = [
+        (CONST, 0), (JUMP_IF_FALSE, skip),
+        (CONST, 1), (RETURN, 0),
+        (CONST, 2), (POP_TOP, 0),           # after RETURN, no label: dead
+        (LABEL, skip), (CONST, 3), (JUMP, end),
+        (LABEL, end), (CONST, 4), (RETURN, 0),
+    ]
+    blocks = build_cfg(code)
+    assert [len(b.instrs) for b in blocks] == [2, 2, 2, 2, 2, 0]
+    # the dead block is dropped and the JUMP to the next block disappears
+    assert linearize(remove_dead_blocks(blocks)) == [
+        (CONST, 0), (JUMP_IF_FALSE, 3), (CONST, 1), (RETURN, 0), (CONST, 3), (CONST, 4), (RETURN, 0),
+    ]
+
+def test_if_else_and_code_after_return_leave_no_dead_jumps():
+    co = compile_program(parse_text("""
+fn sign(x) {
+    if x < 0 { return -1; } else if x == 0 { return 0; } else { return 1; }
+    print("unreachable");
+}
+"""))
+    fn = co.consts[disassemble(co)[-1][1]]
+    assert [op for op, _ in disassemble(fn)] == [
+        "LOAD_FAST_CONST", "COMPARE_LT_JUMP", "CONST", "UNARY_NEG", "RETURN",
+        "LOAD_FAST_CONST", "COMPARE_EQ_JUMP", "CONST", "RETURN",
+        "CONST", "RETURN",
+    ]
+
+def test_short_circuit_jumps():
+    co = compile_program(parse_text("let a = 1; let b = a and 2 or 3; if a > 1 or not a { print(b); }"))
+    assert [op for op, _ in disassemble(co)] == [
+        "CONST", "STORE_NAME",
+        "LOAD_NAME", "JUMP_IF_FALSE_OR_POP", "CONST", "JUMP_IF_TRUE_OR_POP", "CONST", "STORE_NAME",
+        # `or` in a condition: either operand jumps into the body, neither builds a value
+        "LOAD_NAME_CONST", "COMPARE_GT", "JUMP_IF_TRUE", "LOAD_NAME", "JUMP_IF_TRUE",
+        "LOAD_NAME", "PRINT",
+    ]
+
+def test_break_and_continue_jump_to_their_loop():
+    co = compile_program(parse_text("""
+let i = 0;
+while i < 10 {
+    i = i + 1;
+    if i == 2 { continue; }
+    while 1 { break; }
+    if i == 5 { break; }
+}
+"""))
+    assert [(op, arg) for op, arg in disassemble(co) if "JUMP" in op] == [
+        ("COMPARE_LT_JUMP", 11),   # -> end
+        ("COMPARE_EQ_JUMP", 2),
+        ("JUMP", -5),              # continue -> condition
+        ("JUMP_IF_FALSE", 1),      # `while 1`: its break is a jump to the next instruction, dropped
+        ("COMPARE_EQ_JUMP", 2),
+        ("JUMP", 2),               # break -> end
+        ("JUMP", -11),             # loop back
+    ]
+
+@pytest.mark.parametrize("src", ["break;", "fn f() { continue; }", "while 1 { fn g() { break; } }"])
+def test_break_outside_loop(src):
+    with pytest.raises(Exception, match="outside loop"):
+        compile_program(parse_text(src))
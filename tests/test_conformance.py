@@ -0,0 +1,144 @@
+import os
+import pytest
+from axon.cache import compile_source
+from axon.closures import ClosureEngine
+from axon.ngrams import corpus_files
+from axon.nodes import *
+from axon.parser import parse_text
+from axon.transpiler import TranspiledEngine, transpile
+from axon.vm import VM
+
+EXAMPLES = corpus_files([os.path.join(os.path.dirname(__file__), os.pardir, "examples")])
+
+def run_vm(src, optimize=0, **vm_options):
+    out = []
+    vm = VM(**vm_options)
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_source(src.encode(), optimize))
+    vm.run()
+    return out
+
+def run_engine(engine, prog):
+    out = []
+    engine.globals["print"] = out.append
+    engine.run(parse_text(prog) if isinstance(prog, str) else prog)
+    return out
+
+def run_tree(src):
+    out = []
+    interpret(parse_text(src), Environment(vars=dict(BUILTINS, print=out.append)))
+    return out
+
+def test_examples_found():
+    assert len(EXAMPLES) >= 3
+
+@pytest.mark.parametrize("path", EXAMPLES, ids=os.path.basename)
+def test_example_runs_the_same_on_every_tier(path):
+    with open(path, encoding="utf-8") as f:
+        src = f.read()
+    expected = run_vm(src, tier=False)
+    assert expected, "example prints nothing"
+    assert run_vm(src, optimize=1) == run_vm(src, optimize=2) == expected
+    assert run_vm(src, tier_threshold=1) == expected
+    assert run_engine(TranspiledEngine(), src) == expected
+    assert run_engine(ClosureEngine(), src) == expected
+    assert run_tree(src) == expected
+
+def test_and_or_short_circuit_on_every_engine():
+    src = """
+let calls = 0;
+fn touch() { calls = calls + 1; return calls; }
+let i = 0;
+while i < 4 {
+    let a = i > 1 and touch();
+    let b = i < 3 or touch();
+    if i == 0 or touch() > 100 { print(a); }
+    if not (i < 2 and touch() == 0) { print(b); }
+    i = i + 1;
+}
+print(calls);
+"""
+    expected = [False, True, True, True, 7, 8]
+    assert "((i > 1) and touch())" in transpile(parse_text(src))
+    assert run_vm(src, tier=False) == run_vm(src, optimize=1) == run_vm(src, tier_threshold=1) == expected
+    assert run_engine(TranspiledEngine(), src) == run_engine(ClosureEngine(), src) == expected
+    assert run_tree(src) == expected
+
+def test_python_keywords_as_names():
+    src = """
+fn pass(class) { let None = class * 2; return None; }
+let lambda = pass(21);
+print(lambda);
+"""
+    engine = TranspiledEngine()
+    assert run_engine(engine, src) == run_vm(src) == [42]
+    assert engine.globals["__ax_lambda"] == 42
+
+def test_for_break_continue():
+    src = """
+fn count(xs) {
+    let n = 0;
+    for x in xs { n = n + 1; }
+    return n;
+}
+for i = 0 to 10 { if i % 3 == 0 { continue; } if i > 7 { break; } print(i); }
+for i = 6 to count([1, 2]) step -2 { print(i); }
+for k in ({"x": 1, "y": 2}) { print(k); }
+"""
+    expected = [1, 2, 4, 5, 7, 6, 4, "x", "y"]
+    assert run_vm(src, tier=False) == run_vm(src, optimize=1) == run_vm(src, tier_threshold=1) == expected
+    assert run_engine(TranspiledEngine(), src) == run_engine(ClosureEngine(), src) == expected
+    assert run_tree(src) == expected
+
+@pytest.mark.parametrize("src, message", [
+    ("print(missing);", "name 'missing' is not defined"),
+    ("fn f(a) { return a; } f(1, 2);", r"f\(\) takes 1 arguments but 2 were given"),
+    ("fn f(a, b) { return a; } f(1);", r"f\(\) takes 2 arguments but 1 were given"),
+    ("nope(1);", "function 'nope' is not defined"),
+    ("fn f() { print(x); let x = 1; } f();", "local variable 'x' referenced before assignment"),
+])
+def test_runtime_errors_match_vm(src, message):
+    with pytest.raises(RuntimeError, match=message):
+        run_vm(src)
+    with pytest.raises(RuntimeError, match=message):
+        run_engine(TranspiledEngine(), src)
+
+def test_deep_recursion_on_every_engine():
+    src = """
+fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); }
+print(down(5000));
+"""
+    assert run_vm(src) == run_engine(ClosureEngine(), src) == run_engine(TranspiledEngine(), src) == [5000]
+    assert run_tree(src) == [5000]
+    message = r"RecursionError: maximum call depth exceeded in down\(\)"
+    for engine in (ClosureEngine(max_depth=1000), TranspiledEngine(max_depth=1000)):
+        with pytest.raises(RuntimeError, match=message):
+            run_engine(engine, src)
+    with pytest.raises(RuntimeError, match=message):
+        run_vm(src, max_depth=1000)
+
+def test_nested_functions_read_globals_not_enclosing_locals():
+    src = """
+fn outer() {
+    let x = 1;
+    fn inner() { return x; }
+    return inner();
+}
+let x = 99;
+print(outer());
+"""
+    # the compiled engines resolve names like the compiler's Scope; the tree
+    # engine's environments are lexical (a call's parent is where the fn was defined)
+    assert run_vm(src) == run_engine(ClosureEngine(), src) == run_engine(TranspiledEngine(), src) == [99]
+    assert "global x" in transpile(parse_text(src))
+
+def test_long_operator_chains():
+    src = f"""
+fn f(n) {{ return {' + '.join(['n'] * 300)} - n * 2 * 3; }}
+print(f(2));
+print({' and '.join(['1 < 2'] * 300)});
+"""
+    expected = [588, True]
+    assert run_vm(src) == run_engine(ClosureEngine(), src) == run_engine(TranspiledEngine(), src) == expected
+    assert run_tree(src) == expected
+    assert "(n + n + n" in transpile(parse_text(src))
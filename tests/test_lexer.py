@@ -0,0 +1,66 @@
+import pytest
+import io
+from axon.compiler import CodeObject, compile_program, disassemble
+from axon.lexer import TokenStream, tokenize
+from axon.parser import parse_stream, parse_text
+
+def kinds(src):
+    return [(t.type, t.value) for t in tokenize(src)]
+
+def test_keywords_and_word_operators_are_classified_after_matching():
+    assert kinds("let letter = not android and fn;") == [
+        ("LET", "let"), ("IDENT", "letter"), ("OP", "="), ("OP", "not"),
+        ("IDENT", "android"), ("OP", "and"), ("FUNCTION", "fn"), ("SEMICOLON", ";"),
+    ]
+
+def test_numbers_strings_and_comments():
+    src = 'x = 1.5 + 2; // trailing\n// whole line\ny = "a\\"b\\né中" ; // eof'
+    assert kinds(src) == [
+        ("IDENT", "x"), ("OP", "="), ("NUMBER", 1.5), ("OP", "+"), ("NUMBER", 2), ("SEMICOLON", ";"),
+        ("IDENT", "y"), ("OP", "="), ("STRING", 'a"b\né中'), ("SEMICOLON", ";"),
+    ]
+
+def test_positions_resolve_to_line_and_column_lazily():
+    src = "let a = 1;\r\n  print(a);\n"
+    stream = TokenStream(src)
+    tokens = list(stream)
+    assert stream.line_col(tokens[0].pos) == (1, 1)
+    assert stream.line_col(tokens[5].pos) == (2, 3)
+
+def test_errors_report_line_and_column():
+    with pytest.raises(SyntaxError, match=r"Unexpected '@' at line 2, col 5"):
+        tokenize("x;\nx = @;")
+    with pytest.raises(SyntaxError, match="Unexpected '\"'"):
+        tokenize('x = "open')
+
+STREAM_SRC = """
+let s = "multi
+line é";  // comment
+let xs = [1, 2.5, "three"];
+fn f(a) { return a * 2; }
+print(f(21));
+""" * 50
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_stream_matches_string_tokens(chunk_size):
+    expected = [(t.type, t.value, t.pos) for t in tokenize(STREAM_SRC)]
+    text = [(t.type, t.value, t.pos) for t in TokenStream(io.StringIO(STREAM_SRC), chunk_size)]
+    raw = [(t.type, t.value, t.pos) for t in TokenStream(io.BytesIO(STREAM_SRC.encode()), chunk_size)]
+    assert text == raw == expected
+
+def test_parse_stream_from_mmap(tmp_path):
+    import mmap
+    p = tmp_path / "big.ax"
+    p.write_text(STREAM_SRC, encoding="utf-8")
+    with open(p, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        streamed = parse_stream(mm, chunk_size=100)
+    a, b = compile_program(streamed), compile_program(parse_text(STREAM_SRC))
+    values = lambda co: [c for c in co.consts if not isinstance(c, CodeObject)]
+    assert disassemble(a) == disassemble(b) and values(a) == values(b)
+
+def test_stream_errors_keep_their_location():
+    src = "let a = 1;\n" * 40 + "let b = @;"
+    with pytest.raises(SyntaxError, match="line 41, col 9"):
+        list(TokenStream(io.StringIO(src), 16))
+    with pytest.raises(Exception, match=r"line 41, col 11"):
+        parse_stream(io.StringIO("let a = 1;\n" * 40 + "let b = 1 2;"), 16)
@@ -0,0 +1,32 @@
+from axon.cache import compile_source
+from axon.compiler import compile_program
+from axon.ngrams import corpus_ngrams, dynamic_ngrams, static_ngrams
+from axon.parser import parse_text
+
+SRC = """
+let i = 0;
+let total = 0;
+while i < 10 {
+    total = total + i;
+    i = i + 1;
+}
+"""
+
+def test_static_counts_each_instruction_once():
+    counts = static_ngrams(compile_program(parse_text(SRC)), n=2)
+    assert counts[("LOAD_NAME_PAIR", "BINARY_ADD")] == 1
+    assert counts[("BINARY_ADD", "STORE_NAME")] == 1
+
+def test_dynamic_counts_follow_execution():
+    counts = dynamic_ngrams(compile_program(parse_text(SRC)), n=2)
+    assert counts[("LOAD_NAME_PAIR", "BINARY_ADD")] == 10
+    # the back edge ends a sequence: nothing counts across a taken jump
+    assert counts[("JUMP", "LOAD_NAME_PAIR")] == 0
+    assert counts[("LOAD_NAME_CONST", "COMPARE_LT_JUMP")] == 11
+
+def test_corpus_skips_broken_scripts(tmp_path, capsys):
+    (tmp_path / "ok.ax").write_text(SRC)
+    (tmp_path / "bad.ax").write_text("let = ;")
+    counts = corpus_ngrams([str(tmp_path)], n=3, static=True)
+    assert counts == static_ngrams(compile_source(SRC.encode()), n=3)
+    assert "bad.ax" in capsys.readouterr().err
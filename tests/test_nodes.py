@@ -0,0 +1,109 @@
+import pytest
+import sys
+from axon.nodes import *
+from axon.parser import parse_text
+
+def run_tree(src, env=None):
+    out = []
+    if env is None:
+        env = Environment(vars=dict(BUILTINS))
+    env.vars["print"] = out.append
+    env = interpret(parse_text(src) if isinstance(src, str) else src, env)
+    return env, out
+
+def test_missing_name_raises():
+    with pytest.raises(RuntimeError, match="name 'missing' is not defined"):
+        run_tree("print(missing + 1);")
+
+def test_return_unwinds_from_loops():
+    env, out = run_tree("""
+fn first_square_over(limit) {
+    let i = 0;
+    while 1 {
+        if i * i > limit { return i; }
+        i = i + 1;
+    }
+    print("unreachable");
+}
+print(first_square_over(50));
+""")
+    assert out == [8]
+
+def test_break_leaves_the_loop():
+    # while i < 10 { i = i + 1; if i == 3 { break; } }
+    i = VariableNode("i")
+    env, _ = run_tree([
+        LetNode("i", NumberNode(0)),
+        WhileNode(BinOpNode(i, "<", NumberNode(10)), [
+            LetNode("i", BinOpNode(i, "+", NumberNode(1)), declare=False),
+            IfNode([(BinOpNode(i, "==", NumberNode(3)), [BreakNode()])]),
+        ]),
+    ])
+    assert env.vars["i"] == 3
+
+def test_call_frame_holds_only_params_and_locals():
+    env = Environment(vars=dict(BUILTINS, **{f"g{n}": n for n in range(5000)}))
+    env, out = run_tree("""
+let total = 0;
+fn add(x) {
+    let doubled = x * 2;
+    total = total + doubled;
+    return doubled;
+}
+print(add(3) + add(4));
+print(total);
+""", env)
+    assert out == [14, 14]
+    # locals stayed in the call's frame, the bare assignment reached the global
+    assert "doubled" not in env.vars and "x" not in env.vars
+
+def test_recursion_and_builtins():
+    env, out = run_tree("""
+fn fib(n) {
+    if n < 2 { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+print(fib(15));
+print(len([1, 2, 3]) % 2);
+print(type("s"));
+""")
+    assert out == [610, 1, "str"]
+
+def test_arity_error():
+    with pytest.raises(RuntimeError, match=r"f\(\) takes 1 arguments but 2 were given"):
+        run_tree("fn f(a) { return a; } f(1, 2);")
+
+def test_tail_calls_need_no_python_stack():
+    env, out = run_tree("""
+fn count(n, acc) {
+    if n == 0 { return acc; }
+    return count(n - 1, acc + n);
+}
+fn even(n) { if n == 0 { return 1; } return odd(n - 1); }
+fn odd(n) { if n == 0 { return 0; } return even(n - 1); }
+print(count(20000, 0));
+print(even(10001));
+""")
+    assert out == [200010000, 0]
+
+def test_deep_recursion_raises_an_axon_error():
+    src = "fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); } print(down(100000));"
+    with pytest.raises(RuntimeError, match=r"RecursionError: maximum call depth exceeded in down\(\)"):
+        run_tree(src)
+    with pytest.raises(RuntimeError, match="RecursionError"):
+        interpret(parse_text(src.replace("100000", "50")), max_depth=20)
+    assert run_tree(src.replace("100000", "50"))[1] == [50]
+
+def test_non_tail_recursion_past_the_python_limit():
+    src = """
+fn down(n) {
+    if n == 0 { return 0; }
+    let rest = 0;
+    while rest == 0 { rest = 1 + down(n - 1); }
+    return rest;
+}
+print(down(20000));
+"""
+    limit = sys.getrecursionlimit()
+    assert run_tree(src)[1] == [20000]
+    assert sys.getrecursionlimit() == limit
@@ -0,0 +1,101 @@
+import pytest
+from axon.compiler import compile_program, disassemble
+from axon.optimizer import optimize
+from axon.parser import parse_text
+from axon.vm import VM, DISPATCH_ENGINES
+
+def compiled(src, level=1):
+    co = compile_program(parse_text(src))
+    stats = optimize(co, level)
+    return co, stats
+
+def run_co(co, dispatch="table"):
+    out = []
+    vm = VM(dispatch=dispatch)
+    vm.globals["print"] = out.append
+    vm.push_frame(co)
+    vm.run()
+    return out
+
+def test_constant_folding():
+    co, stats = compiled("let x = 1 + 2 * 3 - -4;")
+    assert disassemble(co) == [("CONST", co.consts.index(11)), ("STORE_NAME", 0)]
+    assert stats.removed == 7
+
+def test_division_by_zero_is_left_for_runtime():
+    co, _ = compiled("let x = 1 / 0;")
+    assert [op for op, _ in disassemble(co)] == ["CONST", "CONST", "BINARY_DIV", "STORE_NAME"]
+
+@pytest.mark.parametrize("src", [
+    'let s = "x" * 100000000;',
+    'let s = 100000000 * "xy";',
+    "let n = 340282366920938463463374607431768211455 * 340282366920938463463374607431768211455;",
+    'let s = "%0100000000d" % 5;',
+])
+def test_huge_results_are_not_folded(src):
+    co, stats = compiled(src)
+    assert "folded" not in stats.passes and "BINARY_" in " ".join(op for op, _ in disassemble(co))
+
+def test_constant_literals_build_fresh_containers():
+    co, _ = compiled('let a = [1, 2]; let b = [1, 2]; let d = {"k": [1, 2]}; print(a);')
+    ops = [op for op, _ in disassemble(co)]
+    assert "BUILD_LIST" not in ops and ops.count("BUILD_LIST_CONST") == 3
+    vm = VM()
+    vm.globals["print"] = lambda v: None
+    vm.push_frame(co)
+    vm.run()
+    assert vm.globals["a"] == [1, 2] and vm.globals["a"] is not vm.globals["b"]
+    assert vm.globals["d"] == {"k": [1, 2]}
+
+def test_dead_store():
+    co, stats = compiled("let x = 1; x = 2; print(x);")
+    assert disassemble(co) == [
+        ("CONST", co.consts.index(2)), ("STORE_NAME", 0), ("LOAD_NAME", 0), ("PRINT", 0),
+    ]
+    assert stats.passes["dead_stores"] == 1
+
+def test_compare_jump_fusion_and_constant_branch():
+    co, _ = compiled("""
+let i = 0;
+while i < 3 { i = i + 1; }
+while 1 == 2 { print(i); }
+""")
+    ops = [op for op, _ in disassemble(co)]
+    assert "COMPARE_LT_JUMP" in ops
+    assert "JUMP_IF_FALSE" not in ops and "PRINT" not in ops
+
+def test_short_circuit_chains_and_constant_operands():
+    co, stats = compiled("""
+let a = 0;
+let x = a and a > 1 and a < 5;
+let y = 0 and a;
+let z = 1 or a;
+""")
+    ops = disassemble(co)
+    # a falsy `a` skips straight past the whole chain
+    first = ops.index(("JUMP_IF_FALSE_OR_POP", ops[3][1]))
+    assert first + ops[first][1] == ops.index(("STORE_NAME", 1))
+    assert stats.passes["branches"] == 2
+    assert run_co(co) == [] and ops[-4:] == [
+        ("CONST", co.consts.index(0)), ("STORE_NAME", 2), ("CONST", co.consts.index(1)), ("STORE_NAME", 3),
+    ]
+
+SRC = """
+let i = 0;
+let total = 0;
+let cfg = {"limit": 10, "step": 2};
+while i < cfg["limit"] {
+    if i % 3 == 0 { total = total + i * 2; } else { total = total - 1; }
+    if 2 > 1 { total = total + 0; }
+    i = i + cfg["step"] - 1;
+}
+print(total);
+print([1, 2 + 3, "a" + "b"]);
+"""
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_optimized_program_behaves_the_same(dispatch):
+    plain = compile_program(parse_text(SRC))
+    co, stats = compiled(SRC)
+    assert stats.removed > 0
+    assert run_co(co, dispatch) == run_co(plain, dispatch) == [30, [1, 5, "ab"]]
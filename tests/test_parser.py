@@ -0,0 +1,76 @@
+import pytest
+from axon.nodes import (
+    BinOpNode, CallNode, ForInNode, ForNode, IndexNode, NumberNode, ReturnNode, UnaryOpNode, VariableNode,
+)
+from axon.parser import ParseError, parse_text
+
+def show(node):
+    """Fully parenthesized rendering of an expression tree."""
+    if isinstance(node, BinOpNode):
+        return f"({show(node.left)} {node.op} {show(node.right)})"
+    if isinstance(node, UnaryOpNode):
+        return f"({node.op} {show(node.expr)})"
+    if isinstance(node, NumberNode):
+        return str(node.value)
+    if isinstance(node, VariableNode):
+        return node.name
+    if isinstance(node, CallNode):
+        return f"{node.name}({', '.join(show(a) for a in node.args)})"
+    if isinstance(node, IndexNode):
+        return f"{show(node.collection)}[{show(node.index)}]"
+    return type(node).__name__
+
+def expr(src):
+    return show(parse_text(f"let v = {src};")[0].expr)
+
+@pytest.mark.parametrize("src, tree", [
+    ("1 + 2 * 3", "(1 + (2 * 3))"),
+    ("1 - 2 - 3", "((1 - 2) - 3)"),
+    ("8 / 4 % 3 * 2", "(((8 / 4) % 3) * 2)"),
+    ("a < b == c", "((a < b) == c)"),
+    ("a or b and c or d", "((a or (b and c)) or d)"),
+    ("-a * b", "((- a) * b)"),
+    ("not a == b", "((not a) == b)"),
+    ("(1 + 2) * f(x, y - 1)", "((1 + 2) * f(x, (y - 1)))"),
+    ("xs[i + 1][j] + 1", "(xs[(i + 1)][j] + 1)"),
+])
+def test_precedence_and_associativity(src, tree):
+    assert expr(src) == tree
+
+def test_empty_expression_is_none():
+    stmt = parse_text("fn f() { return; }")[0].body[0]
+    assert isinstance(stmt, ReturnNode) and stmt.expr is None
+
+def test_deep_nesting():
+    depth = 200
+    assert expr("(" * depth + "1" + ")" * depth) == "1"
+
+def test_unbalanced_parenthesis():
+    with pytest.raises(ParseError, match="Expected '\\)'"):
+        parse_text("let v = (1 + 2;")
+
+def test_for_loops():
+    counted, stepped, each = parse_text("""
+for i = 0 to n + 1 { print(i); }
+for i = n to 0 step -2 { }
+for key in table[0] { print(key); }
+""")
+    assert isinstance(counted, ForNode) and counted.var_name == "i" and counted.step_expr is None
+    assert (show(counted.start_expr), show(counted.end_expr), len(counted.body)) == ("0", "(n + 1)", 1)
+    assert show(stepped.step_expr) == "(- 2)"
+    assert isinstance(each, ForInNode) and each.var_name == "key" and show(each.iter_expr) == "table[0]"
+
+def test_for_loop_needs_to():
+    with pytest.raises(ParseError, match="Expected 'to'"):
+        parse_text("for i = 0, 5 { }")
+
+def test_type_annotations():
+    let, fn, plain = parse_text("let n: int = 1; fn f(a, b: list) { } fn g(a) { }")
+    assert (let.name, let.type_name, show(let.expr)) == ("n", "int", "1")
+    assert fn.params == ["a", "b"] and fn.param_types == [None, "list"]
+    assert plain.param_types is None and parse_text("x = 2;")[0].type_name is None
+
+@pytest.mark.parametrize("src", ["let n: number = 1;", "fn f(a:) { }", "let n: = 1;"])
+def test_unknown_annotation_type(src):
+    with pytest.raises(ParseError, match="Expected a type"):
+        parse_text(src)
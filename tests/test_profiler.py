@@ -0,0 +1,91 @@
+import pytest
+from axon.compiler import compile_program
+from axon.opcodes import OPMAP
+from axon.parser import parse_text
+from axon.profiler import Profiler
+from axon.run import main
+from axon.vm import VM
+
+FIB = """
+fn fib(n) {
+    if n < 2 { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+fn count(n) { if n == 0 { return 0; } return count(n - 1); }
+print(fib(12));
+print(count(10));
+"""
+
+def profile(src, mode="trace", **options):
+    out = []
+    vm = VM(tier=False)
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_program(parse_text(src)))
+    profiler = Profiler(mode, **options)
+    vm.run(profiler)
+    return profiler, out
+
+def test_trace_counts_opcodes_and_calls():
+    p, out = profile(FIB)
+    assert out == [144, 0]
+    assert p.op_counts[OPMAP["PRINT"]] == 2
+    assert p.op_counts[OPMAP["CALL_FUNCTION"]] == 465 + 1
+    # a tail call is a call of its callee, in the caller's place on the stack
+    assert p.calls == {"__main__": 1, "fib": 465, "count": 11}
+    assert p.op_counts[OPMAP["TAIL_CALL"]] == 10
+    assert ("__main__", "count") in p.stacks and ("__main__", "count", "count") not in p.stacks
+    for name in p.calls:
+        assert p.inclusive[name] >= p.exclusive[name] > 0
+    assert p.inclusive["__main__"] >= p.inclusive["fib"] + p.inclusive["count"]
+
+def test_collapsed_stacks():
+    p, _ = profile(FIB)
+    lines = p.collapsed().splitlines()
+    assert "__main__;fib;fib;fib" in {line.rsplit(" ", 1)[0] for line in lines}
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    # exclusive time of every call, and nothing else
+    assert sum(p.stacks.values()) == sum(p.exclusive.values())
+
+def test_trace_closes_calls_on_error():
+    with pytest.raises(RuntimeError, match="missing"):
+        profile("fn f() { return missing; } f();")
+
+def test_sample_mode_records_the_axon_stack():
+    src = "fn spin(n) { let i = 0; while i < n { i = i + 1; } return i; } print(spin(300000));"
+    p, out = profile(src, "sample", interval=0.0005)
+    assert out == [300000]
+    assert p.samples > 0 and sum(p.stacks.values()) == p.samples
+    assert all(stack[0] == "__main__" for stack in p.stacks)
+    assert "spin" in p.report()
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Profiler("bogus")
+
+def test_cli_profile(tmp_path, capsys):
+    script = tmp_path / "fib.ax"
+    script.write_text(FIB)
+    folded = tmp_path / "fib.folded"
+    main([str(script), "--no-cache", "--profile", "--profile-out", str(folded)])
+    err = capsys.readouterr().err
+    assert "profile (trace)" in err and "CALL_FUNCTION" in err
+    assert folded.read_text().startswith("__main__ ")
+
+def test_cli_profile_needs_the_vm(tmp_path):
+    script = tmp_path / "fib.ax"
+    script.write_text(FIB)
+    for engine in ("tree", "closure", "python"):
+        with pytest.raises(SystemExit):
+            main([str(script), "--no-cache", "--engine", engine, "--profile"])
+    with pytest.raises(SystemExit):
+        main([str(script), "--no-cache", "--profile-out", str(tmp_path / "fib.folded")])
+
+def test_cli_profile_reports_a_failing_run(tmp_path, capsys):
+    script = tmp_path / "boom.ax"
+    script.write_text(FIB + "print(fib(5) / count(3));\n")
+    folded = tmp_path / "boom.folded"
+    with pytest.raises(Exception):
+        main([str(script), "--no-cache", "--profile", "--profile-out", str(folded)])
+    err = capsys.readouterr().err
+    assert "profile (trace)" in err and "CALL_FUNCTION" in err
+    assert folded.read_text().startswith("__main__ ")
@@ -0,0 +1,29 @@
+from axon import repl
+
+def run_repl(monkeypatch, capsys, lines):
+    lines = iter(lines)
+
+    def fake_input(prompt):
+        try:
+            return next(lines)
+        except StopIteration:
+            raise EOFError from None
+    monkeypatch.setattr("builtins.input", fake_input)
+    repl.repl()
+    return capsys.readouterr().out.splitlines()[1:-2]
+
+def test_runtime_error_leaves_no_frame_behind(monkeypatch, capsys):
+    out = run_repl(monkeypatch, capsys, [
+        "let x = 1;",
+        "print(missing);",
+        'print("after");',
+        "fn f(n) { return n + missing; }",
+        "print(f(x));",
+        "print(x + 1);",
+    ])
+    assert out == [
+        "[!!] Runtime error: NameError: name 'missing' is not defined",
+        "after",
+        "[!!] Runtime error: NameError: name 'missing' is not defined",
+        "2",
+    ]
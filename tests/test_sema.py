@@ -0,0 +1,58 @@
+import pytest
+from axon.nodes import *
+from axon.parser import parse_text
+from axon.sema import SemanticError, analyze, runs_after
+
+SRC = """
+let g = 1;
+fn f(a) {
+    let b = a + g;
+    if a > 0 { let c = b; print(c); }
+    return b;
+}
+print(f(g));
+"""
+
+def test_scopes_follow_the_compiler():
+    prog = parse_text(SRC)
+    a = analyze(prog)
+    fn = prog[1]
+    scope = a.functions[fn]
+    assert sorted(scope.symbols) == ["a", "b", "c"]
+    assert sorted(a.globals()) == ["f", "g"]
+    assert a.callees(a.module) == ["f"]  # print(...) is a PrintNode
+
+def test_use_def():
+    prog = parse_text(SRC)
+    a = analyze(prog)
+    let_g, fn = prog[:2]
+    g = a.globals()["g"]
+    assert [d.node for d in g.defs] == [let_g]
+    assert len(g.uses) == 2 and {u.scope.name for u in g.uses} == {"f", "<module>"}
+    b = a.functions[fn].symbols["b"]
+    assert [d.node for d in b.defs] == [fn.body[0]]
+    assert len(b.uses) == 2
+    # the param is bound by the fn itself, before any statement of its body
+    assert a.functions[fn].symbols["a"].defs[0].index == -1
+
+def test_runs_after():
+    prog = parse_text(SRC)
+    a = analyze(prog)
+    g, b = a.globals()["g"], a.functions[prog[1]].symbols["b"]
+    # g is bound before f is defined, so also before f's body runs
+    assert all(runs_after(u, g.defs[0]) for u in g.uses)
+    assert all(runs_after(u, b.defs[0]) for u in b.uses)
+    c = a.functions[prog[1]].symbols["c"]
+    assert not runs_after(c.uses[0], c.defs[0])  # bound inside the if
+
+def test_reads_before_the_binding_or_in_loops_do_not_run_after_it():
+    prog = parse_text("fn f() { return x; } let x = 1; while x < 3 { let y = x; x = y + 1; } print(y);")
+    a = analyze(prog)
+    x, y = a.globals()["x"], a.globals()["y"]
+    assert not runs_after(x.uses[0], x.defs[0])
+    assert not any(runs_after(y.uses[-1], d) for d in y.defs)
+
+@pytest.mark.parametrize("src", ["break;", "fn f() { continue; }", "if 1 { break; }"])
+def test_break_outside_loop(src):
+    with pytest.raises(SemanticError, match="outside loop"):
+        analyze(parse_text(src))
@@ -0,0 +1,183 @@
+import pytest
+from array import array
+from axon.compiler import CodeObject, compile_program
+from axon.opcodes import BINARY_ADD_INT, CONST, JUMP, POP_TOP
+from axon.parser import parse_text
+from axon.tiers import NATIVE_DEPTH_LIMIT, Unsupported, translate
+from axon.vm import VM
+
+def run_source(src, **vm_options):
+    out = []
+    vm = VM(**vm_options)
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_program(parse_text(src)))
+    vm.run()
+    return vm, out
+
+FIB = """
+fn fib(n) {
+    if n < 2 { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+print(fib(18));
+"""
+
+def test_hot_function_is_promoted():
+    vm, out = run_source(FIB, tier_threshold=50)
+    assert out == run_source(FIB, tier=False)[1] == [2584]
+    assert vm.tier_stats()["promotions"] == 1
+
+def test_cold_code_stays_in_the_vm():
+    vm, out = run_source(FIB, tier_threshold=10**9)
+    assert out == [2584]
+    assert vm.tier_stats() == {"promotions": 0, "osr_entries": 0, "failures": 0}
+
+LOOP = """
+let i = 0;
+let total = 0;
+while i < 5000 {
+    total = total + i % 7;
+    i = i + 1;
+}
+print(total);
+"""
+
+def test_looping_frame_moves_to_tier2():
+    vm, out = run_source(LOOP, tier_threshold=100)
+    assert out == run_source(LOOP, tier=False)[1] == [sum(i % 7 for i in range(5000))]
+    assert vm.globals["i"] == 5000
+    assert vm.tier_stats()["osr_entries"] == 1
+    assert not vm.frames
+
+def test_for_loop_enters_tier2_with_its_iterators():
+    src = """
+let total = 0;
+for i = 0 to 3000 { for x in [1, 2] { total = total + i * x; } }
+print(total);
+"""
+    vm, out = run_source(src, tier_threshold=100)
+    assert out == run_source(src, tier=False)[1] == [sum(i * 3 for i in range(3000))]
+    assert vm.tier_stats()["osr_entries"] == 1
+    assert not vm.frames
+
+def test_tier2_stores_invalidate_vm_inline_caches():
+    # bump() runs in tier 2 while the loop reading `counter` is still in the VM
+    vm, out = run_source("""
+let counter = 0;
+fn bump() { counter = counter + 1; }
+let i = 0;
+let seen = 0;
+while i < 20 {
+    bump();
+    seen = seen + counter;
+    i = i + 1;
+}
+print(seen);
+""", tier_threshold=5)
+    assert out == [210]
+
+def test_deep_recursion_falls_back_to_vm_frames():
+    src = """
+fn down(n) {
+    if n == 0 { return 0; }
+    return 1 + down(n - 1);
+}
+print(down(3000));
+"""
+    assert 3000 > 10 * NATIVE_DEPTH_LIMIT
+    vm, out = run_source(src, tier_threshold=5)
+    assert out == [3000]
+    assert vm.native_depth == 0 and vm.base_depth == 0
+
+def test_runtime_errors_in_tier2_match_vm():
+    src = """
+fn pick(x) {
+    if x > 30 { return missing; }
+    return x;
+}
+let i = 0;
+while i < 40 { pick(i); i = i + 1; }
+"""
+    for options in ({"tier": False}, {"tier_threshold": 3}):
+        with pytest.raises(RuntimeError, match="name 'missing' is not defined"):
+            run_source(src, **options)
+
+def test_translation_keeps_locals_in_python_variables():
+    co = compile_program(parse_text(FIB))
+    fib = next(c for c in co.consts if isinstance(c, CodeObject))
+    source = translate(fib)
+    assert source.startswith("def tier2_fib(l0, pc=0):")
+    assert "(l0 < 2)" in source and "_call(G.get('fib'), 'fib', (l0 - 1))" in source
+
+def test_untranslatable_code_stays_in_the_vm():
+    # quickened forms only ever appear in a VM's private copy of the code
+    co = CodeObject(array("i", [CONST, 0, CONST, 0, BINARY_ADD_INT, 0, POP_TOP, 0, JUMP, -4]), [1], [], name="loop")
+    with pytest.raises(Unsupported):
+        translate(co)
+    vm = VM()
+    assert vm.promote(co) is None
+    assert vm.tier_stats()["failures"] == 1
+    # later calls/backedges do not retry the translation
+    assert vm._hot(co) is None and vm.tier_stats()["failures"] == 1
+
+def test_self_tail_calls_loop_in_tier2():
+    src = """
+fn count(n, acc) {
+    if n == 0 { return acc; }
+    let next = n - 1;
+    return count(next, acc + n);
+}
+print(count(100000, 0));
+"""
+    vm, out = run_source(src, tier_threshold=5)
+    assert out == [5000050000]
+    assert vm.tier_stats()["promotions"] == 1
+    source = translate(vm.globals["count"].code)
+    assert "if type(t1) is _Function and t1.code is CO:" in source
+    assert "    l2 = UNBOUND\n" in source and "pc = 0\n" in source
+
+def test_max_depth_counts_tier2_calls():
+    src = "fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); } print(down(500));"
+    with pytest.raises(RuntimeError, match="RecursionError: maximum call depth exceeded"):
+        run_source(src, tier_threshold=5, max_depth=50)
+
+def test_short_circuit_values_cross_blocks_in_tier2():
+    src = """
+fn pick(a, b, c) { return a and b or c; }
+let i = 0;
+while i < 4 {
+    print(pick(i % 2, i, "none"));
+    i = i + 1;
+}
+"""
+    vm, out = run_source(src, tier_threshold=2)
+    assert out == run_source(src, tier=False)[1] == ["none", 1, "none", 3]
+    source = translate(vm.globals["pick"].code)
+    assert "s0 = l0" in source and "return s0" in source
+
+def test_backedges_skip_unrelated_blocks():
+    prefix = "".join(f"if {k} > 500 {{ print({k}); }}\n" for k in range(200))
+    src = prefix + "let i = 0; let s = 0; while i < 3000 { s = s + i; i = i + 1; } print(s);"
+    vm, out = run_source(src, tier_threshold=100)
+    assert out == [sum(range(3000))] and vm.tier_stats()["osr_entries"] == 1
+    # a jump tests the halves of the code it falls in, not every block before its target
+    source = translate(compile_program(parse_text(src)))
+    tests = [line for line in source.splitlines() if line.lstrip().startswith("if pc")]
+    top = [line.strip() for line in tests if line.startswith("        if")]
+    assert len(top) == 2 and top[0].startswith("if pc < ") and top[1].startswith("if pc >= ")
+    # 400-odd blocks: about log2(400 / DISPATCH_LEAF) levels of halves
+    assert max(len(line) - len(line.lstrip()) for line in tests) // 4 <= 2 + 8
+
+def test_many_short_loops_do_not_make_code_hot():
+    src = "".join(f"let i{k} = 0; while i{k} < 10 {{ i{k} = i{k} + 1; }}\n" for k in range(300))
+    vm, _ = run_source(src + "let j = 0; while j < 50 { j = j + 1; }")
+    assert vm.tier_stats()["promotions"] == 0
+    vm, _ = run_source(src + "let j = 0; while j < 5000 { j = j + 1; }")
+    assert vm.tier_stats() == {"promotions": 1, "osr_entries": 1, "failures": 0}
+
+def test_code_python_cannot_compile_stays_in_the_vm():
+    # each operator adds a parenthesis level to the translation
+    src = f"fn f(n) {{ return {' + '.join(['n'] * 300)}; }} let i = 0; while i < 10 {{ i = i + 1; }} print([f(i)]);"
+    vm, out = run_source(src, tier_threshold=1)
+    assert out == run_source(src, tier=False)[1] == [[3000]]
+    assert vm.tier_stats()["failures"] == 1
@@ -0,0 +1,167 @@
+import pytest
+from axon import cache
+from axon.cache import compile_source
+from axon.closures import ClosureEngine
+from axon.compiler import CodeObject, disassemble
+from axon.nodes import *
+from axon.parser import parse_text
+from axon.tiers import translate
+from axon.transpiler import TranspiledEngine
+from axon.typecheck import StaticTypeError, check
+from axon.vm import VM
+
+def types_of(src):
+    prog = parse_text(src)
+    info = check(prog)
+    return prog, info
+
+def function(co, name):
+    return next(c for c in co.consts if isinstance(c, CodeObject) and c.name == name)
+
+def test_inferred_types():
+    prog, info = types_of("""
+let n: int = 2;
+let ratio = n / 4;
+let s = "ab" * n;
+let mixed = 1;
+mixed = "one";
+fn sq(x: int) { return x * x; }
+fn echo(x) { return x; }
+let all = [sq(n), echo(n), len(s), n < ratio, -n];
+""")
+    let_ratio, let_s, let_mixed, _, sq, echo, let_all = prog[1:]
+    assert [info.type_of(s.expr) for s in (let_ratio, let_s, let_mixed)] == ["float", "str", "int"]
+    assert [info.type_of(e) for e in let_all.expr.elements] == ["int", None, "int", "bool", "int"]
+    # mixed is an int and a str, so reading it has no type
+    assert info.type_of(sq.body[0].expr) == "int" and info.type_of(echo.body[0].expr) is None
+
+def test_loop_variables_and_recursion():
+    prog, info = types_of("""
+fn fact(n: int) { if n < 2 { return 1; } return n * fact(n - 1); }
+let total = 0;
+for i = 0 to 10 { total = total + i; }
+for c in "abc" { print(c + "!"); }
+let f = fact(5);
+""")
+    assert info.type_of(prog[2].body[0].expr) == "int"
+    assert info.type_of(prog[3].body[0].expr) == "str"
+    assert info.type_of(prog[4].expr) == "int"
+
+def test_globals_are_typed_only_after_their_binding():
+    # before `let g`, g is whatever the host bound
+    check(parse_text('fn f() { return g + 1; } let g = "a";'))
+    with pytest.raises(StaticTypeError, match="for \\+: 'str' and 'int' \\(in fn f\\)"):
+        check(parse_text('let g = "a"; fn f() { return g + 1; }'))
+
+@pytest.mark.parametrize("src, message", [
+    ('let x = "a" + 1;', "unsupported operand type\\(s\\) for \\+: 'str' and 'int'"),
+    ("let x = [1] * 2.0;", "unsupported operand type\\(s\\) for \\*: 'list' and 'float'"),
+    ('if 1 < "2" { }', "'<' not supported between instances of 'int' and 'str'"),
+    ('let x = -"a";', "bad operand type for unary -: 'str'"),
+    ("let n = 5; print(n[0]);", "'int' object is not subscriptable"),
+    ('let xs = [1]; print(xs["a"]);', "list indices must be integers, not 'str'"),
+    ("let d = {[1]: 2};", "unhashable type: 'list'"),
+    ("for i = 0 to 2.5 { }", "for loop bounds must be integers, got float"),
+    ("for x in 5 { }", "cannot iterate over int"),
+    ("print(len(3));", "object of type 'int' has no len\\(\\)"),
+    ("let x: int = 1.5;", "x must be int, got float \\(in <module>\\)"),
+    ("let b: int = True;", "b must be int, got bool"),
+    ('fn f(n: int) { return n; } f("1");', "f\\(\\) argument n must be int, got str"),
+    ('fn f() { let s = "a"; return s - 1; }', "for -: 'str' and 'int' \\(in fn f\\)"),
+])
+def test_static_type_errors(src, message):
+    with pytest.raises(StaticTypeError, match=message):
+        check(parse_text(src))
+
+def test_static_errors_fail_before_the_script_runs():
+    src = 'print("started"); let s = "x" - 1;'
+    for level in (0, 1, 2):
+        with pytest.raises(StaticTypeError):
+            compile_source(src.encode(), level)
+
+@pytest.mark.parametrize("src", [
+    "let n = missing + 1;",              # a host value: any type
+    'fn f(a) { return a + 1; } f("x");',  # an unannotated param: any type
+    "let xs = [1, 2.5]; let y = xs[0] * 2;",
+    'let s = "%d" % 5;',
+    "len(1, 2);",                        # arity is left to run time
+])
+def test_unknown_types_are_not_errors(src):
+    check(parse_text(src))
+
+def test_proven_annotations_need_no_check():
+    co = compile_source(b"""
+fn total(xs: list, n: int) {
+    let s: int = 0;
+    let first: int = xs[0];
+    for i = 0 to n { s = s + i; }
+    return s + first;
+}
+let t: int = total([1], 3);
+let u: float = t / 2;
+""")
+    assert [op for op, _ in disassemble(co)].count("CHECK_TYPE") == 0
+    ops = [op for op, _ in disassemble(function(co, "total"))]
+    # the two params on entry, and the item of a list, whose type is not known
+    assert ops.count("CHECK_TYPE") == 3
+
+def run_everywhere(src):
+    """Output (or error message) on the VM in and out of tier 2, and on the AST engines."""
+    results = []
+
+    def record(run):
+        out = []
+        try:
+            run(out)
+        except RuntimeError as e:
+            out.append(str(e))
+        results.append(out)
+
+    def vm(options):
+        def run(out):
+            v = VM(**options)
+            v.globals["print"] = out.append
+            v.push_frame(compile_source(src.encode()))
+            v.run()
+        return run
+
+    def engine(cls):
+        def run(out):
+            e = cls()
+            e.globals["print"] = out.append
+            e.run(parse_text(src))
+        return run
+
+    record(vm({"tier": False}))
+    record(vm({"tier_threshold": 1}))
+    record(engine(ClosureEngine))
+    record(engine(TranspiledEngine))
+    record(lambda out: interpret(parse_text(src), Environment(vars=dict(BUILTINS, print=out.append))))
+    return results
+
+@pytest.mark.parametrize("src, expected", [
+    ("fn f(n: int) { return n + 1; } let xs = [1, 2.5]; for x in xs { print(f(x)); }",
+     [2, "TypeError: n must be int, got float"]),
+    ('let xs = ["a", 1]; for x in xs { let s: str = x; print(s); }',
+     ["a", "TypeError: s must be str, got int"]),
+    ("fn f(d: dict, k) { let v: float = d[k]; return v; } print(f({1: 2.5}, 1)); print(f({1: 2}, 1));",
+     [2.5, "TypeError: v must be float, got int"]),
+])
+def test_annotations_are_checked_at_run_time(src, expected):
+    assert run_everywhere(src) == [expected] * 5
+
+def test_bound_locals_skip_the_unbound_check_in_tier2():
+    co = compile_source(b"""
+fn f(n) {
+    let s = 0;
+    while s < n { s = s + 1; }
+    if n > 5 { let late = 1; }
+    return late;
+}
+""")
+    f = function(co, "f")
+    assert f.varnames == ("n", "s", "late") and f.bound == (0, 1)
+    source = translate(f)
+    assert "l1 if l1 is not UNBOUND" not in source and "(l2 if l2 is not UNBOUND" in source
+    # kept by the bytecode cache
+    assert function(cache.loads(cache.dumps(co)), "f").bound == (0, 1)
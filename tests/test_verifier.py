@@ -0,0 +1,96 @@
+import pytest
+from axon.compiler import CodeObject, assemble, call_arg, compile_program, disassemble
+from axon.opcodes import *
+from axon.parser import parse_text
+from axon.verifier import VerifyError, verify, verify_all
+from axon.vm import VM, DISPATCH_ENGINES
+
+def code(*instructions, consts=(), names=()):
+    return CodeObject(assemble(list(instructions)), list(consts), list(names), name="t")
+
+def test_stack_depth_of_compiled_code():
+    co = compile_program(parse_text("let x = 1 + 2 * 3; print([x, x + 1, {\"k\": x}]);"))
+    # 1, 2, 3 are live together; then x, x, 1 and "k", x inside the list literal
+    assert verify(co) == co.stacksize == 4
+
+def test_print_leaves_nothing_behind():
+    co = compile_program(parse_text("let i = 0; while i < 3 { print(i); i = i + 1; }"))
+    assert None not in co.consts
+    assert "POP_TOP" not in [op for op, _ in disassemble(co)]
+    assert verify(co) == 2
+
+def test_functions_are_verified_with_the_module():
+    co = compile_program(parse_text("""
+fn inner(a, b) { return a * b + a; }
+fn outer(n) { return inner(n, n + 1) + inner(1, 2); }
+print(outer(3));
+"""))
+    assert verify_all(co) == 3
+    outer = next(c for c in co.consts if isinstance(c, CodeObject) and c.name == "outer")
+    assert outer.stacksize == 3
+
+def test_for_loops_keep_their_iterators_on_the_stack():
+    co = compile_program(parse_text("""
+for i = 0 to 3 {
+    for k in ({"a": i}) { if k == "b" { break; } print([i, k]); }
+}
+"""))
+    # both iterators under the two items of the list literal
+    assert verify(co) == 4
+
+@pytest.mark.parametrize("co, message", [
+    (code((POP_TOP, 0)), "pops 1 values from a stack of 0"),
+    (code((CONST, 0), consts=[1]), "ends with 1 values left"),
+    (code((JUMP, 5)), "jumps to 5, outside 0..1"),
+    (code((JUMP, -1)), "jumps to -1"),
+    (code((CONST, 1), (POP_TOP, 0), consts=[1]), "uses constant 1, but there are only 1"),
+    (code((LOAD_FAST, 0), (POP_TOP, 0)), "uses local 0"),
+    (code((CALL_FUNCTION, call_arg(2, 0)), (POP_TOP, 0), names=["f"]), "uses name 2"),
+    (code((MAKE_FUNCTION, 0), consts=[1]), "does not name a code object"),
+    (code((CONST, 0), (CHECK_TYPE, TYPE_MASK), (POP_TOP, 0), consts=[1], names=["x"]), "uses type 15"),
+    (code((FOR_ITER, 1)), "pops 1 values from a stack of 0"),
+    (code((99, 0)), "unknown opcode 99"),
+])
+def test_rejects_malformed_code(co, message):
+    with pytest.raises(VerifyError, match=message):
+        verify(co)
+
+def test_rejects_paths_that_disagree_on_depth():
+    # if x { push 1 } then fall into code that pops it: the other path has nothing to pop
+    co = code(
+        (LOAD_NAME, 0), (JUMP_IF_FALSE, 2),
+        (CONST, 0),
+        (PRINT, 0),
+        consts=[1], names=["x"],
+    )
+    with pytest.raises(VerifyError, match="instruction 3 is reached with stack depths"):
+        verify(co)
+
+def test_unreachable_code_need_not_balance():
+    co = code((JUMP, 2), (POP_TOP, 0))
+    assert verify(co) == 0
+
+def test_vm_refuses_unverifiable_code():
+    vm = VM()
+    with pytest.raises(VerifyError):
+        vm.push_frame(code((BINARY_ADD, 0)))
+    assert not vm.frames
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_frames_get_a_fixed_size_stack(dispatch):
+    co = compile_program(parse_text("""
+fn sq(n) { return n * n; }
+let i = 0;
+let total = 0;
+while i < 50 { total = total + sq(i); print(total); i = i + 1; }
+"""))
+    out = []
+    vm = VM(dispatch=dispatch, tier=False)
+    vm.globals["print"] = out.append
+    f = vm.push_frame(co)
+    stack = f.stack
+    assert len(stack) == co.stacksize
+    vm.run()
+    assert out[-1] == sum(n * n for n in range(50))
+    # the module frame never outgrew (or replaced) its preallocated stack
+    assert len(stack) == co.stacksize and f.sp == 0
@@ -0,0 +1,293 @@
+import pytest
+from axon.compiler import compile_program, disassemble
+from axon.parser import parse_text
+from axon.opcodes import OPNAMES
+from axon.vm import VM, DISPATCH_ENGINES
+
+def run_source(src, dispatch="table", quicken=False):
+    out = []
+    vm = VM(dispatch=dispatch, quicken=quicken)
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_program(parse_text(src)))
+    vm.run()
+    return vm, out
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_while_loop(dispatch):
+    vm, out = run_source("""
+let i = 0;
+let total = 0;
+while i < 10 {
+    total = total + i * 2;
+    i = i + 1;
+}
+print(total);
+""", dispatch)
+    assert out == [90]
+    assert vm.globals["i"] == 10
+
+def test_engines_agree():
+    src = """
+let xs = [1, 2, 3];
+let d = {"a": 4, "b": 5};
+print(xs[1] + d["b"]);
+print(-xs[0] < 0 and not (1 == 2));
+print(7 % 4 - 10 / 4);
+"""
+    assert run_source(src, "table")[1] == run_source(src, "switch")[1] == [7, True, 0.5]
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_break_and_continue(dispatch):
+    vm, out = run_source("""
+let i = 0;
+while i < 10 {
+    i = i + 1;
+    if i % 3 == 0 { continue; }
+    let j = 0;
+    while 1 { j = j + 1; if j >= i { break; } }
+    if i > 7 { break; }
+    print(j);
+}
+""", dispatch)
+    assert out == [1, 2, 4, 5, 7]
+    assert vm.globals["i"] == 8
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_for_loops(dispatch):
+    vm, out = run_source("""
+let n = 4;
+let total = 0;
+for i = 0 to n { total = total + i; }
+for i = n to 0 step -3 { print(i); }
+let d = {"a": 1, "b": 2};
+for k in d {
+    for x in [10, 20, 30] { if x > 10 { break; } total = total + x; }
+    if k == "a" { continue; }
+    print(k);
+}
+fn first_even(xs) {
+    for x in xs { if x % 2 == 0 { return x; } }
+    return -1;
+}
+print(first_even([3, 5, 6, 8]));
+print(total);
+""", dispatch)
+    assert out == [4, 1, "b", 6, 26]
+    assert vm.globals["i"] == 1 and vm.globals["k"] == "b"
+
+@pytest.mark.parametrize("src, message", [
+    ("for i = 0 to 2.5 { }", "TypeError: for loop bounds must be integers, got int, float, int"),
+    ("for i = 0 to 3 step 0 { }", "ValueError: for loop step must not be zero"),
+    ("for x in 5 { }", "TypeError: cannot iterate over int"),
+])
+def test_for_loop_errors(src, message):
+    with pytest.raises(RuntimeError, match=message):
+        run_source(src)
+
+def test_unknown_dispatch():
+    with pytest.raises(ValueError):
+        VM(dispatch="bogus")
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_recursion_keeps_arguments_per_frame(dispatch):
+    vm, out = run_source("""
+fn fib(n) {
+    if n < 2 { return n; }
+    return fib(n - 1) + fib(n - 2);
+}
+print(fib(15));
+""", dispatch)
+    assert out == [610]
+    assert "n" not in vm.globals
+
+def test_locals_live_in_slots_and_globals_stay_global():
+    vm, out = run_source("""
+let counter = 0;
+fn bump(by) {
+    let step = by * 2;
+    counter = counter + step;
+    return step;
+}
+bump(1);
+print(bump(5));
+print(counter);
+""")
+    assert out == [10, 12]
+    assert "step" not in vm.globals and "by" not in vm.globals
+    body = vm.globals["bump"].code
+    assert body.varnames == ("by", "step")
+    ops = [op for op, _ in disassemble(body)]
+    assert "LOAD_FAST" in ops and "STORE_FAST" in ops and "STORE_NAME" in ops
+
+def test_function_without_return_yields_none():
+    assert run_source("fn f() { let x = 1; } print(f());")[1] == [None]
+
+def test_call_errors():
+    with pytest.raises(RuntimeError, match="takes 1 arguments but 2"):
+        run_source("fn f(a) { return a; } f(1, 2);")
+    with pytest.raises(RuntimeError, match="referenced before assignment"):
+        run_source("fn f() { print(x); let x = 1; } f();")
+
+def test_frames_share_code_and_are_recycled():
+    vm, out = run_source("""
+fn add(a, b) { return a + b; }
+let i = 0;
+while i < 20 { i = add(i, 1); }
+print(i);
+""")
+    assert out == [20]
+    # one pooled frame served every call, plus the finished module frame
+    assert len(vm.frame_pool) == 2
+    assert all(not f.stack and not f.locals for f in vm.frame_pool)
+
+def test_inline_caches_hit_until_globals_are_rebound():
+    vm, out = run_source("""
+let limit = 3;
+fn under(n) { return n < limit; }
+fn count() {
+    let i = 0;
+    while under(i) { i = i + 1; }
+    return i;
+}
+print(count());
+""")
+    assert out == [3]
+    # `under` and `limit` resolve from the caches after the first iteration
+    assert vm.cache_hits > vm.cache_misses > 0
+
+    hits, misses = vm.cache_hits, vm.cache_misses
+    vm.globals["limit"] = 5   # host rebinding invalidates as well
+    vm.push_frame(compile_program(parse_text("print(count());")))
+    vm.run()
+    assert out == [3, 5]
+    assert vm.cache_misses > misses and vm.cache_hits > hits
+    assert vm.cache_stats()["hit_rate"] > 0.5
+
+def test_global_stores_keep_inline_caches_valid():
+    # the counters are rebound every iteration; only deleting names invalidates
+    out = []
+    vm = VM(tier=False)
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_program(parse_text("""
+fn double(n) { return n * 2; }
+let i = 0;
+let total = 0;
+while i < 200 {
+    total = total + double(i);
+    i = i + 1;
+}
+print(total);
+""")))
+    vm.run()
+    assert out == [39800]
+    assert vm.cache_stats()["hit_rate"] > 0.95
+
+    version = vm.globals.version
+    vm.globals["i"] = 0
+    assert vm.globals.version == version and vm.globals.cell("i") == [0]
+    del vm.globals["i"]
+    assert vm.globals.version != version
+
+def test_inline_cache_is_not_shared_across_vms():
+    co = compile_program(parse_text("print(x);"))
+    outs = []
+    for value in (1, 2):
+        vm = VM()
+        vm.globals["print"] = outs.append
+        vm.globals["x"] = value
+        vm.push_frame(co)
+        vm.run()
+    assert outs == [1, 2]
+
+def test_quickening_specializes_hot_code():
+    src = """
+fn count(n) {
+    let i = 0;
+    let s = "";
+    let t = 0;
+    while i < n {
+        s = s + "x";
+        t = t + i;
+        i = i + 1;
+    }
+    return s;
+}
+print(count(20));
+"""
+    vm, out = run_source(src, quicken=True)
+    assert out == ["x" * 20]
+    fn = vm.globals["count"].code
+    ops = {OPNAMES[op] for op in fn.adaptive[::2]}
+    assert {"BINARY_ADD_STR", "BINARY_ADD_INT", "COMPARE_LT_JUMP_INT"} <= ops
+    # the code object itself stays generic
+    assert "BINARY_ADD_INT" not in {name for name, _ in disassemble(fn)}
+    assert vm.specializations >= 3 and vm.deopts == 0
+    assert run_source(src)[0].specializations == 0
+
+def test_quickening_deopts_on_type_change():
+    src = """
+fn add(a, b) {
+    return a + b;
+}
+print(add(1, 2));
+print(add(1, 2));
+print(add("a", "b"));
+print(add([1], [2]));
+print(add(1.5, 2.0));
+"""
+    vm, out = run_source(src, quicken=True)
+    assert out == [3, 3, "ab", [1, 2], 3.5]
+    assert vm.deopts == 1
+    assert out == run_source(src, "switch")[1]
+
+def test_quickened_errors_match_generic():
+    src = """
+let xs = [1, 2];
+let i = 0;
+while i < 3 {
+    print(xs[i]);
+    i = i + 1;
+}
+"""
+    with pytest.raises(IndexError):
+        run_source(src, quicken=True)
+
+COUNT = """
+fn count(n, acc) {
+    if n == 0 { return acc; }
+    return count(n - 1, acc + n);
+}
+print(count(50000, 0));
+"""
+
+@pytest.mark.parametrize("dispatch", DISPATCH_ENGINES)
+def test_tail_calls_reuse_the_frame(dispatch):
+    src = COUNT + "fn id(x) { return x; } fn twice(x) { return id(x * 2); } print(twice(21));"
+    vm = VM(dispatch=dispatch, tier=False, max_depth=10)
+    out = []
+    vm.globals["print"] = out.append
+    vm.push_frame(compile_program(parse_text(src)))
+    vm.run()
+    assert out == [1250025000, 42]
+    ops = [op for op, _ in disassemble(vm.globals["count"].code)]
+    assert ops.count("TAIL_CALL") == 1 and "CALL_FUNCTION" not in ops
+
+def test_only_calls_in_tail_position_are_tail_calls():
+    co = compile_program(parse_text("fn f(n) { return f(n) + 1; } fn g() { print(len([1])); } return f(1);"))
+    assert "TAIL_CALL" not in [op for op, _ in disassemble(co)]
+    for fn in (c for c in co.consts if hasattr(c, "params")):
+        assert "TAIL_CALL" not in [op for op, _ in disassemble(fn)]
+
+def test_tail_call_to_host_function():
+    vm, out = run_source('fn size(xs) { return print(xs); } size([1, 2]); print(1);')
+    assert out == [[1, 2], 1]
+
+def test_max_depth_raises_an_axon_error():
+    src = "fn down(n) { if n == 0 { return 0; } return 1 + down(n - 1); } print(down(1000));"
+    vm = VM(tier=False, max_depth=100)
+    vm.push_frame(compile_program(parse_text(src)))
+    with pytest.raises(RuntimeError, match=r"RecursionError: maximum call depth exceeded in down\(\)"):
+        vm.run()
+    # deep non-tail recursion needs no Python stack
+    vm, out = run_source(src.replace("1000", "20000"))
+    assert out == [20000]